@@ -0,0 +1,266 @@
+import argparse
+import json
+import time as reloj
+from dataclasses import dataclass, asdict
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from archivo import ALIAS_ARCHIVO, VISTA_HISTORICA, ArchivadorReservas
+from database import MINUTOS_FRANJA, DatabaseManager
+
+try:
+    import numpy as np
+except ImportError:  # El motor funciona igual en Python puro, solo más lento
+    np = None
+
+
+MINUTOS_JORNADA = 12 * 60  # 8:00 - 20:00
+FRANJAS_DIA = MINUTOS_JORNADA // MINUTOS_FRANJA
+DIAS_SEMANA = ("Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom")
+
+
+@dataclass
+class IndicadoresSala:
+    """Indicadores de uso de una sala en el período analizado"""
+    sala_id: int
+    nombre: str
+    capacidad: int
+    reservas: int = 0
+    canceladas: int = 0
+    canceladas_tarde: int = 0
+    minutos_reservados: int = 0
+    utilizacion: float = 0.0
+
+    @property
+    def tasa_cancelacion(self) -> float:
+        return self.canceladas / self.reservas if self.reservas else 0.0
+
+    @property
+    def tasa_no_presentacion(self) -> float:
+        """Cancelaciones hechas con menos de una hora de anticipación"""
+        return self.canceladas_tarde / self.reservas if self.reservas else 0.0
+
+
+@dataclass
+class ColumnasOcupacion:
+    """Filas de ocupacion_diaria de un período en formato columnar"""
+    sala: object
+    dia_semana: object
+    minutos: object
+    mascara: object
+
+    def __len__(self):
+        return len(self.sala)
+
+
+class MotorAnalitica:
+    """Indicadores de ocupación calculados sobre columnas en memoria.
+
+    La utilización y el mapa de calor salen de `ocupacion_diaria` (una fila
+    por sala y día, ya resumida por los triggers) cargada como columnas; las
+    cancelaciones se agregan por sala en SQLite. Con NumPy instalado las
+    operaciones son vectoriales; sin él se usan listas con los mismos
+    resultados.
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db = db_manager
+
+    # ========== CARGA ==========
+
+    def cargar(self, desde: date, hasta: date) -> ColumnasOcupacion:
+        """Lee la ocupación diaria entre dos fechas (inclusive) como columnas"""
+        filas = self.db.fetch_all(
+            """
+            SELECT sala_id, fecha, minutos_reservados, mascara_franjas
+            FROM ocupacion_diaria
+            WHERE fecha BETWEEN ? AND ?
+            """,
+            (desde.isoformat(), hasta.isoformat()),
+        )
+        salas, fechas, minutos, mascaras = zip(*filas) if filas else ((), (), (), ())
+        dias_semana: Dict[str, int] = {}
+        for fecha in fechas:
+            if fecha not in dias_semana:
+                dias_semana[fecha] = date.fromisoformat(fecha).weekday()
+        columnas = [salas, [dias_semana[fecha] for fecha in fechas], minutos, mascaras]
+        if np is not None:
+            columnas = [np.fromiter(columna, dtype=np.int64, count=len(filas)) for columna in columnas]
+        else:
+            columnas = [list(columna) for columna in columnas]
+        return ColumnasOcupacion(*columnas)
+
+    def _cancelaciones(self, desde: date, hasta: date, incluir_archivo: bool) -> Dict[int, tuple]:
+        """(reservas, canceladas, canceladas con menos de una hora) por sala"""
+        tabla = VISTA_HISTORICA if incluir_archivo and ALIAS_ARCHIVO in self.db.adjuntos else "reservas"
+        filas = self.db.fetch_all(
+            f"""
+            SELECT sala_id, COUNT(*), SUM(estado = 'cancelada'),
+                   SUM(CASE WHEN estado != 'cancelada' THEN 0
+                            ELSE COALESCE(julianday(actualizado_en, 'localtime')
+                                          >= julianday(fecha_reserva || ' ' || hora_inicio) - 1.0 / 24, 0) END)
+            FROM {tabla}
+            WHERE fecha_reserva BETWEEN ? AND ?
+            GROUP BY sala_id
+            """,
+            (desde.isoformat(), hasta.isoformat()),
+        )
+        return {fila[0]: (fila[1], fila[2], fila[3]) for fila in filas}
+
+    def _salas(self) -> Dict[int, tuple]:
+        filas = self.db.fetch_all("SELECT id, nombre, capacidad FROM salas ORDER BY id")
+        return {fila["id"]: (fila["nombre"], fila["capacidad"]) for fila in filas}
+
+    # ========== INDICADORES ==========
+
+    def indicadores_por_sala(self, datos: ColumnasOcupacion, dias: int,
+                             cancelaciones: Dict[int, tuple]) -> List[IndicadoresSala]:
+        """Utilización y tasas de cancelación de cada sala"""
+        indicadores = {
+            sala_id: IndicadoresSala(sala_id, nombre, capacidad)
+            for sala_id, (nombre, capacidad) in self._salas().items()
+        }
+        for sala_id, minutos in self._minutos_por_sala(datos).items():
+            if sala_id in indicadores:
+                indicadores[sala_id].minutos_reservados = minutos
+        for sala_id, (reservas, canceladas, tarde) in cancelaciones.items():
+            if sala_id in indicadores:
+                ind = indicadores[sala_id]
+                ind.reservas, ind.canceladas, ind.canceladas_tarde = reservas, canceladas, tarde
+
+        disponible = dias * MINUTOS_JORNADA
+        for ind in indicadores.values():
+            ind.utilizacion = ind.minutos_reservados / disponible if disponible else 0.0
+        return list(indicadores.values())
+
+    def _minutos_por_sala(self, datos: ColumnasOcupacion) -> Dict[int, int]:
+        if not len(datos):
+            return {}
+        if np is not None:
+            minutos = np.bincount(datos.sala, weights=datos.minutos)
+            return {int(sala_id): int(minutos[sala_id]) for sala_id in np.flatnonzero(minutos)}
+
+        totales: Dict[int, int] = {}
+        for sala_id, minutos in zip(datos.sala, datos.minutos):
+            totales[sala_id] = totales.get(sala_id, 0) + minutos
+        return totales
+
+    def mapa_calor(self, datos: ColumnasOcupacion) -> List[List[int]]:
+        """Salas ocupadas en cada franja de 30 minutos, por día de la semana (7 x 24)"""
+        if np is not None:
+            mapa = np.zeros((7, FRANJAS_DIA), dtype=np.int64)
+            if len(datos):
+                bits = (datos.mascara[:, None] >> np.arange(FRANJAS_DIA)) & 1
+                np.add.at(mapa, datos.dia_semana, bits)
+            return mapa.tolist()
+
+        mapa = [[0] * FRANJAS_DIA for _ in range(7)]
+        for dia, mascara in zip(datos.dia_semana, datos.mascara):
+            fila, franja = mapa[dia], 0
+            while mascara:
+                if mascara & 1:
+                    fila[franja] += 1
+                mascara >>= 1
+                franja += 1
+        return mapa
+
+    def capacidad_vs_demanda(self, indicadores: List[IndicadoresSala]) -> List[dict]:
+        """Oferta y uso agrupados por capacidad de sala
+
+        Una utilización alta en una capacidad indica que faltan salas de ese
+        tamaño; una baja, que sobran.
+        """
+        grupos: Dict[int, dict] = {}
+        for ind in indicadores:
+            grupo = grupos.setdefault(ind.capacidad, {
+                "capacidad": ind.capacidad, "salas": 0, "reservas": 0, "minutos_reservados": 0, "utilizacion": 0.0,
+            })
+            grupo["salas"] += 1
+            grupo["reservas"] += ind.reservas - ind.canceladas
+            grupo["minutos_reservados"] += ind.minutos_reservados
+            grupo["utilizacion"] += ind.utilizacion
+        for grupo in grupos.values():
+            grupo["utilizacion"] /= grupo["salas"]
+        return [grupos[capacidad] for capacidad in sorted(grupos)]
+
+    def analizar(self, desde: date, hasta: date, incluir_archivo: bool = False) -> dict:
+        """Calcula todos los indicadores del período"""
+        datos = self.cargar(desde, hasta)
+        cancelaciones = self._cancelaciones(desde, hasta, incluir_archivo)
+        indicadores = self.indicadores_por_sala(datos, (hasta - desde).days + 1, cancelaciones)
+        reservas = sum(ind.reservas for ind in indicadores)
+        canceladas = sum(ind.canceladas for ind in indicadores)
+        tarde = sum(ind.canceladas_tarde for ind in indicadores)
+        return {
+            "desde": desde.isoformat(),
+            "hasta": hasta.isoformat(),
+            "motor": "numpy" if np is not None else "python",
+            "reservas": reservas,
+            "tasa_cancelacion": canceladas / reservas if reservas else 0.0,
+            "tasa_no_presentacion": tarde / reservas if reservas else 0.0,
+            "salas": [
+                dict(asdict(ind), tasa_cancelacion=ind.tasa_cancelacion, tasa_no_presentacion=ind.tasa_no_presentacion)
+                for ind in indicadores
+            ],
+            "mapa_calor": self.mapa_calor(datos),
+            "capacidad_vs_demanda": self.capacidad_vs_demanda(indicadores),
+        }
+
+
+def imprimir_informe(informe: dict, top: Optional[int] = 10):
+    """Muestra un informe de `MotorAnalitica.analizar` en la consola"""
+    print(f"\n📊 Ocupación {informe['desde']} → {informe['hasta']} ({informe['reservas']} reservas)")
+    print(f"   Cancelación: {informe['tasa_cancelacion']:.1%} | "
+          f"No presentación (cancelación tardía): {informe['tasa_no_presentacion']:.1%}")
+
+    print("\n🏆 Salas con mayor utilización:")
+    salas = sorted(informe["salas"], key=lambda s: s["utilizacion"], reverse=True)
+    for sala in salas[:top]:
+        print(f"   {sala['nombre']:<25} {sala['utilizacion']:>6.1%} | "
+              f"{sala['minutos_reservados'] // 60} h | cancelación {sala['tasa_cancelacion']:.0%}")
+
+    print("\n🔥 Mapa de calor (salas ocupadas por franja):")
+    print("        " + " ".join(f"{h:02d}" for h in range(8, 20)))
+    for nombre, fila in zip(DIAS_SEMANA, informe["mapa_calor"]):
+        # Una columna por hora: suma de sus dos franjas de 30 minutos
+        horas = [fila[i] + fila[i + 1] for i in range(0, len(fila), 2)]
+        maximo = max(max(horas), 1)
+        print(f"   {nombre}  " + " ".join(" ░▒▓█"[min(4, round(4 * h / maximo))] * 2 for h in horas))
+
+    print("\n👥 Capacidad vs demanda:")
+    for grupo in informe["capacidad_vs_demanda"]:
+        print(f"   {grupo['capacidad']:>3} personas: {grupo['salas']} salas, "
+              f"{grupo['reservas']} reservas, utilización media {grupo['utilizacion']:.1%}")
+
+
+def main(argv=None):
+    """Informe de ocupación no interactivo"""
+    parser = argparse.ArgumentParser(description="Indicadores de ocupación de las salas")
+    parser.add_argument("--db", default="reserva_cun.db", help="Ruta de la base de datos SQLite")
+    parser.add_argument("--desde", type=date.fromisoformat, help="Inicio del período (por defecto hace 180 días)")
+    parser.add_argument("--hasta", type=date.fromisoformat, help="Fin del período (por defecto hoy)")
+    parser.add_argument("--historial", action="store_true", help="Incluye las reservas archivadas en las tasas de cancelación")
+    parser.add_argument("--json", action="store_true", help="Imprime el informe completo en JSON")
+    args = parser.parse_args(argv)
+
+    hasta = args.hasta or date.today()
+    desde = args.desde or hasta - timedelta(days=180)
+
+    db_manager = DatabaseManager(args.db)
+    try:
+        if args.historial:
+            ArchivadorReservas(db_manager).adjuntar()
+        inicio = reloj.perf_counter()
+        informe = MotorAnalitica(db_manager).analizar(desde, hasta, args.historial)
+        informe["segundos"] = round(reloj.perf_counter() - inicio, 3)
+        if args.json:
+            print(json.dumps(informe, ensure_ascii=False, indent=2))
+        else:
+            imprimir_informe(informe)
+            print(f"\n⏱️  {informe['segundos']} s ({informe['motor']})")
+    finally:
+        db_manager.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import sqlite3
+from datetime import date, timedelta
+
+from database import DatabaseManager
+
+
+ALIAS_ARCHIVO = "archivo"
+VISTA_HISTORICA = "reservas_con_historial"
+
+COLUMNAS_RESERVA = (
+    "id, estudiante_id, sala_id, fecha_reserva, hora_inicio, hora_fin, "
+    "estado, creado_en, actualizado_en, version, serie_id"
+)
+
+
+class ArchivoFragmentado(ValueError):
+    """Las reservas viven en fragmentos por sede, no en la base indicada."""
+
+
+class ArchivadorReservas:
+    """Mueve las reservas antiguas a una base de archivo adjunta.
+
+    La tabla caliente `reservas` conserva solo el historial reciente y el
+    calendario futuro, de modo que sus índices (los que usa cada reserva)
+    se mantienen pequeños. El historial sigue consultable mediante la vista
+    temporal `reservas_con_historial` (UNION ALL de ambas tablas).
+    """
+
+    def __init__(self, db_manager: DatabaseManager, ruta_archivo: str = None,
+                 retencion_dias: int = 365, tamano_lote: int = 1000):
+        self.db = db_manager
+        if ruta_archivo is None:
+            base, extension = os.path.splitext(db_manager.db_path)
+            ruta_archivo = f"{base}_archivo{extension or '.db'}"
+        self.ruta_archivo = ruta_archivo
+        self.retencion_dias = retencion_dias
+        self.tamano_lote = tamano_lote
+
+    def _migrar(self):
+        """Agrega a un archivo ya creado las columnas que se sumaron después"""
+        if not os.path.exists(self.ruta_archivo):
+            return
+        conn = sqlite3.connect(self.ruta_archivo)
+        try:
+            columnas = {fila[1] for fila in conn.execute("PRAGMA table_info(reservas)")}
+            if columnas and "serie_id" not in columnas:
+                conn.execute("ALTER TABLE reservas ADD COLUMN serie_id INTEGER")
+                conn.commit()
+        finally:
+            conn.close()
+
+    def adjuntar(self):
+        """Adjunta la base de archivo y crea la vista histórica en cada conexión"""
+        if ALIAS_ARCHIVO not in self.db.adjuntos:
+            self._migrar()
+        self.db.adjuntar(
+            self.ruta_archivo,
+            ALIAS_ARCHIVO,
+            esquema=[
+                f'''
+                CREATE TABLE IF NOT EXISTS {ALIAS_ARCHIVO}.reservas (
+                    id INTEGER PRIMARY KEY,
+                    estudiante_id INTEGER NOT NULL,
+                    sala_id INTEGER NOT NULL,
+                    fecha_reserva DATE NOT NULL,
+                    hora_inicio TIME NOT NULL,
+                    hora_fin TIME NOT NULL,
+                    estado TEXT NOT NULL,
+                    creado_en TIMESTAMP,
+                    actualizado_en TIMESTAMP,
+                    version INTEGER NOT NULL DEFAULT 1,
+                    serie_id INTEGER
+                )
+                ''',
+                f'CREATE INDEX IF NOT EXISTS {ALIAS_ARCHIVO}.idx_archivo_estudiante ON reservas(estudiante_id)',
+                f'CREATE INDEX IF NOT EXISTS {ALIAS_ARCHIVO}.idx_archivo_sala ON reservas(sala_id)',
+                f'CREATE INDEX IF NOT EXISTS {ALIAS_ARCHIVO}.idx_archivo_fecha ON reservas(fecha_reserva)',
+            ],
+            vistas_temporales=[
+                f'''
+                CREATE TEMP VIEW IF NOT EXISTS {VISTA_HISTORICA} AS
+                SELECT {COLUMNAS_RESERVA} FROM main.reservas
+                UNION ALL
+                SELECT {COLUMNAS_RESERVA} FROM {ALIAS_ARCHIVO}.reservas
+                ''',
+            ],
+        )
+
+    def archivar(self, hoy: date = None) -> int:
+        """Mueve al archivo las reservas no activas anteriores a la retención
+
+        Cada lote son dos transacciones cortas, porque en modo WAL un commit
+        que escribe en ambas bases no es atómico: primero se confirma la copia
+        en el archivo y después se borran de la base principal solo las
+        reservas que ya están en él. Si el proceso se interrumpe entre ambas,
+        las filas quedan repetidas (la vista histórica las muestra dos veces)
+        hasta que una nueva ejecución, gracias al INSERT OR IGNORE, termina el
+        borrado sin perder ninguna.
+
+        Con las reservas fragmentadas por sede, `main.reservas` del catálogo
+        no se usa y se rechaza con ArchivoFragmentado.
+
+        Returns: cantidad de reservas archivadas
+        """
+        if self._fragmentada():
+            raise ArchivoFragmentado(
+                "Las reservas están fragmentadas por sede; el archivo no está disponible en ese modo"
+            )
+        self.adjuntar()
+        limite = ((hoy or date.today()) - timedelta(days=self.retencion_dias)).isoformat()
+        total = 0
+
+        while True:
+            with self.db.sesion():
+                filas = self.db.fetch_all(
+                    """
+                    SELECT id FROM main.reservas
+                    WHERE estado != 'activa' AND fecha_reserva < ?
+                    ORDER BY fecha_reserva
+                    LIMIT ?
+                    """,
+                    (limite, self.tamano_lote),
+                )
+                if not filas:
+                    break
+
+                ids = json.dumps([fila["id"] for fila in filas])
+                self.db.execute_query(
+                    f"""
+                    INSERT OR IGNORE INTO {ALIAS_ARCHIVO}.reservas ({COLUMNAS_RESERVA})
+                    SELECT {COLUMNAS_RESERVA} FROM main.reservas
+                    WHERE id IN (SELECT value FROM json_each(?))
+                    """,
+                    (ids,),
+                )
+
+            with self.db.sesion():
+                borradas = self.db.execute_query(
+                    f"""
+                    DELETE FROM main.reservas
+                    WHERE id IN (
+                        SELECT a.id FROM json_each(?) AS j
+                        CROSS JOIN {ALIAS_ARCHIVO}.reservas a ON a.id = j.value
+                    )
+                    """,
+                    (ids,),
+                ).rowcount
+
+            total += borradas
+            if len(filas) < self.tamano_lote:
+                break
+
+        return total
+
+    def _fragmentada(self) -> bool:
+        """Indica si la base es el catálogo de un EnrutadorFragmentos ya en uso"""
+        tabla = self.db.fetch_one("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'fragmentos'")
+        return bool(tabla and self.db.fetch_one("SELECT 1 FROM fragmentos LIMIT 1"))
+
+
+def main(argv=None):
+    """Archiva las reservas antiguas de la base indicada"""
+    parser = argparse.ArgumentParser(description="Archiva reservas antiguas en una base separada")
+    parser.add_argument("--db", default="reserva_cun.db", help="Ruta de la base de datos SQLite")
+    parser.add_argument("--archivo", help="Ruta de la base de archivo (por defecto <db>_archivo.db)")
+    parser.add_argument("--retencion-dias", type=int, default=365,
+                        help="Días de historial que permanecen en la base principal")
+    parser.add_argument("--lote", type=int, default=1000, help="Reservas movidas por transacción")
+    args = parser.parse_args(argv)
+
+    archivador = ArchivadorReservas(
+        DatabaseManager(args.db), args.archivo, retencion_dias=args.retencion_dias, tamano_lote=args.lote
+    )
+    try:
+        total = archivador.archivar()
+    except ArchivoFragmentado as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    print(f"🗄️  {total} reservas archivadas en {archivador.ruta_archivo}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+from datetime import date, time
+from typing import List, Optional
+
+from database import EjecutorSQLite
+from models import Sala, Reserva, Estudiante, EstadoSala
+from repositories import SalaRepository, ReservaRepository, EstudianteRepository
+
+
+class AsyncBaseRepository:
+    """Clase base para repositorios asíncronos.
+
+    Reutiliza las consultas de los repositorios síncronos y las ejecuta en el
+    `EjecutorSQLite`: lecturas en los hilos lectores, escrituras en el escritor.
+    """
+
+    repositorio_sincrono = None
+
+    def __init__(self, ejecutor: EjecutorSQLite):
+        self.ejecutor = ejecutor
+        self._repo = self.repositorio_sincrono(ejecutor.db)
+
+
+class AsyncSalaRepository(AsyncBaseRepository):
+    """Versión asíncrona de SalaRepository."""
+
+    repositorio_sincrono = SalaRepository
+
+    async def crear(self, sala: Sala) -> int:
+        return await self.ejecutor.escribir(self._repo.crear, sala)
+
+    async def obtener_por_id(self, sala_id: int) -> Optional[Sala]:
+        return await self.ejecutor.leer(self._repo.obtener_por_id, sala_id)
+
+    async def obtener_todas(self) -> List[Sala]:
+        return await self.ejecutor.leer(self._repo.obtener_todas)
+
+    async def obtener_disponibles(self) -> List[Sala]:
+        return await self.ejecutor.leer(self._repo.obtener_disponibles)
+
+    async def actualizar_estado(self, sala_id: int, estado: EstadoSala) -> None:
+        await self.ejecutor.escribir(self._repo.actualizar_estado, sala_id, estado)
+
+    async def actualizar(self, sala: Sala) -> bool:
+        return await self.ejecutor.escribir(self._repo.actualizar, sala)
+
+    async def eliminar(self, sala_id: int) -> bool:
+        return await self.ejecutor.escribir(self._repo.eliminar, sala_id)
+
+
+class AsyncReservaRepository(AsyncBaseRepository):
+    """Versión asíncrona de ReservaRepository."""
+
+    repositorio_sincrono = ReservaRepository
+
+    async def crear(self, reserva: Reserva) -> int:
+        return await self.ejecutor.escribir(self._repo.crear, reserva)
+
+    async def existe_conflicto(self, sala_id: int, fecha: date, hora_inicio: time, hora_fin: time,
+                               excluir_reserva_id: Optional[int] = None) -> bool:
+        return await self.ejecutor.leer(
+            self._repo._existe_reserva_conflicto, sala_id, fecha, hora_inicio, hora_fin, excluir_reserva_id
+        )
+
+    async def obtener_por_id(self, reserva_id: int) -> Optional[Reserva]:
+        return await self.ejecutor.leer(self._repo.obtener_por_id, reserva_id)
+
+    async def obtener_por_sala(self, sala_id: int) -> List[Reserva]:
+        return await self.ejecutor.leer(self._repo.obtener_por_sala, sala_id)
+
+    async def obtener_por_estudiante(self, estudiante_id: int) -> List[Reserva]:
+        return await self.ejecutor.leer(self._repo.obtener_por_estudiante, estudiante_id)
+
+    async def obtener_activas_por_sala_y_fecha(self, sala_id: int, fecha: date) -> List[Reserva]:
+        return await self.ejecutor.leer(self._repo.obtener_activas_por_sala_y_fecha, sala_id, fecha)
+
+    async def actualizar(self, reserva: Reserva) -> None:
+        await self.ejecutor.escribir(self._repo.actualizar, reserva)
+
+
+class AsyncEstudianteRepository(AsyncBaseRepository):
+    """Versión asíncrona de EstudianteRepository."""
+
+    repositorio_sincrono = EstudianteRepository
+
+    async def crear(self, estudiante: Estudiante) -> int:
+        return await self.ejecutor.escribir(self._repo.crear, estudiante)
+
+    async def obtener_por_id(self, estudiante_id: int) -> Optional[Estudiante]:
+        return await self.ejecutor.leer(self._repo.obtener_por_id, estudiante_id)
+
+    async def obtener_por_identificacion(self, identificacion: str) -> Optional[Estudiante]:
+        return await self.ejecutor.leer(self._repo.obtener_por_identificacion, identificacion)
+
+    async def obtener_todos(self) -> List[Estudiante]:
+        return await self.ejecutor.leer(self._repo.obtener_todos)
@@ -0,0 +1,152 @@
+import asyncio
+from datetime import date, time
+from typing import List, Optional, Tuple
+
+from async_repositories import AsyncSalaRepository, AsyncReservaRepository, AsyncEstudianteRepository
+from models import Sala, Reserva, Estudiante, EsperaReserva
+from services import ReservaService, SalaService, EstudianteService
+
+
+class AsyncEstudianteService:
+    """Versión asíncrona de EstudianteService - RF10"""
+
+    def __init__(self, estudiante_repo: AsyncEstudianteRepository):
+        self.ejecutor = estudiante_repo.ejecutor
+        self._service = EstudianteService(estudiante_repo._repo)
+
+    async def registrar_estudiante(self, identificacion: str, nombre: str, email: str = None) -> int:
+        return await self.ejecutor.escribir(self._service.registrar_estudiante, identificacion, nombre, email)
+
+    async def obtener_estudiante_por_identificacion(self, identificacion: str) -> Optional[Estudiante]:
+        return await self.ejecutor.leer(self._service.obtener_estudiante_por_identificacion, identificacion)
+
+    async def obtener_estudiante_por_id(self, estudiante_id: int) -> Optional[Estudiante]:
+        return await self.ejecutor.leer(self._service.obtener_estudiante_por_id, estudiante_id)
+
+    async def buscar_estudiantes(self, texto: str, limite: int = 20) -> List[Estudiante]:
+        return await self.ejecutor.leer(self._service.buscar_estudiantes, texto, limite)
+
+
+class AsyncReservaService:
+    """Versión asíncrona de ReservaService - RF3 a RF8
+
+    Las operaciones que escriben se ejecutan completas en el hilo escritor,
+    de modo que la validación de disponibilidad y la inserción no se
+    intercalan con otras escrituras.
+    """
+
+    def __init__(self, reserva_repo: AsyncReservaRepository, sala_repo: AsyncSalaRepository,
+                 estudiante_repo: AsyncEstudianteRepository):
+        self.ejecutor = reserva_repo.ejecutor
+        self._service = ReservaService(reserva_repo._repo, sala_repo._repo, estudiante_repo._repo)
+
+    def suscribir_disponibilidad(self, sala_id: Optional[int] = None, fecha: Optional[date] = None,
+                                 maximo: int = 0) -> Tuple[int, asyncio.Queue]:
+        """Cola del bucle actual que recibe un CambioDisponibilidad por cada cambio de la sala y día"""
+        return self._service.publicador.suscribir_cola(sala_id, fecha, maximo)
+
+    def cancelar_suscripcion(self, token: int) -> bool:
+        return self._service.cancelar_suscripcion(token)
+
+    async def crear_reserva(self, estudiante_id: int, sala_id: int, fecha: date,
+                            hora_inicio: time, hora_fin: time) -> int:
+        return await self.ejecutor.escribir(
+            self._service.crear_reserva, estudiante_id, sala_id, fecha, hora_inicio, hora_fin
+        )
+
+    async def consultar_disponibilidad(self, sala_id: int, fecha: date, hora_inicio: time, hora_fin: time) -> bool:
+        return await self.ejecutor.leer(self._service.consultar_disponibilidad, sala_id, fecha, hora_inicio, hora_fin)
+
+    async def obtener_horarios_disponibles(self, sala_id: int, fecha: date) -> List[dict]:
+        return await self.ejecutor.leer(self._service.obtener_horarios_disponibles, sala_id, fecha)
+
+    async def buscar_primeros_huecos(self, capacidad_minima: int, duracion_minutos: int,
+                                     desde: date = None, hasta: date = None,
+                                     hora_desde: time = time(8, 0), hora_hasta: time = time(20, 0),
+                                     k: int = 5) -> List[dict]:
+        return await self.ejecutor.leer(
+            self._service.buscar_primeros_huecos, capacidad_minima, duracion_minutos,
+            desde, hasta, hora_desde, hora_hasta, k
+        )
+
+    async def crear_serie(self, estudiante_id: int, sala_id: int, fecha_inicio: date, fecha_fin: date,
+                          hora_inicio: time, hora_fin: time, dias_semana: List[int] = None,
+                          intervalo_semanas: int = 1, excepciones: List[date] = None,
+                          omitir_conflictos: bool = False) -> dict:
+        return await self.ejecutor.escribir(
+            self._service.crear_serie, estudiante_id, sala_id, fecha_inicio, fecha_fin, hora_inicio, hora_fin,
+            dias_semana, intervalo_semanas, excepciones, omitir_conflictos
+        )
+
+    async def cancelar_serie(self, serie_id: int, es_administrador: bool = False) -> int:
+        return await self.ejecutor.escribir(self._service.cancelar_serie, serie_id, es_administrador)
+
+    async def unirse_lista_espera(self, estudiante_id: int, sala_id: int, fecha: date,
+                                  hora_inicio: time, hora_fin: time, prioridad: int = 0) -> int:
+        return await self.ejecutor.escribir(
+            self._service.unirse_lista_espera, estudiante_id, sala_id, fecha, hora_inicio, hora_fin, prioridad
+        )
+
+    async def retirar_de_lista_espera(self, espera_id: int, estudiante_id: Optional[int] = None) -> bool:
+        return await self.ejecutor.escribir(self._service.retirar_de_lista_espera, espera_id, estudiante_id)
+
+    async def obtener_esperas_por_estudiante(self, estudiante_id: int) -> List[EsperaReserva]:
+        return await self.ejecutor.leer(self._service.obtener_esperas_por_estudiante, estudiante_id)
+
+    async def cancelar_reserva(self, reserva_id: int, es_administrador: bool = False) -> bool:
+        return await self.ejecutor.escribir(self._service.cancelar_reserva, reserva_id, es_administrador)
+
+    async def modificar_reserva(self, reserva_id: int, nueva_sala_id: int = None,
+                                nueva_fecha: date = None, nueva_hora_inicio: time = None,
+                                nueva_hora_fin: time = None) -> bool:
+        return await self.ejecutor.escribir(
+            self._service.modificar_reserva, reserva_id, nueva_sala_id, nueva_fecha, nueva_hora_inicio, nueva_hora_fin
+        )
+
+    async def obtener_reservas_por_estudiante(self, estudiante_id: int) -> List[Reserva]:
+        return await self.ejecutor.leer(self._service.obtener_reservas_por_estudiante, estudiante_id)
+
+    async def obtener_reservas_por_sala(self, sala_id: int) -> List[Reserva]:
+        return await self.ejecutor.leer(self._service.obtener_reservas_por_sala, sala_id)
+
+    async def obtener_reserva_por_id(self, reserva_id: int) -> Optional[Reserva]:
+        return await self.ejecutor.leer(self._service.obtener_reserva_por_id, reserva_id)
+
+
+class AsyncSalaService:
+    """Versión asíncrona de SalaService - RF1, RF2, RF9"""
+
+    def __init__(self, sala_repo: AsyncSalaRepository, reserva_service: Optional[AsyncReservaService] = None):
+        self.ejecutor = sala_repo.ejecutor
+        self._service = SalaService(sala_repo._repo, reserva_service._service if reserva_service else None)
+
+    async def crear_sala(self, nombre: str, capacidad: int, descripcion: str = None) -> int:
+        return await self.ejecutor.escribir(self._service.crear_sala, nombre, capacidad, descripcion)
+
+    async def listar_salas(self) -> List[Sala]:
+        return await self.ejecutor.leer(self._service.listar_salas)
+
+    async def listar_salas_disponibles(self) -> List[Sala]:
+        return await self.ejecutor.leer(self._service.listar_salas_disponibles)
+
+    async def obtener_sala_por_id(self, sala_id: int) -> Optional[Sala]:
+        return await self.ejecutor.leer(self._service.obtener_sala_por_id, sala_id)
+
+    async def buscar_salas(self, texto: str, limite: int = 20) -> List[Sala]:
+        return await self.ejecutor.leer(self._service.buscar_salas, texto, limite)
+
+    async def obtener_estado_salas(self) -> List[dict]:
+        return await self.ejecutor.leer(self._service.obtener_estado_salas)
+
+    async def obtener_salas_con_reservas(self) -> List[dict]:
+        return await self.ejecutor.leer(self._service.obtener_salas_con_reservas)
+
+    async def actualizar_sala(self, sala_id: int, nombre: str, capacidad: int,
+                              descripcion: str = None, estado: str = None,
+                              horarios_disponibles: Optional[List[dict]] = None) -> bool:
+        return await self.ejecutor.escribir(
+            self._service.actualizar_sala, sala_id, nombre, capacidad, descripcion, estado, horarios_disponibles
+        )
+
+    async def eliminar_sala(self, sala_id: int) -> bool:
+        return await self.ejecutor.escribir(self._service.eliminar_sala, sala_id)
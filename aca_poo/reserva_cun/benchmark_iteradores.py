@@ -0,0 +1,103 @@
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time as reloj
+import tracemalloc
+
+from consultas import generar_base
+from database import DatabaseManager
+from models import EstadoReserva
+from repositories import ReservaRepository
+
+
+def _minutos(reserva) -> int:
+    return (reserva.hora_fin.hour * 60 + reserva.hora_fin.minute) - (reserva.hora_inicio.hour * 60 + reserva.hora_inicio.minute)
+
+
+def medir_recorrido(repo: ReservaRepository, total: int, puntos: int = 10, tamano_lote: int = 500) -> list:
+    """Recorre todas las reservas con iterar_todas y anota el pico de tracemalloc cada total/puntos filas
+
+    Returns: [(filas procesadas, memoria actual, pico)] en bytes
+    """
+    paso = max(total // puntos, 1)
+    muestras = []
+    minutos_por_sala = {}
+    tracemalloc.start()
+    try:
+        flujo = (
+            repo.iterar_todas(tamano_lote)
+            .filtrar(lambda r: r.estado != EstadoReserva.CANCELADA)
+            .mapear(lambda r: (r.sala_id, _minutos(r)))
+        )
+        procesadas = 0
+        for sala_id, minutos in flujo:
+            minutos_por_sala[sala_id] = minutos_por_sala.get(sala_id, 0) + minutos
+            procesadas += 1
+            if procesadas % paso == 0:
+                muestras.append((procesadas, *tracemalloc.get_traced_memory()))
+        if not muestras or muestras[-1][0] != procesadas:
+            muestras.append((procesadas, *tracemalloc.get_traced_memory()))
+    finally:
+        tracemalloc.stop()
+    return muestras
+
+
+def medir_lista(repo: ReservaRepository) -> int:
+    """Pico de tracemalloc de obtener_todas, para comparar"""
+    tracemalloc.start()
+    try:
+        reservas = repo.obtener_todas()
+        pico = tracemalloc.get_traced_memory()[1]
+        del reservas
+        return pico
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None):
+    """Comprueba que recorrer todas las reservas con iterar_todas usa memoria constante"""
+    parser = argparse.ArgumentParser(description="Memoria de los recorridos perezosos de repositorios")
+    parser.add_argument("--reservas", type=int, default=1_000_000, help="Reservas de la base generada")
+    parser.add_argument("--db", help="Base ya generada (por defecto se genera en un temporal)")
+    parser.add_argument("--lote", type=int, default=500, help="Filas por fetchmany")
+    parser.add_argument("--tolerancia", type=float, default=1.5,
+                        help="Máximo crecimiento del pico entre la primera y la última muestra")
+    parser.add_argument("--lista", action="store_true", help="Mide también obtener_todas (memoria O(n))")
+    args = parser.parse_args(argv)
+
+    with contextlib.ExitStack() as pila:
+        ruta = args.db
+        if ruta is None:
+            ruta = os.path.join(pila.enter_context(tempfile.TemporaryDirectory()), "iteradores.db")
+        if not os.path.exists(ruta):
+            print(f"⏳ Generando base de {args.reservas} reservas...")
+            generar_base(ruta, reservas=args.reservas)
+        with contextlib.redirect_stdout(sys.stderr):
+            db = DatabaseManager(ruta)
+        pila.callback(db.cerrar)
+        repo = ReservaRepository(db)
+        total = db.fetch_one("SELECT COUNT(*) AS n FROM reservas")["n"]
+
+        inicio = reloj.perf_counter()
+        muestras = medir_recorrido(repo, total, tamano_lote=args.lote)
+        segundos = reloj.perf_counter() - inicio
+        print("| Filas | Memoria actual (KiB) | Pico (KiB) |")
+        print("|------:|---------------------:|-----------:|")
+        for filas, actual, pico in muestras:
+            print(f"| {filas:,} | {actual / 1024:,.0f} | {pico / 1024:,.0f} |")
+        print(f"\n{total:,} reservas en {segundos:.1f} s ({total / segundos:,.0f} filas/s)")
+        if args.lista:
+            print(f"obtener_todas: pico {medir_lista(repo) / 1_048_576:,.1f} MiB")
+
+    primero, ultimo = muestras[0][2], muestras[-1][2]
+    if ultimo > primero * args.tolerancia:
+        print(f"❌ El pico creció de {primero / 1024:,.0f} KiB a {ultimo / 1024:,.0f} KiB")
+        return 1
+    print(f"✅ Pico estable: {primero / 1024:,.0f} KiB → {ultimo / 1024:,.0f} KiB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import argparse
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import time as reloj
+from datetime import date, timedelta
+
+from database import DatabaseManager, PERFILES_ALMACENAMIENTO
+
+SQL_INSERTAR = """
+    INSERT INTO reservas (estudiante_id, sala_id, fecha_reserva, hora_inicio, hora_fin, estado)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+def _filas(cantidad: int, desde: date):
+    """Reservas sin cruces: 5 salas x 12 franjas de una hora por día"""
+    for i in range(cantidad):
+        dia, resto = divmod(i, 60)
+        sala, hora = divmod(resto, 12)
+        yield (
+            i % 5 + 1, sala + 1, (desde + timedelta(days=dia)).isoformat(),
+            f"{8 + hora:02d}:00:00", f"{9 + hora:02d}:00:00", "activa" if i % 4 else "completada",
+        )
+
+
+def medir_perfil(nombre: str, directorio: str, commits: int, carga: int, consultas: int) -> dict:
+    """Mide un perfil sobre una base nueva: commits sueltos, carga masiva y lecturas"""
+    ruta = os.path.join(directorio, f"{nombre}.db")
+    with contextlib.redirect_stdout(sys.stderr):
+        db = DatabaseManager(ruta, perfil=nombre)
+    try:
+        # Escrituras interactivas: un commit por reserva
+        inicio = reloj.perf_counter()
+        for fila in _filas(commits, date(2000, 1, 1)):
+            db.execute_query(SQL_INSERTAR, fila)
+        segundos_commits = reloj.perf_counter() - inicio
+
+        # Importación en una sola transacción (con índices diferidos si el perfil lo pide)
+        inicio = reloj.perf_counter()
+        with db.carga_masiva():
+            with db._get_connection() as conn:
+                conn.executemany(SQL_INSERTAR, _filas(carga, date(2100, 1, 1)))
+        segundos_carga = reloj.perf_counter() - inicio
+
+        # Lecturas puntuales como las de disponibilidad
+        azar = random.Random(7)
+        dias = carga // 60
+        inicio = reloj.perf_counter()
+        for _ in range(consultas):
+            fecha = date(2100, 1, 1) + timedelta(days=azar.randrange(dias))
+            db.fetch_all(
+                "SELECT hora_inicio, hora_fin FROM reservas WHERE sala_id = ? AND fecha_reserva = ? AND estado = 'activa'",
+                (azar.randint(1, 5), fecha.isoformat()),
+            )
+        segundos_consultas = reloj.perf_counter() - inicio
+        return {
+            "perfil": nombre,
+            "commits_por_s": commits / segundos_commits,
+            "filas_carga_por_s": carga / segundos_carga,
+            "consultas_por_s": consultas / segundos_consultas,
+        }
+    finally:
+        db.cerrar()
+
+
+def main(argv=None):
+    """Compara el rendimiento de los perfiles de almacenamiento en este equipo"""
+    parser = argparse.ArgumentParser(description="Benchmark de perfiles de almacenamiento SQLite")
+    parser.add_argument("--commits", type=int, default=2000, help="Reservas insertadas con un commit cada una")
+    parser.add_argument("--carga", type=int, default=200000, help="Reservas de la carga masiva")
+    parser.add_argument("--consultas", type=int, default=20000, help="Consultas de disponibilidad")
+    parser.add_argument("--directorio", help="Dónde crear las bases de prueba (por defecto, temporal)")
+    parser.add_argument("perfiles", nargs="*", default=list(PERFILES_ALMACENAMIENTO))
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(dir=args.directorio) as directorio:
+        print("| Perfil | Commits/s | Filas/s (carga) | Consultas/s |")
+        print("|--------|----------:|----------------:|------------:|")
+        for nombre in args.perfiles:
+            r = medir_perfil(nombre, directorio, args.commits, args.carga, args.consultas)
+            print(f"| {r['perfil']} | {r['commits_por_s']:,.0f} | {r['filas_carga_por_s']:,.0f} "
+                  f"| {r['consultas_por_s']:,.0f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,16 @@
 import sys
-from datetime import date, time, datetime
+from datetime import date, time, datetime, timedelta
 from typing import Optional, List
-from models import EstadoSala, EstadoReserva
+from models import EstadoSala, EstadoReserva, EstadoEspera
+from analitica import imprimir_informe
 
 
 class CLIHandler:
-    def __init__(self, reserva_service, estudiante_service, sala_service):
+    def __init__(self, reserva_service, estudiante_service, sala_service, motor_analitica=None):
         self.reserva_service = reserva_service
         self.estudiante_service = estudiante_service
         self.sala_service = sala_service
+        self.motor_analitica = motor_analitica
         self.estudiante_actual = None
 
     def mostrar_menu_principal(self):
@@ -33,7 +35,9 @@ class CLIHandler:
         print("5. 🔍 Consultar Reservas por Sala")
         print("6. 📊 Ver Estado de Salas")
         print("7. ❌ Cancelar Reserva")
-        print("8. ↩️  Volver al Menú Principal")
+        print("8. 📈 Analítica de Ocupación")
+        print("9. 🔎 Buscar Estudiantes y Salas")
+        print("10. ↩️  Volver al Menú Principal")
         print("=" * 50)
 
     def mostrar_menu_estudiante(self):
@@ -46,14 +50,16 @@ class CLIHandler:
         print("3. 📋 Consultar Mis Reservas")
         print("4. ❌ Cancelar Mi Reserva")
         print("5. 🔍 Consultar Disponibilidad")
-        print("6. ↩️  Volver al Menú Principal")
+        print("6. 🔎 Buscar Primera Sala Libre")
+        print("7. 🔁 Reserva Semanal Recurrente")
+        print("8. ↩️  Volver al Menú Principal")
         print("=" * 50)
 
     def manejar_menu_administrador(self):
         """Maneja las opciones del menú administrador"""
         while True:
             self.mostrar_menu_administrador()
-            opcion = self.pedir_opcion(1, 8)  # Actualizado a 8 opciones
+            opcion = self.pedir_opcion(1, 10)
 
             if opcion == 1:
                 self.crear_sala()
@@ -70,13 +76,17 @@ class CLIHandler:
             elif opcion == 7:
                 self.cancelar_reserva_administrador()
             elif opcion == 8:
+                self.ver_analitica_ocupacion()
+            elif opcion == 9:
+                self.buscar_estudiantes_y_salas()
+            elif opcion == 10:
                 break
 
     def manejar_menu_estudiante(self):
         """Maneja las opciones del menú estudiante"""
         while True:
             self.mostrar_menu_estudiante()
-            opcion = self.pedir_opcion(1, 6)
+            opcion = self.pedir_opcion(1, 8)
 
             if opcion == 1:
                 self.registrar_estudiante()
@@ -89,6 +99,10 @@ class CLIHandler:
             elif opcion == 5:
                 self.consultar_disponibilidad()
             elif opcion == 6:
+                self.buscar_primera_sala_libre()
+            elif opcion == 7:
+                self.hacer_reserva_recurrente()
+            elif opcion == 8:
                 break
 
     # ========== MÉTODOS DE ADMINISTRADOR ==========
@@ -214,6 +228,57 @@ class CLIHandler:
         finally:
             self.pausar()
 
+    def ver_analitica_ocupacion(self):
+        """Muestra utilización, mapa de calor y cancelaciones de un período"""
+        try:
+            print("\n--- ANALÍTICA DE OCUPACIÓN ---")
+            if not self.motor_analitica:
+                self.mostrar_error("La analítica no está disponible")
+                return
+
+            dias = input("Días a analizar hacia atrás desde hoy [180]: ").strip()
+            hasta = date.today()
+            desde = hasta - timedelta(days=int(dias) if dias else 180)
+            imprimir_informe(self.motor_analitica.analizar(desde, hasta))
+
+        except ValueError:
+            self.mostrar_error("La cantidad de días debe ser un número")
+        except Exception as e:
+            self.mostrar_error(f"Error al calcular la analítica: {e}")
+        finally:
+            self.pausar()
+
+    def buscar_estudiantes_y_salas(self):
+        """Busca estudiantes y salas por texto parcial (nombre, email, descripción...)"""
+        try:
+            print("\n--- BUSCAR ESTUDIANTES Y SALAS ---")
+            texto = input("Texto a buscar: ").strip()
+            if not texto:
+                self.mostrar_error("Ingrese al menos un término")
+                return
+
+            estudiantes = self.estudiante_service.buscar_estudiantes(texto, limite=10)
+            salas = self.sala_service.buscar_salas(texto, limite=10)
+            if not estudiantes and not salas:
+                print("Sin resultados.")
+                return
+
+            if estudiantes:
+                print("\n👨‍🎓 Estudiantes:")
+                for estudiante in estudiantes:
+                    print(f"   ID: {estudiante.id} | {estudiante.identificacion} | {estudiante.nombre} | "
+                          f"{estudiante.email or 'sin email'}")
+            if salas:
+                print("\n🏫 Salas:")
+                for sala in salas:
+                    print(f"   ID: {sala.id} | {sala.nombre} | Capacidad: {sala.capacidad} | "
+                          f"{sala.descripcion or 'Sin descripción'}")
+
+        except Exception as e:
+            self.mostrar_error(f"Error en la búsqueda: {e}")
+        finally:
+            self.pausar()
+
     # ========== MÉTODOS DE ESTUDIANTE ==========
 
     def registrar_estudiante(self):
@@ -290,6 +355,15 @@ class CLIHandler:
             # Validar disponibilidad
             if not self.reserva_service.consultar_disponibilidad(sala_id, fecha, hora_inicio, hora_fin):
                 self.mostrar_error("La sala no está disponible en ese horario")
+                unirse = input("¿Desea anotarse en la lista de espera? (s/n): ").lower().strip()
+                if unirse in ['s', 'si', 'sí', 'y', 'yes']:
+                    espera_id = self.reserva_service.unirse_lista_espera(
+                        self.estudiante_actual, sala_id, fecha, hora_inicio, hora_fin
+                    )
+                    self.mostrar_exito(
+                        f"Anotado en la lista de espera (ID: {espera_id}). "
+                        "Si el horario se libera, la reserva se creará automáticamente"
+                    )
                 return
 
             # Confirmación
@@ -325,8 +399,9 @@ class CLIHandler:
 
             print("\n--- MIS RESERVAS ---")
             reservas = self.reserva_service.obtener_reservas_por_estudiante(self.estudiante_actual)
+            esperas = self.reserva_service.obtener_esperas_por_estudiante(self.estudiante_actual)
 
-            if not reservas:
+            if not reservas and not esperas:
                 print("No tiene reservas activas.")
                 return
 
@@ -350,6 +425,14 @@ class CLIHandler:
                 print(f"   Estado: {reserva.estado.value}")
                 print()
 
+            pendientes = [espera for espera in esperas if espera.estado == EstadoEspera.ESPERANDO]
+            if pendientes:
+                print("⏳ En lista de espera:")
+                for espera in pendientes:
+                    print(f"   ID: {espera.id} | Sala {espera.sala_id} | {espera.fecha} "
+                          f"{espera.hora_inicio} - {espera.hora_fin}")
+                print()
+
         except Exception as e:
             self.mostrar_error(f"Error al consultar reservas: {e}")
         finally:
@@ -392,6 +475,14 @@ class CLIHandler:
             print(f"   Fecha: {reserva_a_cancelar.fecha_reserva}")
             print(f"   Horario: {reserva_a_cancelar.hora_inicio} - {reserva_a_cancelar.hora_fin}")
 
+            if reserva_a_cancelar.serie_id:
+                print(f"   Serie recurrente: #{reserva_a_cancelar.serie_id}")
+                toda_la_serie = input("\n¿Cancelar todas las ocurrencias futuras de la serie? (s/n): ").lower().strip()
+                if toda_la_serie in ['s', 'si', 'sí', 'y', 'yes']:
+                    canceladas = self.reserva_service.cancelar_serie(reserva_a_cancelar.serie_id)
+                    self.mostrar_exito(f"Serie cancelada ({canceladas} reservas)")
+                    return
+
             confirmar = input("\n¿Está seguro de que desea cancelar esta reserva? (s/n): ").lower().strip()
             if confirmar not in ['s', 'si', 'sí', 'y', 'yes']:
                 self.mostrar_exito("Cancelación cancelada")
@@ -448,6 +539,100 @@ class CLIHandler:
         finally:
             self.pausar()
 
+    def hacer_reserva_recurrente(self):
+        """Reserva la misma sala y horario todas las semanas de un período"""
+        try:
+            if not self.estudiante_actual:
+                self.mostrar_error("Debe registrarse como estudiante primero")
+                return
+
+            print("\n--- RESERVA SEMANAL RECURRENTE ---")
+            salas = self.sala_service.listar_salas_disponibles()
+            if not salas:
+                self.mostrar_error("No hay salas disponibles en este momento")
+                return
+
+            for sala in salas:
+                print(f"ID: {sala.id} | {sala.nombre} | Capacidad: {sala.capacidad}")
+            sala_id = int(input("\nID de la sala: "))
+
+            fecha_inicio = self.pedir_fecha("Primera fecha (YYYY-MM-DD): ")
+            fecha_fin = self.pedir_fecha("Última fecha (YYYY-MM-DD): ")
+            hora_inicio = self.pedir_hora("Hora de inicio (HH:MM): ")
+            hora_fin = self.pedir_hora("Hora de fin (HH:MM): ")
+
+            dias = input("Días de la semana (0=lunes ... 6=domingo, separados por coma) [día de la primera fecha]: ")
+            dias_semana = [int(dia) for dia in dias.split(",") if dia.strip()]
+            intervalo = input("Repetir cada N semanas [1]: ").strip()
+
+            resultado = self.reserva_service.crear_serie(
+                self.estudiante_actual, sala_id, fecha_inicio, fecha_fin, hora_inicio, hora_fin,
+                dias_semana=dias_semana, intervalo_semanas=int(intervalo) if intervalo else 1,
+                omitir_conflictos=True,
+            )
+
+            self.mostrar_exito(
+                f"Serie #{resultado['serie_id']} creada con {len(resultado['creadas'])} reservas"
+            )
+            for fecha, motivo in sorted(resultado['omitidas'].items()):
+                print(f"   ⚠️  {fecha}: {motivo} (omitida)")
+
+        except ValueError as e:
+            self.mostrar_error(f"Datos inválidos: {e}")
+        except Exception as e:
+            self.mostrar_error(f"Error al crear la serie: {e}")
+        finally:
+            self.pausar()
+
+    def buscar_primera_sala_libre(self):
+        """Busca los primeros huecos en cualquier sala y permite reservar uno"""
+        try:
+            print("\n--- BUSCAR PRIMERA SALA LIBRE ---")
+            capacidad = int(input("Número de personas: "))
+            duracion = int(input("Duración en minutos (30-240): "))
+            dias = input("Buscar en los próximos N días [7]: ").strip()
+            desde = date.today()
+            hasta = desde + timedelta(days=(int(dias) if dias else 7) - 1)
+
+            hora_desde, hora_hasta = time(8, 0), time(20, 0)
+            if input("¿Limitar a un rango de horas? (s/n): ").lower().strip() in ['s', 'si', 'sí', 'y', 'yes']:
+                hora_desde = self.pedir_hora("Desde (HH:MM): ")
+                hora_hasta = self.pedir_hora("Hasta (HH:MM): ")
+
+            huecos = self.reserva_service.buscar_primeros_huecos(
+                capacidad, duracion, desde, hasta, hora_desde, hora_hasta
+            )
+            if not huecos:
+                self.mostrar_error("No hay salas libres con esas condiciones")
+                return
+
+            print("\nOpciones encontradas:")
+            for numero, hueco in enumerate(huecos, 1):
+                sala = hueco['sala']
+                print(f"{numero}. {hueco['fecha']} {hueco['inicio'].strftime('%H:%M')}-"
+                      f"{hueco['fin'].strftime('%H:%M')} | {sala.nombre} (capacidad {sala.capacidad})")
+
+            if not self.estudiante_actual:
+                print("\nRegístrese como estudiante para reservar una de estas opciones.")
+                return
+
+            eleccion = input("\nNúmero de la opción a reservar (Enter para salir): ").strip()
+            if not eleccion:
+                return
+            hueco = huecos[int(eleccion) - 1]
+
+            reserva_id = self.reserva_service.crear_reserva(
+                self.estudiante_actual, hueco['sala'].id, hueco['fecha'], hueco['inicio'], hueco['fin']
+            )
+            self.mostrar_exito(f"Reserva creada exitosamente (ID: {reserva_id})")
+
+        except (ValueError, IndexError) as e:
+            self.mostrar_error(f"Datos inválidos: {e}")
+        except Exception as e:
+            self.mostrar_error(f"Error al buscar salas: {e}")
+        finally:
+            self.pausar()
+
     # ========== MÉTODOS AUXILIARES ==========
 
     def pedir_opcion(self, min_opcion: int, max_opcion: int) -> int:
@@ -590,9 +775,10 @@ class CLIHandler:
                     self.mostrar_error("La capacidad debe ser un número entero válido")
 
             descripcion = input("Descripción (opcional): ").strip() or None
+            sede = input("Sede (opcional): ").strip() or None
 
             # Crear sala usando el servicio (SOLO lógica de negocio)
-            sala_id = self.sala_service.crear_sala(nombre, capacidad, descripcion)
+            sala_id = self.sala_service.crear_sala(nombre, capacidad, descripcion, sede)
             self.mostrar_exito(f"Sala '{nombre}' creada exitosamente (ID: {sala_id})")
 
         except Exception as e:
@@ -658,11 +844,19 @@ class CLIHandler:
                 self.mostrar_error("Estado inválido. Use: disponible, reservada o mantenimiento")
                 return
 
+            print("\nHorario de apertura: bloques 'días inicio-fin' separados por ';' "
+                  "(p. ej. 0-4 08:00-18:00; 5 09:00-13:00), '-' para quitarlo")
+            nuevo_horario = input(f"Nuevo horario [{self.formatear_horario(sala_actual.horarios_disponibles)}]: ").strip()
+            horarios = self.leer_horario_apertura(nuevo_horario) if nuevo_horario else None
+
             # Confirmar cambios
             print(f"\n¿Confirmar cambios?")
             print(f"Nombre: {sala_actual.nombre} → {nuevo_nombre}")
             print(f"Capacidad: {sala_actual.capacidad} → {nueva_capacidad}")
             print(f"Estado: {sala_actual.estado.value} → {nuevo_estado}")
+            if horarios is not None:
+                print(f"Horario: {self.formatear_horario(sala_actual.horarios_disponibles)} → "
+                      f"{self.formatear_horario(horarios)}")
 
             confirmar = input("\n¿Continuar? (s/n): ").lower().strip()
             if confirmar not in ['s', 'si', 'sí', 'y', 'yes']:
@@ -670,7 +864,9 @@ class CLIHandler:
                 return
 
             # Ejecutar actualización usando el servicio
-            self.sala_service.actualizar_sala(sala_id, nuevo_nombre, nueva_capacidad, nueva_descripcion, nuevo_estado)
+            self.sala_service.actualizar_sala(
+                sala_id, nuevo_nombre, nueva_capacidad, nueva_descripcion, nuevo_estado, horarios
+            )
             self.mostrar_exito("Sala actualizada exitosamente")
 
         except ValueError as e:
@@ -680,6 +876,31 @@ class CLIHandler:
         finally:
             self.pausar()
 
+    def leer_horario_apertura(self, texto: str) -> List[dict]:
+        """Convierte '0-4 08:00-18:00; 5 09:00-13:00' en bloques de horarios_disponibles"""
+        if texto == '-':
+            return []
+        bloques = []
+        for parte in texto.split(';'):
+            dias_texto, _, horas = parte.strip().partition(' ')
+            inicio, _, fin = horas.strip().partition('-')
+            primero, _, ultimo = dias_texto.partition('-')
+            dias = list(range(int(primero), int(ultimo or primero) + 1))
+            if not dias or min(dias) < 0 or max(dias) > 6:
+                raise ValueError("Los días van de 0 (lunes) a 6 (domingo)")
+            if time.fromisoformat(inicio) >= time.fromisoformat(fin):
+                raise ValueError("La hora de apertura debe ser anterior a la de cierre")
+            bloques.append({'dias': dias, 'inicio': inicio, 'fin': fin})
+        return bloques
+
+    def formatear_horario(self, horarios: Optional[List[dict]]) -> str:
+        if not horarios:
+            return "sin restricción"
+        return "; ".join(
+            f"{','.join(str(dia) for dia in bloque.get('dias', range(7)))} {bloque['inicio']}-{bloque['fin']}"
+            for bloque in horarios
+        )
+
     def eliminar_sala(self):
         """Elimina una sala existente"""
         try:
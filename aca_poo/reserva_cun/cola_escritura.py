@@ -0,0 +1,246 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional
+
+from database import DatabaseManager, ConexionDirecta, SENTENCIAS_EN_CACHE, es_memoria
+from models import Reserva
+from repositories import ReservaRepository
+
+
+@dataclass
+class _Operacion:
+    funcion: Callable
+    args: tuple
+    futuro: Future = field(default_factory=Future)
+
+
+_FIN = object()
+
+
+class ColaEscrituraAgrupada:
+    """Cola de un solo escritor que confirma varias escrituras juntas.
+
+    Las operaciones `crear`, `actualizar` y `cancelar` de muchos llamadores se
+    acumulan hasta `tamano_lote` operaciones o `ventana_ms` milisegundos y se
+    ejecutan en una única transacción (un solo fsync). Cada operación corre en
+    su propio SAVEPOINT: si falla (p. ej. por un cruce de horario) solo se
+    revierte ella y su futuro recibe la excepción; las demás se confirman.
+
+    `bloque()` reserva un turno del lote para que el llamador ejecute varias
+    lecturas y escrituras seguidas (validar y luego escribir) sobre la
+    conexión de la cola, con el hilo escritor detenido mientras tanto.
+
+    Ventanas más largas y lotes más grandes aumentan el rendimiento a costa de
+    la latencia de cada escritura.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, tamano_lote: int = 32, ventana_ms: float = 2.0):
+        if es_memoria(db_manager.db_path):
+            raise ValueError("La cola de escritura requiere una base de datos en archivo")
+        if tamano_lote < 1:
+            raise ValueError("El tamaño de lote debe ser al menos 1")
+
+        self.db_path = db_manager.db_path
+        self.tamano_lote = tamano_lote
+        self.ventana_ms = ventana_ms
+        self.lotes_confirmados = 0
+        self.operaciones_confirmadas = 0
+
+        self._cola: queue.Queue = queue.Queue()
+        self._conn = sqlite3.connect(
+            self.db_path, isolation_level=None, check_same_thread=False, cached_statements=SENTENCIAS_EN_CACHE
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        for pragma in db_manager.perfil.pragmas():
+            self._conn.execute(pragma)
+        self.db = ConexionDirecta(lambda: self._conn, autocommit=False)
+        self._repo = ReservaRepository(self.db)
+        self._hilo = threading.Thread(target=self._bucle, name="cola-escritura", daemon=True)
+        self._hilo.start()
+
+    # ========== API PÚBLICA ==========
+
+    def crear(self, reserva: Reserva) -> Future:
+        """Encola la creación de una reserva; el futuro entrega su ID"""
+        return self._encolar(self._repo.crear, reserva)
+
+    def actualizar(self, reserva: Reserva) -> Future:
+        """Encola la actualización completa de una reserva"""
+        return self._encolar(self._repo.actualizar, reserva)
+
+    def cancelar(self, reserva_id: int, version: Optional[int] = None) -> Future:
+        """Encola la cancelación de una reserva activa
+
+        El futuro entrega False si la reserva no está activa o, con
+        `version`, si cambió desde que se leyó.
+        """
+        return self._encolar(self._repo.cancelar, reserva_id, version)
+
+    @contextmanager
+    def bloque(self) -> Iterator[ConexionDirecta]:
+        """Ejecuta el cuerpo del `with` como una operación más del lote
+
+        Cuando el lote llega a este turno, el hilo de la cola abre su
+        SAVEPOINT y espera; el llamador usa la conexión entregada en
+        exclusiva, ve lo ya escrito en el lote y sus escrituras se confirman
+        con él. Si el cuerpo lanza una excepción solo se revierte su
+        SAVEPOINT. Al salir espera a que el lote sea durable.
+        """
+        turno = threading.Event()
+        terminado = threading.Event()
+        fallido = []
+
+        def esperar():
+            turno.set()
+            terminado.wait()
+            if fallido:
+                raise RuntimeError("Bloque revertido")
+
+        futuro = self._encolar(esperar)
+        # Si el lote falla antes de llegar a este turno, el futuro termina sin ejecutarlo
+        futuro.add_done_callback(lambda _: turno.set())
+        turno.wait()
+        if futuro.done():
+            futuro.result()
+
+        try:
+            yield self.db
+        except BaseException:
+            fallido.append(True)
+            terminado.set()
+            futuro.exception()
+            raise
+        terminado.set()
+        futuro.result()
+
+    def cerrar(self):
+        """Procesa lo pendiente y detiene el hilo escritor"""
+        self._cola.put(_FIN)
+        self._hilo.join()
+        self._conn.close()
+
+    # ========== HILO ESCRITOR ==========
+
+    def _encolar(self, funcion: Callable, *args) -> Future:
+        if not self._hilo.is_alive():
+            raise RuntimeError("La cola de escritura está cerrada")
+        operacion = _Operacion(funcion, args)
+        self._cola.put(operacion)
+        return operacion.futuro
+
+    def _bucle(self):
+        terminar = False
+        while not terminar:
+            primera = self._cola.get()
+            if primera is _FIN:
+                break
+
+            lote = [primera]
+            limite = time.monotonic() + self.ventana_ms / 1000
+            while len(lote) < self.tamano_lote:
+                restante = limite - time.monotonic()
+                try:
+                    operacion = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if operacion is _FIN:
+                    terminar = True
+                    break
+                lote.append(operacion)
+
+            self._ejecutar_lote(lote)
+
+    def _ejecutar_lote(self, lote):
+        resultados = []
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+            for operacion in lote:
+                if not operacion.futuro.set_running_or_notify_cancel():
+                    continue
+                self._conn.execute("SAVEPOINT operacion")
+                try:
+                    resultado = operacion.funcion(*operacion.args)
+                    self._conn.execute("RELEASE operacion")
+                    resultados.append((operacion, resultado, None))
+                except Exception as e:
+                    self._conn.execute("ROLLBACK TO operacion")
+                    self._conn.execute("RELEASE operacion")
+                    resultados.append((operacion, None, e))
+            self._conn.execute("COMMIT")
+        except Exception as e:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            for operacion in lote:
+                if not operacion.futuro.done():
+                    operacion.futuro.set_exception(e)
+            return
+
+        # Los futuros se resuelven solo cuando el lote ya es durable
+        self.lotes_confirmados += 1
+        for operacion, resultado, error in resultados:
+            if error is None:
+                self.operaciones_confirmadas += 1
+                operacion.futuro.set_result(resultado)
+            else:
+                operacion.futuro.set_exception(error)
+
+
+class ReservaRepositoryAgrupado(ReservaRepository):
+    """ReservaRepository cuyas escrituras pasan por una ColaEscrituraAgrupada.
+
+    Las lecturas siguen usando el DatabaseManager; `crear`, `actualizar` y
+    `cancelar` esperan el resultado de su lote, por lo que los servicios lo
+    usan sin cambios. Dentro de `transaccion()` el hilo actual ocupa un
+    `bloque()` de la cola: lecturas y escrituras van directo a la conexión
+    de la cola, así que validar y escribir quedan en la misma operación.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, cola: ColaEscrituraAgrupada):
+        self._local = threading.local()
+        super().__init__(db_manager)
+        self.cola = cola
+
+    @property
+    def db(self):
+        return getattr(self._local, "db", None) or self._db
+
+    @db.setter
+    def db(self, db_manager):
+        self._db = db_manager
+
+    def _en_bloque(self) -> bool:
+        return getattr(self._local, "db", None) is not None
+
+    @contextmanager
+    def transaccion(self, sala_id: int):
+        if self._en_bloque():
+            yield self.db
+            return
+        with self.cola.bloque() as db:
+            self._local.db = db
+            try:
+                yield db
+            finally:
+                self._local.db = None
+
+    def crear(self, reserva: Reserva) -> int:
+        if self._en_bloque():
+            return super().crear(reserva)
+        return self.cola.crear(reserva).result()
+
+    def actualizar(self, reserva: Reserva) -> None:
+        if self._en_bloque():
+            super().actualizar(reserva)
+            return
+        self.cola.actualizar(reserva).result()
+
+    def cancelar(self, reserva_id: int, version: Optional[int] = None) -> bool:
+        if self._en_bloque():
+            return super().cancelar(reserva_id, version)
+        return self.cola.cancelar(reserva_id, version).result()
@@ -0,0 +1,308 @@
+import argparse
+import contextlib
+import json
+import shlex
+import sys
+from datetime import date, time
+from typing import Iterable, List, Optional, TextIO
+
+from database import DatabaseManager
+from fragmentacion import EnrutadorFragmentos
+from serializacion import serializar, sala_a_dict, reserva_a_dict, estudiante_a_dict, espera_a_dict
+
+
+class ErrorComando(ValueError):
+    """Argumentos inválidos en una línea de comando"""
+
+
+class _Parser(argparse.ArgumentParser):
+    """ArgumentParser que informa los errores con una excepción en lugar de salir
+
+    Así una línea mal escrita en modo lote no termina el proceso. En ese modo
+    los subcomandos se construyen sin `--help`, que escribiría la ayuda en la
+    salida NDJSON y terminaría el lote.
+    """
+
+    def error(self, message):
+        raise ErrorComando(f"{self.prog}: {message}")
+
+
+def _hora(valor: str) -> time:
+    return time.fromisoformat(valor)
+
+
+class InterpreteComandos:
+    """Operaciones de reservas como subcomandos no interactivos con salida JSON.
+
+    Se construye una vez sobre los servicios ya inicializados; cada llamada a
+    `ejecutar` solo interpreta argumentos y llama al servicio, de modo que un
+    lote de miles de líneas reutiliza las mismas conexiones y cachés.
+    """
+
+    def __init__(self, reserva_service, sala_service, estudiante_service):
+        self.reserva_service = reserva_service
+        self.sala_service = sala_service
+        self.estudiante_service = estudiante_service
+        self.parser = self._construir_parser(ayuda=True)
+        self.parser_lote = self._construir_parser(ayuda=False)
+
+    def _construir_parser(self, ayuda: bool) -> _Parser:
+        parser = _Parser(prog="reserva-cun", add_help=False)
+        comandos = parser.add_subparsers(dest="comando", required=True)
+
+        def nuevo(nombre: str, **opciones) -> _Parser:
+            return comandos.add_parser(nombre, add_help=ayuda, **opciones)
+
+        reservar = nuevo("reservar", help="Crea una reserva")
+        reservar.add_argument("--estudiante", type=int, required=True)
+        reservar.add_argument("--sala", type=int, required=True)
+        reservar.add_argument("--fecha", type=date.fromisoformat, required=True)
+        reservar.add_argument("--inicio", type=_hora, required=True)
+        reservar.add_argument("--fin", type=_hora, required=True)
+        reservar.set_defaults(funcion=self._reservar)
+
+        cancelar = nuevo("cancelar", help="Cancela una reserva")
+        cancelar.add_argument("reserva", type=int)
+        cancelar.add_argument("--admin", action="store_true", help="Aplica la política de administrador")
+        cancelar.set_defaults(funcion=self._cancelar)
+
+        modificar = nuevo("modificar", help="Cambia sala, fecha u horario de una reserva")
+        modificar.add_argument("reserva", type=int)
+        modificar.add_argument("--sala", type=int)
+        modificar.add_argument("--fecha", type=date.fromisoformat)
+        modificar.add_argument("--inicio", type=_hora)
+        modificar.add_argument("--fin", type=_hora)
+        modificar.set_defaults(funcion=self._modificar)
+
+        listar = nuevo("listar", help="Reservas de una sala o de un estudiante")
+        filtro = listar.add_mutually_exclusive_group(required=True)
+        filtro.add_argument("--sala", type=int)
+        filtro.add_argument("--estudiante", type=int)
+        listar.add_argument("--historial", action="store_true", help="Incluye la base de archivo adjunta")
+        listar.set_defaults(funcion=self._listar)
+
+        reserva = nuevo("reserva", help="Detalle de una reserva")
+        reserva.add_argument("reserva", type=int)
+        reserva.set_defaults(funcion=self._reserva)
+
+        disponibilidad = nuevo("disponibilidad", help="Horarios libres o disponibilidad de un rango")
+        disponibilidad.add_argument("--sala", type=int, required=True)
+        disponibilidad.add_argument("--fecha", type=date.fromisoformat, required=True)
+        disponibilidad.add_argument("--inicio", type=_hora)
+        disponibilidad.add_argument("--fin", type=_hora)
+        disponibilidad.set_defaults(funcion=self._disponibilidad)
+
+        huecos = nuevo("huecos", help="Primeros huecos libres en cualquier sala")
+        huecos.add_argument("--duracion", type=int, required=True, help="Minutos")
+        huecos.add_argument("--capacidad", type=int, default=1)
+        huecos.add_argument("--desde", type=date.fromisoformat)
+        huecos.add_argument("--hasta", type=date.fromisoformat)
+        huecos.add_argument("--inicio", type=_hora, default=time(8, 0))
+        huecos.add_argument("--fin", type=_hora, default=time(20, 0))
+        huecos.add_argument("-k", type=int, default=5)
+        huecos.set_defaults(funcion=self._huecos)
+
+        salas = nuevo("salas", help="Lista o busca salas")
+        salas.add_argument("--q", help="Texto a buscar")
+        salas.add_argument("--disponibles", action="store_true")
+        salas.add_argument("--limite", type=int, default=20)
+        salas.set_defaults(funcion=self._salas)
+
+        estudiantes = nuevo("estudiantes", help="Busca estudiantes")
+        estudiantes.add_argument("--q", required=True, help="Texto a buscar")
+        estudiantes.add_argument("--limite", type=int, default=20)
+        estudiantes.set_defaults(funcion=self._estudiantes)
+
+        registrar = nuevo("registrar-estudiante", help="Registra un estudiante")
+        registrar.add_argument("--identificacion", required=True)
+        registrar.add_argument("--nombre", required=True)
+        registrar.add_argument("--email")
+        registrar.set_defaults(funcion=self._registrar_estudiante)
+
+        espera = nuevo("esperar", help="Anota un horario ocupado en la lista de espera")
+        espera.add_argument("--estudiante", type=int, required=True)
+        espera.add_argument("--sala", type=int, required=True)
+        espera.add_argument("--fecha", type=date.fromisoformat, required=True)
+        espera.add_argument("--inicio", type=_hora, required=True)
+        espera.add_argument("--fin", type=_hora, required=True)
+        espera.add_argument("--prioridad", type=int, default=0)
+        espera.set_defaults(funcion=self._esperar)
+
+        esperas = nuevo("esperas", help="Solicitudes en lista de espera de un estudiante")
+        esperas.add_argument("--estudiante", type=int, required=True)
+        esperas.set_defaults(funcion=self._esperas)
+
+        return parser
+
+    def ejecutar(self, argv: List[str], lote: bool = False):
+        """Interpreta y ejecuta un comando; devuelve un valor serializable a JSON
+
+        Raises: ErrorComando si los argumentos no son válidos, ValueError si
+        el servicio rechaza la operación.
+        """
+        args = (self.parser_lote if lote else self.parser).parse_args(argv)
+        return args.funcion(args)
+
+    def ejecutar_lote(self, lineas: Iterable[str], salida: TextIO, detener_en_error: bool = False) -> int:
+        """Ejecuta un comando por línea y escribe un resultado NDJSON por cada uno
+
+        Las líneas vacías y las que empiezan con '#' se ignoran.
+        Returns: cantidad de comandos con error
+        """
+        errores = 0
+        for numero, linea in enumerate(lineas, 1):
+            linea = linea.strip()
+            if not linea or linea.startswith('#'):
+                continue
+            try:
+                registro = {'linea': numero, 'ok': True, 'resultado': self.ejecutar(shlex.split(linea), lote=True)}
+            except ValueError as e:
+                errores += 1
+                registro = {'linea': numero, 'ok': False, 'error': str(e)}
+            salida.write(json.dumps(registro, default=serializar, ensure_ascii=False) + "\n")
+            if errores and detener_en_error:
+                break
+        salida.flush()
+        return errores
+
+    # ========== COMANDOS ==========
+
+    def _reservar(self, args):
+        reserva_id = self.reserva_service.crear_reserva(args.estudiante, args.sala, args.fecha, args.inicio, args.fin)
+        return {'id': reserva_id}
+
+    def _cancelar(self, args):
+        self.reserva_service.cancelar_reserva(args.reserva, es_administrador=args.admin)
+        return {'id': args.reserva, 'cancelada': True}
+
+    def _modificar(self, args):
+        self.reserva_service.modificar_reserva(args.reserva, args.sala, args.fecha, args.inicio, args.fin)
+        return reserva_a_dict(self.reserva_service.obtener_reserva_por_id(args.reserva))
+
+    def _listar(self, args):
+        if args.sala is not None:
+            reservas = self.reserva_service.obtener_reservas_por_sala(args.sala, args.historial)
+        else:
+            reservas = self.reserva_service.obtener_reservas_por_estudiante(args.estudiante, args.historial)
+        return [reserva_a_dict(reserva) for reserva in reservas]
+
+    def _reserva(self, args):
+        reserva = self.reserva_service.obtener_reserva_por_id(args.reserva)
+        if not reserva:
+            raise ValueError("Reserva no encontrada")
+        return reserva_a_dict(reserva)
+
+    def _disponibilidad(self, args):
+        if args.inicio is None and args.fin is None:
+            horarios = self.reserva_service.obtener_horarios_disponibles(args.sala, args.fecha)
+            return {'sala_id': args.sala, 'fecha': args.fecha, 'horarios': horarios}
+        if args.inicio is None or args.fin is None:
+            raise ErrorComando("disponibilidad: indique --inicio y --fin juntos")
+        disponible = self.reserva_service.consultar_disponibilidad(args.sala, args.fecha, args.inicio, args.fin)
+        return {'sala_id': args.sala, 'fecha': args.fecha, 'disponible': disponible}
+
+    def _huecos(self, args):
+        huecos = self.reserva_service.buscar_primeros_huecos(
+            args.capacidad, args.duracion, args.desde, args.hasta, args.inicio, args.fin, args.k
+        )
+        return [
+            {'sala': sala_a_dict(hueco['sala']), 'fecha': hueco['fecha'],
+             'hora_inicio': hueco['inicio'], 'hora_fin': hueco['fin']}
+            for hueco in huecos
+        ]
+
+    def _salas(self, args):
+        if args.q:
+            salas = self.sala_service.buscar_salas(args.q, args.limite)
+        elif args.disponibles:
+            salas = self.sala_service.listar_salas_disponibles()
+        else:
+            salas = self.sala_service.listar_salas()
+        return [sala_a_dict(sala) for sala in salas[:args.limite]]
+
+    def _estudiantes(self, args):
+        return [estudiante_a_dict(e) for e in self.estudiante_service.buscar_estudiantes(args.q, args.limite)]
+
+    def _registrar_estudiante(self, args):
+        estudiante_id = self.estudiante_service.registrar_estudiante(args.identificacion, args.nombre, args.email)
+        return {'id': estudiante_id}
+
+    def _esperar(self, args):
+        espera_id = self.reserva_service.unirse_lista_espera(
+            args.estudiante, args.sala, args.fecha, args.inicio, args.fin, prioridad=args.prioridad
+        )
+        return {'id': espera_id}
+
+    def _esperas(self, args):
+        return [espera_a_dict(espera) for espera in self.reserva_service.obtener_esperas_por_estudiante(args.estudiante)]
+
+
+def _imprimir(resultado, formato: str, salida: TextIO):
+    if formato == "ndjson" and isinstance(resultado, list):
+        for elemento in resultado:
+            salida.write(json.dumps(elemento, default=serializar, ensure_ascii=False) + "\n")
+    else:
+        indentacion = 2 if formato == "json" and salida.isatty() else None
+        salida.write(json.dumps(resultado, default=serializar, ensure_ascii=False, indent=indentacion) + "\n")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Punto de entrada no interactivo: `python main.py <comando> [opciones]`
+
+    `lote [ARCHIVO]` lee un comando por línea (de un archivo o de la entrada
+    estándar) y responde una línea NDJSON por comando.
+
+    Returns: código de salida (0 éxito, 1 error de la operación, 2 uso incorrecto)
+    """
+    from main import construir_servicios
+
+    argv = sys.argv[1:] if argv is None else argv
+    generales = argparse.ArgumentParser(
+        prog="reserva-cun",
+        description="Comandos no interactivos de reservas con salida JSON",
+        epilog="Comandos: reservar, cancelar, modificar, listar, reserva, disponibilidad, huecos, salas, "
+               "estudiantes, registrar-estudiante, esperar, esperas, lote. "
+               "Use '<comando> --help' para ver sus opciones.",
+    )
+    generales.add_argument("--db", default="reserva_cun.db", help="Ruta de la base de datos SQLite")
+    generales.add_argument("--fragmentos", metavar="DIRECTORIO", help="Directorio de fragmentos por sede")
+    generales.add_argument("--perfil", help="Perfil de almacenamiento (por defecto $RESERVA_CUN_PERFIL o durable)")
+    generales.add_argument("--formato", choices=("json", "ndjson"), default="json",
+                           help="ndjson escribe un elemento por línea en los listados")
+    generales.add_argument("comando", help="Comando a ejecutar")
+    generales.add_argument("argumentos", nargs=argparse.REMAINDER)
+    args = generales.parse_args(argv)
+
+    # Los mensajes de inicialización no deben mezclarse con la salida JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        db_manager = DatabaseManager(args.db, perfil=args.perfil)
+        enrutador = EnrutadorFragmentos(db_manager, args.fragmentos) if args.fragmentos else None
+        interprete = InterpreteComandos(*construir_servicios(db_manager, enrutador=enrutador))
+
+    try:
+        if args.comando == "lote":
+            opciones = argparse.ArgumentParser(prog="reserva-cun lote")
+            opciones.add_argument("archivo", nargs="?", default="-", help="Archivo de comandos ('-' = entrada estándar)")
+            opciones.add_argument("--detener-en-error", action="store_true")
+            lote = opciones.parse_args(args.argumentos)
+            with (contextlib.nullcontext(sys.stdin) if lote.archivo == "-"
+                  else open(lote.archivo, encoding="utf-8")) as entrada:
+                errores = interprete.ejecutar_lote(entrada, sys.stdout, lote.detener_en_error)
+            return 1 if errores else 0
+
+        _imprimir(interprete.ejecutar([args.comando] + args.argumentos), args.formato, sys.stdout)
+        return 0
+    except ErrorComando as e:
+        sys.stderr.write(json.dumps({'error': str(e)}, ensure_ascii=False) + "\n")
+        return 2
+    except ValueError as e:
+        sys.stderr.write(json.dumps({'error': str(e)}, ensure_ascii=False) + "\n")
+        return 1
+    finally:
+        if enrutador:
+            enrutador.cerrar()
+        db_manager.cerrar()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,465 @@
+import argparse
+import asyncio
+import contextlib
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from datetime import date, time, timedelta
+from typing import Callable, Dict
+
+from archivo import ArchivadorReservas, ArchivoFragmentado
+from async_repositories import AsyncSalaRepository, AsyncReservaRepository, AsyncEstudianteRepository
+from async_services import AsyncReservaService, AsyncSalaService, AsyncEstudianteService
+from cola_escritura import ColaEscrituraAgrupada
+from database import EjecutorSQLite
+from fragmentacion import BLOQUE_IDS, EnrutadorFragmentos
+from main import construir_servicios
+from models import Estudiante, Sala
+from plantilla import PlantillaBase
+from respaldo import RespaldoEnLinea, RespaldoFragmentado
+from repositories import EstudianteRepository
+from services import CuotaExcedida
+
+COMPROBACIONES: Dict[str, Callable[[PlantillaBase], None]] = {}
+
+
+def comprobacion(funcion: Callable[[PlantillaBase], None]) -> Callable[[PlantillaBase], None]:
+    """Registra un escenario; su nombre es el de la función con guiones"""
+    COMPROBACIONES[funcion.__name__.replace("_", "-")] = funcion
+    return funcion
+
+
+def _comprobar(condicion, mensaje: str):
+    if not condicion:
+        raise AssertionError(mensaje)
+
+
+def _lunes(semanas: int = 1) -> date:
+    """Lunes de dentro de `semanas` semanas (1 = el próximo)"""
+    hoy = date.today()
+    return hoy + timedelta(days=7 - hoy.weekday() + 7 * (semanas - 1))
+
+
+@contextlib.contextmanager
+def _servicios_asincronos(db):
+    """Servicios asíncronos sobre un EjecutorSQLite de la base"""
+    ejecutor = EjecutorSQLite(db)
+    try:
+        sala_repo = AsyncSalaRepository(ejecutor)
+        reserva_repo = AsyncReservaRepository(ejecutor)
+        estudiante_repo = AsyncEstudianteRepository(ejecutor)
+        reservas = AsyncReservaService(reserva_repo, sala_repo, estudiante_repo)
+        yield reservas, AsyncSalaService(sala_repo, reservas), AsyncEstudianteService(estudiante_repo)
+    finally:
+        ejecutor.cerrar()
+
+
+# ========== ESCENARIOS ==========
+
+@comprobacion
+def series_asincronas(plantilla: PlantillaBase):
+    """Series, búsqueda de huecos y búsqueda de texto a través del EjecutorSQLite"""
+    with plantilla.base(en_archivo=True) as db, _servicios_asincronos(db) as (reservas, salas, estudiantes):
+        async def escenario():
+            lunes = _lunes()
+            serie = await reservas.crear_serie(1, 1, lunes, lunes + timedelta(days=14), time(9, 0), time(10, 0), [0])
+            _comprobar(len(serie["creadas"]) == 3, f"La serie creó {serie['creadas']}")
+            _comprobar(not await reservas.consultar_disponibilidad(1, lunes, time(9, 0), time(10, 0)),
+                       "La ocurrencia no ocupa la sala")
+
+            huecos = await reservas.buscar_primeros_huecos(4, 60, lunes, lunes, k=3)
+            _comprobar(len(huecos) == 3, f"buscar_primeros_huecos devolvió {huecos}")
+            _comprobar(await salas.buscar_salas("silenciosa"), "buscar_salas no encontró la sala")
+            _comprobar(await estudiantes.buscar_estudiantes("ana garc"), "buscar_estudiantes no encontró al estudiante")
+
+            canceladas = await reservas.cancelar_serie(serie["serie_id"], es_administrador=True)
+            _comprobar(canceladas == 3, f"cancelar_serie canceló {canceladas} ocurrencias")
+            _comprobar(await reservas.consultar_disponibilidad(1, lunes, time(9, 0), time(10, 0)),
+                       "La ocurrencia cancelada sigue ocupando la sala")
+
+        asyncio.run(escenario())
+
+
+@comprobacion
+def lista_espera_asincrona(plantilla: PlantillaBase):
+    """Cancelar por el EjecutorSQLite asigna el horario al primero de la lista de espera"""
+    with plantilla.base(en_archivo=True) as db, _servicios_asincronos(db) as (reservas, _, _):
+        async def escenario():
+            martes = _lunes() + timedelta(days=1)
+            reserva_id = await reservas.crear_reserva(2, 2, martes, time(14, 0), time(15, 0))
+            primera = await reservas.unirse_lista_espera(3, 2, martes, time(14, 0), time(15, 0))
+            segunda = await reservas.unirse_lista_espera(4, 2, martes, time(14, 0), time(15, 0), prioridad=-1)
+            _comprobar(len(await reservas.obtener_esperas_por_estudiante(3)) == 1, "La espera no quedó registrada")
+
+            _comprobar(await reservas.cancelar_reserva(reserva_id), "cancelar_reserva devolvió False")
+            promovidas = [r for r in await reservas.obtener_reservas_por_estudiante(3) if r.fecha_reserva == martes]
+            _comprobar(len(promovidas) == 1, f"La espera {primera} no se convirtió en reserva")
+            _comprobar(await reservas.retirar_de_lista_espera(segunda, 4), "No se pudo retirar la segunda espera")
+
+        asyncio.run(escenario())
+
+
+@comprobacion
+def lista_espera_al_liberar(plantilla: PlantillaBase):
+    """Cancelar una serie o mover una reserva también asigna los horarios liberados a la lista de espera"""
+    with plantilla.base() as db:
+        reservas, _, _ = construir_servicios(db)
+        lunes = _lunes()
+        serie = reservas.crear_serie(1, 1, lunes, lunes + timedelta(days=7), time(9, 0), time(10, 0), [0])
+        esperas = [reservas.unirse_lista_espera(e, 1, fecha, time(9, 0), time(10, 0))
+                   for e, fecha in ((2, lunes), (3, lunes + timedelta(days=7)))]
+        reservas.cancelar_serie(serie["serie_id"], es_administrador=True)
+        for espera_id in esperas:
+            espera = reservas.reserva_repo.obtener_espera(espera_id)
+            _comprobar(espera.reserva_id, f"La espera {espera_id} no recibió la ocurrencia cancelada")
+
+        martes = lunes + timedelta(days=1)
+        movida = reservas.crear_reserva(1, 2, martes, time(14, 0), time(15, 0))
+        espera_id = reservas.unirse_lista_espera(4, 2, martes, time(14, 0), time(15, 0))
+        reservas.modificar_reserva(movida, nueva_hora_inicio=time(16, 0), nueva_hora_fin=time(17, 0))
+        _comprobar(reservas.reserva_repo.obtener_espera(espera_id).reserva_id,
+                   "La espera no recibió el horario que dejó la reserva modificada")
+
+
+@comprobacion
+def avisos_de_series(plantilla: PlantillaBase):
+    """Crear y cancelar una serie avisa a los suscriptores una vez por sala y día"""
+    with plantilla.base() as db:
+        reservas, _, _ = construir_servicios(db)
+        avisos = []
+        reservas.suscribir_disponibilidad(avisos.append, sala_id=1)
+        lunes = _lunes()
+        serie = reservas.crear_serie(1, 1, lunes, lunes + timedelta(days=7), time(9, 0), time(10, 0), [0])
+        reservas.cancelar_serie(serie["serie_id"], es_administrador=True)
+        recibidos = [(aviso.tipo, aviso.fecha) for aviso in avisos]
+        esperados = [(tipo, fecha) for tipo in ("creada", "cancelada") for fecha in (lunes, lunes + timedelta(days=7))]
+        _comprobar(recibidos == esperados, f"Avisos recibidos: {recibidos}")
+
+
+@comprobacion
+def series_invalidas(plantilla: PlantillaBase):
+    """Intervalos nulos y rangos enormes se rechazan como errores de validación, sin expandir la serie"""
+    with plantilla.base() as db:
+        reservas, _, _ = construir_servicios(db)
+        lunes = _lunes()
+        for fecha_fin, intervalo in ((lunes + timedelta(days=30), 0), (date.max, 1)):
+            try:
+                reservas.crear_serie(1, 1, lunes, fecha_fin, time(9, 0), time(10, 0), [0],
+                                     intervalo_semanas=intervalo)
+            except ValueError as e:
+                _comprobar("Errores de validación" in str(e), f"Error inesperado: {e}")
+            else:
+                raise AssertionError(f"Se creó una serie hasta {fecha_fin} cada {intervalo} semanas")
+
+
+@comprobacion
+def cuota_modificar_serie(plantilla: PlantillaBase):
+    """Mover una ocurrencia de serie con el máximo de reservas activas no cuenta como reserva nueva"""
+    with plantilla.base() as db:
+        reservas, _, _ = construir_servicios(db)
+        lunes = _lunes(2)
+        sueltas = [reservas.crear_reserva(1, 1, lunes + timedelta(days=dia), time(8, 0), time(8, 30))
+                   for dia in range(reservas.politica_cuotas.max_reservas_activas)]
+        serie = reservas.crear_serie(1, 2, lunes, lunes + timedelta(days=7), time(10, 0), time(11, 0), [2])
+        ocurrencia = next(r for r in reservas.obtener_reservas_por_estudiante(1) if r.serie_id == serie["serie_id"])
+
+        _comprobar(reservas.modificar_reserva(ocurrencia.id, nueva_hora_inicio=time(11, 0), nueva_hora_fin=time(12, 0)),
+                   "No se pudo mover la ocurrencia")
+        _comprobar(reservas.modificar_reserva(sueltas[0], nueva_hora_inicio=time(9, 0), nueva_hora_fin=time(9, 30)),
+                   "No se pudo mover una reserva suelta estando en el límite")
+        try:
+            reservas.crear_reserva(1, 3, lunes, time(15, 0), time(16, 0))
+        except CuotaExcedida:
+            pass
+        else:
+            raise AssertionError("Se aceptó una reserva suelta por encima del máximo")
+
+
+@comprobacion
+def modificar_concurrente(plantilla: PlantillaBase):
+    """Varias modificaciones simultáneas hacia el mismo horario: solo una lo obtiene"""
+    hilos = 8
+    with plantilla.base(en_archivo=True) as db:
+        reservas, _, _ = construir_servicios(db)
+        martes = _lunes() + timedelta(days=1)
+        ids = [reservas.crear_reserva(1 + i % 5, 1 + i % 4, martes, time(8 + i, 0), time(8 + i, 30))
+               for i in range(hilos)]
+        barrera = threading.Barrier(hilos)
+        resultados = []
+
+        def mover(reserva_id: int):
+            barrera.wait()
+            try:
+                resultados.append(reservas.modificar_reserva(reserva_id, 4, martes, time(18, 0), time(19, 0)))
+            except ValueError:
+                resultados.append(False)
+
+        trabajadores = [threading.Thread(target=mover, args=(reserva_id,)) for reserva_id in ids]
+        for trabajador in trabajadores:
+            trabajador.start()
+        for trabajador in trabajadores:
+            trabajador.join()
+        ocupantes = reservas.reserva_repo.obtener_activas_por_sala_y_fecha(4, martes)
+        ocupantes = [r for r in ocupantes if r.hora_inicio < time(19, 0) and r.hora_fin > time(18, 0)]
+        _comprobar(resultados.count(True) == 1 and len(ocupantes) == 1,
+                   f"{resultados.count(True)} modificaciones obtuvieron el horario; {len(ocupantes)} reservas lo ocupan")
+
+
+@comprobacion
+def cuotas_asincronas(plantilla: PlantillaBase):
+    """Las cuotas y la modificación de ocurrencias funcionan a través del EjecutorSQLite"""
+    with plantilla.base(en_archivo=True) as db, _servicios_asincronos(db) as (reservas, _, _):
+        async def escenario():
+            lunes = _lunes(2)
+            maximo = reservas._service.politica_cuotas.max_reservas_activas
+            for dia in range(maximo):
+                await reservas.crear_reserva(2, 1, lunes + timedelta(days=dia), time(8, 0), time(8, 30))
+            serie = await reservas.crear_serie(2, 2, lunes, lunes, time(10, 0), time(11, 0), [0])
+            ocurrencia = next(
+                r for r in await reservas.obtener_reservas_por_estudiante(2) if r.serie_id == serie["serie_id"]
+            )
+            _comprobar(await reservas.modificar_reserva(ocurrencia.id, nueva_sala_id=3), "No se pudo mover la ocurrencia")
+            try:
+                await reservas.crear_reserva(2, 3, lunes, time(15, 0), time(16, 0))
+            except CuotaExcedida:
+                pass
+            else:
+                raise AssertionError("Se aceptó una reserva suelta por encima del máximo")
+
+        asyncio.run(escenario())
+
+
+@comprobacion
+def cola_escritura_transaccional(plantilla: PlantillaBase):
+    """Con escritura agrupada, validar y escribir siguen siendo atómicos y cancelar respeta la versión"""
+    hilos = 8
+    with plantilla.base(en_archivo=True) as db:
+        cola = ColaEscrituraAgrupada(db)
+        try:
+            reservas, _, _ = construir_servicios(db, cola_escritura=cola)
+            martes = _lunes() + timedelta(days=1)
+            barrera = threading.Barrier(hilos)
+            resultados = {"sala": [], "cuota": []}
+
+            def intentar(clave: str, *args):
+                barrera.wait()
+                try:
+                    resultados[clave].append(reservas.crear_reserva(*args))
+                except ValueError:
+                    pass
+
+            # Todos al mismo horario de la misma sala; luego un estudiante por encima de su cuota
+            escenarios = [
+                [("sala", 1 + i % 5, 1, martes, time(10, 0), time(11, 0)) for i in range(hilos)],
+                [("cuota", 5, 1 + i % 4, martes + timedelta(days=i // 4), time(12 + i % 4, 0), time(12 + i % 4, 30))
+                 for i in range(hilos)],
+            ]
+            for argumentos in escenarios:
+                trabajadores = [threading.Thread(target=intentar, args=args) for args in argumentos]
+                for trabajador in trabajadores:
+                    trabajador.start()
+                for trabajador in trabajadores:
+                    trabajador.join()
+            _comprobar(len(resultados["sala"]) == 1, f"{len(resultados['sala'])} reservas en el mismo horario")
+            maximo = reservas.politica_cuotas.max_reservas_activas
+            _comprobar(len(resultados["cuota"]) == maximo,
+                       f"{len(resultados['cuota'])} reservas activas con un máximo de {maximo}")
+
+            # Cancelar promueve la lista de espera dentro del lote
+            ocupada = resultados["sala"][0]
+            reservas.unirse_lista_espera(4, 1, martes, time(10, 0), time(11, 0))
+            _comprobar(reservas.cancelar_reserva(ocupada), "cancelar_reserva devolvió False")
+            _comprobar(any(r.fecha_reserva == martes for r in reservas.obtener_reservas_por_estudiante(4)),
+                       "La espera no se convirtió en reserva")
+
+            vigente = reservas.obtener_reserva_por_id(resultados["cuota"][0])
+            _comprobar(not reservas.reserva_repo.cancelar(vigente.id, vigente.version - 1),
+                       "cancelar con una versión vieja tuvo efecto")
+            _comprobar(reservas.reserva_repo.cancelar(vigente.id, vigente.version), "cancelar con la versión vigente falló")
+            _comprobar(not reservas.reserva_repo.cancelar(vigente.id), "cancelar dos veces devolvió True")
+        finally:
+            cola.cerrar()
+
+
+@comprobacion
+def sesion_con_error_atrapado(plantilla: PlantillaBase):
+    """Un error atrapado dentro de una sesión no descarta lo que la sesión ya escribió"""
+    with plantilla.base() as db:
+        estudiantes = EstudianteRepository(db)
+        with db.sesion():
+            estudiantes.crear(Estudiante(None, "9001", "Antes del error"))
+            try:
+                estudiantes.crear(Estudiante(None, "9001", "Identificación repetida"))
+            except sqlite3.IntegrityError:
+                pass
+            estudiantes.crear(Estudiante(None, "9002", "Después del error"))
+        for identificacion in ("9001", "9002"):
+            _comprobar(estudiantes.obtener_por_identificacion(identificacion),
+                       f"Se perdió el estudiante {identificacion} escrito en la sesión")
+
+
+@comprobacion
+def fragmentos_por_sede(plantilla: PlantillaBase):
+    """Listados entre fragmentos, cambios de sede y reservas que no pueden quedar en dos fragmentos"""
+    with plantilla.base(en_archivo=True) as db, tempfile.TemporaryDirectory() as directorio:
+        enrutador = EnrutadorFragmentos(db, directorio)
+        try:
+            reservas, salas_servicio, _ = construir_servicios(db, enrutador=enrutador)
+            salas = salas_servicio.sala_repo
+            norte = salas.crear(Sala(None, "Sala Norte", 6, sede="Norte"))
+            martes = _lunes() + timedelta(days=1)
+            en_norte = reservas.crear_reserva(1, norte, martes, time(9, 0), time(10, 0))
+            en_principal = reservas.crear_reserva(1, 1, martes, time(11, 0), time(12, 0))
+            _comprobar(en_norte // BLOQUE_IDS != en_principal // BLOQUE_IDS, "Las dos sedes comparten fragmento")
+
+            del_estudiante = [r.id for r in reservas.obtener_reservas_por_estudiante(1)]
+            _comprobar(del_estudiante == [en_principal, en_norte], f"obtener_por_estudiante devolvió {del_estudiante}")
+            _comprobar([r.sala.nombre for r in reservas.reserva_repo.iterar_por_sala(norte)] == ["Sala Norte"],
+                       "iterar_por_sala no completó el nombre de la sala")
+            _comprobar(len(reservas.reserva_repo.obtener_todas()) == 2, "obtener_todas no reunió ambos fragmentos")
+
+            # Mover de sede una sala con reservas las dejaría fuera de la revisión de conflictos
+            sala = salas.obtener_por_id(1)
+            sala.sede = "Norte"
+            try:
+                salas.actualizar(sala)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("Se cambió la sede de una sala con reservas en su fragmento")
+            otra = reservas.crear_reserva(2, norte, martes, time(11, 0), time(12, 0))
+            try:
+                reservas.modificar_reserva(otra, nueva_sala_id=1)
+            except ValueError:
+                pass
+            activas = reservas.reserva_repo.obtener_activas_por_sala_y_fecha(1, martes)
+            _comprobar([r.id for r in activas] == [en_principal],
+                       f"Sala 1 quedó con {[r.id for r in activas]} activas en el mismo horario")
+            reservas.cancelar_reserva(otra, es_administrador=True)
+
+            vacia = salas.crear(Sala(None, "Sala Nueva", 4))
+            sala = salas.obtener_por_id(vacia)
+            sala.sede = "Norte"
+            _comprobar(salas.actualizar(sala), "No se pudo cambiar la sede de una sala sin reservas")
+            _comprobar(enrutador.fragmento_de_sala(vacia) is enrutador.fragmento_de_sala(norte),
+                       "El enrutador no siguió el cambio de sede")
+            reservas.cancelar_reserva(en_norte, es_administrador=True)
+            salas.eliminar(norte)
+            try:
+                enrutador.fragmento_de_sala(norte)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("El enrutador sigue enviando reservas a una sala eliminada")
+            try:
+                RespaldoEnLinea(db.db_path).respaldar(os.path.join(directorio, "respaldo.db"))
+            except RespaldoFragmentado:
+                pass
+            else:
+                raise AssertionError("Se respaldó solo el catálogo con las reservas fragmentadas")
+        finally:
+            enrutador.cerrar()
+
+
+@comprobacion
+def archivo_de_series(plantilla: PlantillaBase):
+    """Las ocurrencias archivadas conservan su serie, también en un archivo previo a serie_id"""
+    with plantilla.base(en_archivo=True) as db:
+        reservas, _, _ = construir_servicios(db)
+        lunes = _lunes()
+        serie = reservas.crear_serie(1, 1, lunes, lunes + timedelta(days=7), time(9, 0), time(10, 0), [0])
+        reservas.cancelar_serie(serie["serie_id"], es_administrador=True)
+
+        archivador = ArchivadorReservas(db, retencion_dias=0)
+        # Archivo creado antes de que existieran las series: la migración agrega la columna
+        with contextlib.closing(sqlite3.connect(archivador.ruta_archivo)) as viejo:
+            viejo.execute(
+                "CREATE TABLE reservas (id INTEGER PRIMARY KEY, estudiante_id INTEGER NOT NULL, "
+                "sala_id INTEGER NOT NULL, fecha_reserva DATE NOT NULL, hora_inicio TIME NOT NULL, "
+                "hora_fin TIME NOT NULL, estado TEXT NOT NULL, creado_en TIMESTAMP, "
+                "actualizado_en TIMESTAMP, version INTEGER NOT NULL DEFAULT 1)"
+            )
+        archivadas = archivador.archivar(hoy=lunes + timedelta(days=30))
+        _comprobar(archivadas == 2, f"Se archivaron {archivadas} ocurrencias")
+        historial = reservas.reserva_repo.obtener_por_estudiante(1, incluir_archivo=True)
+        _comprobar([r.serie_id for r in historial] == [serie["serie_id"]] * 2,
+                   f"El historial perdió la serie: {[r.serie_id for r in historial]}")
+
+    with plantilla.base(en_archivo=True) as db, tempfile.TemporaryDirectory() as directorio:
+        enrutador = EnrutadorFragmentos(db, directorio)
+        try:
+            ArchivadorReservas(db).archivar()
+        except ArchivoFragmentado:
+            pass
+        else:
+            raise AssertionError("Se archivó main.reservas del catálogo con las reservas fragmentadas")
+        finally:
+            enrutador.cerrar()
+
+
+@comprobacion
+def archivo_interrumpido(plantilla: PlantillaBase):
+    """Un archivado cortado entre la copia y el borrado no pierde reservas y se completa al repetirlo"""
+    with plantilla.base(en_archivo=True) as db:
+        reservas, _, _ = construir_servicios(db)
+        lunes = _lunes()
+        ids = [reservas.crear_reserva(1, 1, lunes, time(h, 0), time(h + 1, 0)) for h in (9, 11)]
+        for reserva_id in ids:
+            reservas.cancelar_reserva(reserva_id, es_administrador=True)
+
+        archivador = ArchivadorReservas(db, retencion_dias=0)
+        db.execute_query(
+            "CREATE TRIGGER cortar_archivo BEFORE DELETE ON reservas BEGIN SELECT RAISE(ABORT, 'corte'); END"
+        )
+        try:
+            archivador.archivar(hoy=lunes + timedelta(days=30))
+        except sqlite3.IntegrityError:
+            pass
+        else:
+            raise AssertionError("El borrado no se interrumpió")
+        db.execute_query("DROP TRIGGER cortar_archivo")
+        copiadas = db.fetch_one("SELECT COUNT(*) AS n FROM archivo.reservas")["n"]
+        _comprobar(copiadas == 2, f"La copia confirmada tiene {copiadas} reservas")
+
+        archivadas = archivador.archivar(hoy=lunes + timedelta(days=30))
+        historial = [r.id for r in reservas.reserva_repo.obtener_por_estudiante(1, incluir_archivo=True)]
+        _comprobar(archivadas == 2 and sorted(historial) == ids,
+                   f"Al repetir se archivaron {archivadas} y el historial tiene {historial}")
+
+
+def main(argv=None):
+    """Ejecuta los escenarios de verificación sobre clones de una plantilla"""
+    parser = argparse.ArgumentParser(description="Escenarios de verificación sobre bases desechables")
+    parser.add_argument("nombres", nargs="*", help="Escenarios a ejecutar (por defecto, todos)")
+    parser.add_argument("--listar", action="store_true", help="Muestra los escenarios disponibles")
+    args = parser.parse_args(argv)
+
+    if args.listar:
+        for nombre, funcion in COMPROBACIONES.items():
+            print(f"{nombre:32} {funcion.__doc__}")
+        return 0
+
+    desconocidos = [nombre for nombre in args.nombres if nombre not in COMPROBACIONES]
+    if desconocidos:
+        parser.error(f"Escenarios desconocidos: {', '.join(desconocidos)}")
+
+    plantilla = PlantillaBase()
+    fallidos = 0
+    try:
+        for nombre in args.nombres or COMPROBACIONES:
+            try:
+                COMPROBACIONES[nombre](plantilla)
+            except Exception as e:
+                fallidos += 1
+                print(f"❌ {nombre}: {type(e).__name__}: {e}")
+            else:
+                print(f"✅ {nombre}")
+    finally:
+        plantilla.cerrar()
+    return 1 if fallidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,431 @@
+import argparse
+import contextlib
+import json
+import os
+import re
+import sys
+from datetime import date, timedelta
+from typing import Dict, List
+
+from archivo import VISTA_HISTORICA
+from database import COLUMNAS_BUSQUEDA
+
+
+def _texto_busqueda(tabla: str) -> str:
+    """Columnas de búsqueda concatenadas, para el LIKE de respaldo sin FTS5"""
+    return " || ' ' || ".join(f"COALESCE({tabla}.{columna}, '')" for columna in COLUMNAS_BUSQUEDA[tabla])
+
+
+def _busqueda(tabla: str, pesos: str) -> Dict[str, str]:
+    return {
+        f"{tabla}.buscar": f"""
+            SELECT {tabla}.* FROM {tabla}_fts
+            JOIN {tabla} ON {tabla}.id = {tabla}_fts.rowid
+            WHERE {tabla}_fts MATCH ?
+            ORDER BY bm25({tabla}_fts, {pesos})
+            LIMIT ?
+        """,
+        # Un patrón LIKE por término, todos en un arreglo JSON: el texto no depende de cuántos haya
+        f"{tabla}.buscar_like": f"""
+            SELECT * FROM {tabla}
+            WHERE NOT EXISTS (
+                SELECT 1 FROM json_each(?) AS termino
+                WHERE ({_texto_busqueda(tabla)}) NOT LIKE termino.value ESCAPE '\\'
+            )
+            ORDER BY nombre
+            LIMIT ?
+        """,
+    }
+
+
+def _reservas_con_nombres(tabla: str, filtro: str, orden: str) -> str:
+    return f"""
+        SELECT r.*, e.nombre as estudiante_nombre, s.nombre as sala_nombre
+        FROM {tabla} r
+        JOIN estudiantes e ON r.estudiante_id = e.id
+        JOIN salas s ON r.sala_id = s.id
+        {filtro}
+        ORDER BY {orden}
+    """
+
+
+# Catálogo de sentencias de los repositorios.
+#
+# El texto de cada sentencia es fijo (las listas variables van en un
+# parámetro JSON con json_each), así que la caché de sentencias preparadas
+# de cada conexión del grupo la compila una sola vez. `python consultas.py
+# planes` compara sus planes con `planes_consultas.json`.
+CONSULTAS: Dict[str, str] = {
+    # ---------- salas ----------
+    "salas.insertar": """
+        INSERT INTO salas (nombre, capacidad, estado, descripcion, horarios_disponibles, sede)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """,
+    "salas.por_id": "SELECT * FROM salas WHERE id = ?",
+    "salas.todas": "SELECT * FROM salas ORDER BY nombre",
+    "salas.disponibles": "SELECT * FROM salas WHERE estado != 'mantenimiento' ORDER BY nombre",
+    "salas.actualizar_estado": "UPDATE salas SET estado = ? WHERE id = ?",
+    "salas.actualizar": """
+        UPDATE salas
+        SET nombre = ?, capacidad = ?, estado = ?, descripcion = ?,
+            horarios_disponibles = ?, sede = ?
+        WHERE id = ?
+    """,
+    "salas.eliminar": "DELETE FROM salas WHERE id = ?",
+    **_busqueda("salas", "10.0, 2.0, 1.0"),
+
+    # ---------- reservas ----------
+    "reservas.insertar": """
+        INSERT INTO reservas
+        (estudiante_id, sala_id, fecha_reserva, hora_inicio, hora_fin, estado)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """,
+    # El último par de parámetros excluye una reserva (la que se modifica) o ninguna si es NULL
+    "reservas.conflicto": """
+        SELECT COUNT(*) as count FROM reservas
+        WHERE sala_id = ?
+          AND fecha_reserva = ?
+          AND estado = 'activa'
+          AND hora_inicio < ?
+          AND hora_fin > ?
+          AND (? IS NULL OR id != ?)
+    """,
+    "reservas.por_id": "SELECT * FROM reservas WHERE id = ?",
+    "reservas.por_sala": _reservas_con_nombres(
+        "reservas", "WHERE r.sala_id = ?", "r.fecha_reserva, r.hora_inicio"
+    ),
+    "reservas.por_sala_historial": _reservas_con_nombres(
+        VISTA_HISTORICA, "WHERE r.sala_id = ?", "r.fecha_reserva, r.hora_inicio"
+    ),
+    "reservas.por_estudiante": _reservas_con_nombres(
+        "reservas", "WHERE r.estudiante_id = ?", "r.fecha_reserva DESC, r.hora_inicio DESC"
+    ),
+    "reservas.por_estudiante_historial": _reservas_con_nombres(
+        VISTA_HISTORICA, "WHERE r.estudiante_id = ?", "r.fecha_reserva DESC, r.hora_inicio DESC"
+    ),
+    "reservas.todas": _reservas_con_nombres("reservas", "", "r.fecha_reserva, r.hora_inicio, r.id"),
+    "reservas.activas_sala_fecha": """
+        SELECT * FROM reservas
+        WHERE sala_id = ?
+          AND fecha_reserva = ?
+          AND estado = 'activa'
+        ORDER BY hora_inicio
+    """,
+    "reservas.ocupadas_rango": """
+        SELECT sala_id, fecha_reserva, hora_inicio, hora_fin FROM reservas
+        WHERE estado = 'activa' AND fecha_reserva BETWEEN ? AND ?
+        ORDER BY sala_id, fecha_reserva, hora_inicio
+    """,
+    "reservas.tiene_activas": """
+        SELECT 1 FROM reservas
+        WHERE sala_id = ? AND estado = 'activa'
+        LIMIT 1
+    """,
+    "reservas.vencidas": """
+        SELECT id, sala_id FROM reservas
+        WHERE estado = 'activa'
+          AND fecha_reserva <= ?
+          AND (fecha_reserva < ? OR hora_fin <= ?)
+        ORDER BY fecha_reserva
+        LIMIT ?
+    """,
+    "reservas.completar": """
+        UPDATE reservas
+        SET estado = 'completada', actualizado_en = CURRENT_TIMESTAMP,
+            version = version + 1
+        WHERE estado = 'activa' AND id IN (SELECT value FROM json_each(?))
+    """,
+    "reservas.fechas_en_conflicto": """
+        SELECT fecha_reserva, MAX(sala_id = ?) AS en_sala
+        FROM reservas
+        WHERE fecha_reserva IN (SELECT value FROM json_each(?))
+          AND estado = 'activa'
+          AND hora_inicio < ?
+          AND hora_fin > ?
+          AND (sala_id = ? OR estudiante_id = ?)
+        GROUP BY fecha_reserva
+    """,
+    "reservas.actualizar": """
+        UPDATE reservas
+        SET estudiante_id = ?, sala_id = ?, fecha_reserva = ?,
+            hora_inicio = ?, hora_fin = ?, estado = ?,
+            actualizado_en = CURRENT_TIMESTAMP, version = version + 1
+        WHERE id = ? AND version = ?
+    """,
+    "reservas.cancelar": """
+        UPDATE reservas
+        SET estado = 'cancelada', actualizado_en = CURRENT_TIMESTAMP,
+            version = version + 1
+        WHERE id = ? AND estado = 'activa' AND (? IS NULL OR version = ?)
+    """,
+
+    # ---------- series ----------
+    "series.insertar": """
+        INSERT INTO series_reserva
+        (estudiante_id, sala_id, fecha_inicio, fecha_fin, hora_inicio, hora_fin,
+         dias_semana, intervalo_semanas, excepciones, estado)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+    "series.insertar_ocurrencia": """
+        INSERT INTO reservas
+        (estudiante_id, sala_id, fecha_reserva, hora_inicio, hora_fin, estado, serie_id)
+        VALUES (?, ?, ?, ?, ?, 'activa', ?)
+    """,
+    "series.por_id": "SELECT * FROM series_reserva WHERE id = ?",
+    "series.ocurrencias_activas": """
+        SELECT fecha_reserva FROM reservas
+        WHERE serie_id = ? AND estado = 'activa' AND fecha_reserva >= ?
+        ORDER BY fecha_reserva
+    """,
+    "series.cancelar_ocurrencias": """
+        UPDATE reservas
+        SET estado = 'cancelada', actualizado_en = CURRENT_TIMESTAMP,
+            version = version + 1
+        WHERE serie_id = ? AND estado = 'activa' AND fecha_reserva >= ?
+    """,
+    "series.cancelar": "UPDATE series_reserva SET estado = 'cancelada' WHERE id = ?",
+
+    # ---------- cuotas ----------
+    "cuotas.activas": "SELECT reservas_activas FROM cuotas_estudiante WHERE estudiante_id = ?",
+    "cuotas.semanas": """
+        SELECT semana, minutos_reservados FROM cuotas_semanales
+        WHERE estudiante_id = ? AND semana IN (SELECT value FROM json_each(?))
+    """,
+
+    # ---------- lista de espera ----------
+    "espera.insertar": """
+        INSERT INTO lista_espera
+        (estudiante_id, sala_id, fecha, hora_inicio, hora_fin, prioridad)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """,
+    "espera.pendientes": """
+        SELECT * FROM lista_espera
+        WHERE sala_id = ? AND fecha = ? AND estado = 'esperando'
+        ORDER BY prioridad DESC, id
+    """,
+    "espera.por_id": "SELECT * FROM lista_espera WHERE id = ?",
+    "espera.por_estudiante": """
+        SELECT * FROM lista_espera
+        WHERE estudiante_id = ?
+        ORDER BY fecha DESC, hora_inicio DESC, id DESC
+    """,
+    "espera.tomar": "UPDATE lista_espera SET estado = 'asignada' WHERE id = ? AND estado = 'esperando'",
+    "espera.vincular": "UPDATE lista_espera SET reserva_id = ? WHERE id = ?",
+    "espera.retirar": "UPDATE lista_espera SET estado = 'retirada' WHERE id = ? AND estado = 'esperando'",
+
+    # ---------- estudiantes ----------
+    "estudiantes.insertar": """
+        INSERT INTO estudiantes (identificacion, nombre, email)
+        VALUES (?, ?, ?)
+    """,
+    "estudiantes.por_id": "SELECT * FROM estudiantes WHERE id = ?",
+    "estudiantes.por_identificacion": "SELECT * FROM estudiantes WHERE identificacion = ?",
+    "estudiantes.todos": "SELECT * FROM estudiantes ORDER BY nombre",
+    **_busqueda("estudiantes", "5.0, 10.0, 2.0"),
+
+    # ---------- fragmentos por sede ----------
+    # Cada fragmento guarda solo reservas; los nombres se completan desde el catálogo
+    "fragmentos.sedes": "SELECT DISTINCT sede FROM salas",
+    "fragmentos.sede_de_sala": "SELECT sede FROM salas WHERE id = ?",
+    "fragmentos.indice": "SELECT indice FROM fragmentos WHERE sede = ?",
+    "fragmentos.siguiente_indice": "SELECT COALESCE(MAX(indice), 0) + 1 AS indice FROM fragmentos",
+    "fragmentos.insertar": "INSERT INTO fragmentos (sede, indice) VALUES (?, ?)",
+    "fragmentos.sala_con_reservas": """
+        SELECT EXISTS (SELECT 1 FROM reservas WHERE sala_id = ?)
+            OR EXISTS (SELECT 1 FROM lista_espera WHERE sala_id = ? AND estado = 'esperando') AS hay
+    """,
+    "fragmentos.reservas_por_sala": """
+        SELECT * FROM reservas WHERE sala_id = ? ORDER BY fecha_reserva, hora_inicio
+    """,
+    "fragmentos.reservas_por_sala_historial": f"""
+        SELECT * FROM {VISTA_HISTORICA} WHERE sala_id = ? ORDER BY fecha_reserva, hora_inicio
+    """,
+    "fragmentos.reservas_por_estudiante": """
+        SELECT * FROM reservas WHERE estudiante_id = ?
+        ORDER BY fecha_reserva DESC, hora_inicio DESC, id DESC
+    """,
+    "fragmentos.reservas_por_estudiante_historial": f"""
+        SELECT * FROM {VISTA_HISTORICA} WHERE estudiante_id = ?
+        ORDER BY fecha_reserva DESC, hora_inicio DESC, id DESC
+    """,
+    "fragmentos.reservas_todas": "SELECT * FROM reservas ORDER BY fecha_reserva, hora_inicio, id",
+    # CROSS JOIN fija json_each como bucle externo: búsquedas por clave aun en tablas pequeñas
+    "fragmentos.nombres_estudiantes": """
+        SELECT e.id, e.nombre FROM json_each(?) AS j CROSS JOIN estudiantes e ON e.id = j.value
+    """,
+    "fragmentos.nombres_salas": """
+        SELECT s.id, s.nombre FROM json_each(?) AS j CROSS JOIN salas s ON s.id = j.value
+    """,
+
+    # ---------- ocupación ----------
+    "ocupacion.por_sala": """
+        SELECT * FROM ocupacion_diaria
+        WHERE sala_id = ? AND fecha BETWEEN ? AND ?
+        ORDER BY fecha
+    """,
+    "ocupacion.por_rango": """
+        SELECT * FROM ocupacion_diaria
+        WHERE fecha BETWEEN ? AND ?
+        ORDER BY fecha, sala_id
+    """,
+    "ocupacion.activas_por_sala": """
+        SELECT sala_id, SUM(reservas_activas) AS activas FROM ocupacion_diaria
+        WHERE fecha >= ?
+        GROUP BY sala_id
+    """,
+}
+
+# Sentencias que recorren la tabla completa por diseño (listados y el LIKE de respaldo)
+ESCANEO_PERMITIDO = {
+    "salas.todas", "salas.disponibles", "salas.buscar_like",
+    "estudiantes.todos", "estudiantes.buscar_like",
+    "reservas.todas",
+    "fragmentos.sedes", "fragmentos.reservas_todas",
+}
+
+SNAPSHOT_PLANES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "planes_consultas.json")
+
+# "SCAN tabla" (o su alias), con o sin índice: recorre todas las filas
+_ESCANEO = re.compile(r"^SCAN (?!CONSTANT ROW)\w+")
+
+
+def plan_de(conn, nombre: str) -> List[str]:
+    """Detalle de EXPLAIN QUERY PLAN de una sentencia del catálogo (parámetros NULL)"""
+    sql = CONSULTAS[nombre]
+    filas = conn.execute(f"EXPLAIN QUERY PLAN {sql}", (None,) * sql.count("?")).fetchall()
+    return [fila[3] for fila in filas]
+
+
+def escaneos(plan: List[str]) -> List[str]:
+    """Pasos del plan que recorren una tabla completa (sin contar json_each ni FTS5)"""
+    return [paso for paso in plan if _ESCANEO.match(paso) and "VIRTUAL TABLE" not in paso]
+
+
+def revisar_planes(conn, snapshot: Dict[str, List[str]]) -> List[str]:
+    """Compara los planes actuales con el snapshot
+
+    Returns: problemas encontrados (vacía si ningún plan empeoró)
+    """
+    problemas = []
+    for nombre in CONSULTAS:
+        plan = plan_de(conn, nombre)
+        nuevos = [paso for paso in escaneos(plan) if nombre not in ESCANEO_PERMITIDO]
+        anteriores = set(escaneos(snapshot.get(nombre, [])))
+        for paso in nuevos:
+            if paso not in anteriores:
+                problemas.append(f"{nombre}: recorre la tabla completa ({paso})")
+        if nombre not in snapshot:
+            problemas.append(f"{nombre}: no está en el snapshot de planes (use --actualizar)")
+        elif plan != snapshot[nombre] and not nuevos:
+            # Cambio de índice u orden sin escaneo completo: se informa, no falla
+            print(f"ℹ️  {nombre}: el plan cambió\n     antes: {snapshot[nombre]}\n     ahora: {plan}")
+    for nombre in snapshot:
+        if nombre not in CONSULTAS:
+            problemas.append(f"{nombre}: está en el snapshot pero ya no en el catálogo (use --actualizar)")
+    return problemas
+
+
+def cargar_datos_sinteticos(db, estudiantes: int = 50_000, reservas: int = 300_000):
+    """Agrega estudiantes, 60 salas y reservas sin cruces desde hace un año, en una carga masiva"""
+    inicio = date.today() - timedelta(days=365)
+    with db.carga_masiva():
+        with db._get_connection() as conn:
+            conn.executemany(
+                "INSERT INTO estudiantes (identificacion, nombre, email) VALUES (?, ?, ?)",
+                ((f"G{i:07d}", f"Estudiante {i}", f"e{i}@cun.edu.co") for i in range(estudiantes)),
+            )
+            conn.executemany(
+                "INSERT INTO salas (nombre, capacidad, sede) VALUES (?, ?, ?)",
+                ((f"Sala generada {i}", 4 + i % 12, f"Sede {i % 4}") for i in range(60)),
+            )
+            # 65 salas x 12 franjas por día, sin cruces; un cuarto canceladas o completadas
+            conn.executemany(
+                "INSERT INTO reservas (estudiante_id, sala_id, fecha_reserva, hora_inicio, hora_fin, estado) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        i * 7919 % max(estudiantes, 1) + 1, i % 65 + 1,
+                        (inicio + timedelta(days=i // 780)).isoformat(),
+                        f"{8 + i // 65 % 12:02d}:00:00", f"{9 + i // 65 % 12:02d}:00:00",
+                        ("activa", "activa", "completada", "cancelada")[i % 4],
+                    )
+                    for i in range(reservas)
+                ),
+            )
+
+
+def generar_base(ruta: str, estudiantes: int = 50_000, reservas: int = 300_000):
+    """Base grande para que el planificador trabaje con estadísticas realistas"""
+    from archivo import ArchivadorReservas
+    from database import DatabaseManager
+
+    with contextlib.redirect_stdout(sys.stderr):
+        db = DatabaseManager(ruta, perfil="carga-masiva")
+    try:
+        cargar_datos_sinteticos(db, estudiantes, reservas)
+        ArchivadorReservas(db).adjuntar()
+        db.execute_query("ANALYZE")
+    finally:
+        db.cerrar()
+
+
+def _conexion_planes(ruta: str):
+    """Conexión con el archivo adjunto, como la ve un repositorio con historial"""
+    from archivo import ArchivadorReservas
+    from database import DatabaseManager
+
+    with contextlib.redirect_stdout(sys.stderr):
+        db = DatabaseManager(ruta)
+    ArchivadorReservas(db).adjuntar()
+    return db
+
+
+def main(argv=None):
+    """Revisa que ninguna sentencia del catálogo haya pasado a recorrer tablas completas"""
+    parser = argparse.ArgumentParser(description="Regresión de planes de las consultas del catálogo")
+    parser.add_argument("accion", choices=("planes", "listar"))
+    parser.add_argument("--db", help="Base grande ya generada (por defecto se genera en un temporal)")
+    parser.add_argument("--reservas", type=int, default=300_000, help="Reservas de la base generada")
+    parser.add_argument("--snapshot", default=SNAPSHOT_PLANES)
+    parser.add_argument("--actualizar", action="store_true", help="Reescribe el snapshot con los planes actuales")
+    args = parser.parse_args(argv)
+
+    if args.accion == "listar":
+        for nombre, sql in CONSULTAS.items():
+            print(f"-- {nombre}\n{' '.join(sql.split())}\n")
+        return 0
+
+    with contextlib.ExitStack() as pila:
+        ruta = args.db
+        if ruta is None:
+            import tempfile
+            ruta = os.path.join(pila.enter_context(tempfile.TemporaryDirectory()), "planes.db")
+        if not os.path.exists(ruta):
+            print(f"⏳ Generando base de {args.reservas} reservas en {ruta}...")
+            generar_base(ruta, reservas=args.reservas)
+        db = _conexion_planes(ruta)
+        pila.callback(db.cerrar)
+
+        with db._get_connection() as conn:
+            if args.actualizar:
+                planes = {nombre: plan_de(conn, nombre) for nombre in CONSULTAS}
+                with open(args.snapshot, "w", encoding="utf-8") as archivo:
+                    json.dump(planes, archivo, indent=2, ensure_ascii=False)
+                    archivo.write("\n")
+                print(f"📸 {len(planes)} planes guardados en {args.snapshot}")
+                return 0
+
+            with open(args.snapshot, encoding="utf-8") as archivo:
+                snapshot = json.load(archivo)
+            problemas = revisar_planes(conn, snapshot)
+
+    for problema in problemas:
+        print(f"❌ {problema}")
+    if problemas:
+        return 1
+    print(f"✅ {len(CONSULTAS)} consultas sin regresiones de plan")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,71 +1,601 @@
+import asyncio
+import os
+import queue
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Iterator, List
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Union
 
 
+# Ocupación diaria: franjas de 30 minutos desde las 8:00 (bit 0) hasta las 20:00 (bit 23)
+APERTURA_MINUTOS = 8 * 60
+MINUTOS_FRANJA = 30
+
+
+def _minutos_sql(columna: str) -> str:
+    """Minutos desde medianoche de una columna TIME guardada como 'HH:MM:SS'"""
+    return f"(CAST(substr({columna}, 1, 2) AS INTEGER) * 60 + CAST(substr({columna}, 4, 2) AS INTEGER))"
+
+
+def _aporte_ocupacion_sql(fila: str) -> Dict[str, str]:
+    """Expresiones SQL con lo que una fila de reservas suma a ocupacion_diaria
+
+    Las reservas canceladas no ocupan la sala. La máscara marca solo las
+    franjas cubiertas por completo: como dos reservas de la misma sala no se
+    cruzan, sus máscaras son disjuntas y pueden sumarse o restarse bit a bit.
+    """
+    ocupa = f"({fila}.estado != 'cancelada')"
+    inicio = _minutos_sql(f"{fila}.hora_inicio")
+    fin = _minutos_sql(f"{fila}.hora_fin")
+    primera = f"(({inicio} - {APERTURA_MINUTOS} + {MINUTOS_FRANJA - 1}) / {MINUTOS_FRANJA})"
+    limite = f"(({fin} - {APERTURA_MINUTOS}) / {MINUTOS_FRANJA})"
+    return {
+        "minutos": f"({ocupa} * ({fin} - {inicio}))",
+        "activas": f"({fila}.estado = 'activa')",
+        "mascara": f"(CASE WHEN {ocupa} AND {limite} > {primera} "
+                   f"THEN (1 << {limite}) - (1 << {primera}) ELSE 0 END)",
+    }
+
+
+def sql_reconstruir_ocupacion(tabla: str = "reservas", filtro: str = "") -> str:
+    """INSERT ... SELECT que recalcula ocupacion_diaria desde una tabla de reservas"""
+    aporte = _aporte_ocupacion_sql("r")
+    return f"""
+        INSERT INTO ocupacion_diaria (sala_id, fecha, minutos_reservados, reservas_activas, mascara_franjas)
+        SELECT r.sala_id, r.fecha_reserva, SUM({aporte['minutos']}), SUM({aporte['activas']}), SUM({aporte['mascara']})
+        FROM {tabla} r
+        WHERE r.estado != 'cancelada' {filtro}
+        GROUP BY r.sala_id, r.fecha_reserva
+    """
+
+
+def _aporte_cuotas_sql(fila: str) -> Dict[str, str]:
+    """Expresiones SQL con lo que una fila de reservas suma a los contadores de cuotas
+
+    Las ocurrencias de una serie no cuentan como reservas activas sueltas,
+    pero sus minutos sí cuentan para las horas de la semana.
+    """
+    return {
+        "activas": f"({fila}.estado = 'activa' AND {fila}.serie_id IS NULL)",
+        "semana": f"date({fila}.fecha_reserva, '-6 days', 'weekday 1')",
+        "minutos": f"(({fila}.estado != 'cancelada') * "
+                   f"({_minutos_sql(f'{fila}.hora_fin')} - {_minutos_sql(f'{fila}.hora_inicio')}))",
+    }
+
+
+def sql_reconstruir_cuotas(filtro: str = "") -> List[str]:
+    """Sentencias que recalculan los contadores de cuotas desde reservas
+
+    `filtro` es una condición adicional sobre la reserva `r` (p. ej. un
+    estudiante) y debe empezar con AND.
+    """
+    aporte = _aporte_cuotas_sql("r")
+    return [
+        f"""
+        INSERT INTO cuotas_estudiante (estudiante_id, reservas_activas)
+        SELECT r.estudiante_id, SUM({aporte['activas']}) FROM reservas r
+        WHERE r.estado = 'activa' {filtro}
+        GROUP BY r.estudiante_id
+        """,
+        f"""
+        INSERT INTO cuotas_semanales (estudiante_id, semana, minutos_reservados)
+        SELECT r.estudiante_id, {aporte['semana']}, SUM({aporte['minutos']}) FROM reservas r
+        WHERE r.estado != 'cancelada' {filtro}
+        GROUP BY r.estudiante_id, {aporte['semana']}
+        """,
+    ]
+
+
+def es_memoria(db_path: str) -> bool:
+    """Base en memoria: `:memory:` o una URI con mode=memory (compartida si lleva cache=shared)"""
+    return db_path == ":memory:" or (db_path.startswith("file:") and "mode=memory" in db_path)
+
+
+def _uri_solo_lectura(db_path: str) -> str:
+    uri = db_path if db_path.startswith("file:") else Path(db_path).resolve().as_uri()
+    return f"{uri}{'&' if '?' in uri else '?'}mode=ro"
+
+
+# Sentencias preparadas que conserva cada conexión; debe cubrir el catálogo de consultas.py
+SENTENCIAS_EN_CACHE = 256
+
+# Columnas indexadas para búsqueda de texto completo, por tabla
+COLUMNAS_BUSQUEDA = {
+    "estudiantes": ("identificacion", "nombre", "email"),
+    "salas": ("nombre", "descripcion", "sede"),
+}
+
+
+@dataclass(frozen=True)
+class PerfilAlmacenamiento:
+    """PRAGMAs de rendimiento que se aplican a cada conexión al abrirla
+
+    Todos los perfiles usan WAL: el grupo de lectoras depende de él.
+    """
+    nombre: str
+    synchronous: str  # FULL sincroniza cada commit; NORMAL solo en los checkpoints; OFF nunca
+    cache_kib: int
+    mmap_bytes: int
+    temp_store: str
+    wal_autocheckpoint: int = 1000  # páginas de WAL antes de un checkpoint automático
+    diferir_indices: bool = False  # `carga_masiva` quita los índices secundarios y los recrea al final
+
+    def pragmas(self, solo_lectura: bool = False) -> List[str]:
+        sentencias = [
+            f"PRAGMA cache_size = -{self.cache_kib}",
+            f"PRAGMA mmap_size = {self.mmap_bytes}",
+            f"PRAGMA temp_store = {self.temp_store}",
+        ]
+        if not solo_lectura:
+            sentencias.append(f"PRAGMA synchronous = {self.synchronous}")
+            sentencias.append(f"PRAGMA wal_autocheckpoint = {self.wal_autocheckpoint}")
+        return sentencias
+
+
+PERFILES_ALMACENAMIENTO = {
+    # Ningún commit confirmado se pierde ante un corte de energía
+    "durable": PerfilAlmacenamiento("durable", "FULL", 16 * 1024, 0, "DEFAULT"),
+    # Un corte de energía puede perder los últimos commits, pero la base no se corrompe
+    "equilibrado": PerfilAlmacenamiento("equilibrado", "NORMAL", 64 * 1024, 256 * 2 ** 20, "MEMORY"),
+    # Consultas y analítica: caché y mapeo en memoria grandes
+    "lectura": PerfilAlmacenamiento("lectura", "NORMAL", 128 * 1024, 2 ** 30, "MEMORY"),
+    # Importaciones: sin fsync y con checkpoints espaciados; repetir la carga si el equipo cae
+    "carga-masiva": PerfilAlmacenamiento(
+        "carga-masiva", "OFF", 256 * 1024, 2 ** 30, "MEMORY", wal_autocheckpoint=10000, diferir_indices=True
+    ),
+}
+ALIAS_PERFILES = {"balanced": "equilibrado", "read-mostly": "lectura", "bulk-load": "carga-masiva"}
+VARIABLE_PERFIL = "RESERVA_CUN_PERFIL"
+PERFIL_POR_DEFECTO = "durable"
+
+
+def perfil_almacenamiento(perfil: Union[str, PerfilAlmacenamiento, None] = None) -> PerfilAlmacenamiento:
+    """Resuelve un perfil por nombre; sin nombre se usa $RESERVA_CUN_PERFIL o 'durable'"""
+    if isinstance(perfil, PerfilAlmacenamiento):
+        return perfil
+    nombre = (perfil or os.environ.get(VARIABLE_PERFIL) or PERFIL_POR_DEFECTO).strip().lower()
+    nombre = ALIAS_PERFILES.get(nombre, nombre)
+    if nombre not in PERFILES_ALMACENAMIENTO:
+        raise ValueError(
+            f"Perfil de almacenamiento desconocido: {nombre} (use {', '.join(PERFILES_ALMACENAMIENTO)})"
+        )
+    return PERFILES_ALMACENAMIENTO[nombre]
+
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "reserva_cun.db"):
+    """Conexiones SQLite separadas para escritura y lectura.
+
+    Mantiene una única conexión escritora (protegida por un candado) y un
+    grupo de `lectores` conexiones de solo lectura (`mode=ro`). En modo WAL
+    las lecturas trabajan sobre instantáneas y no bloquean los commits.
+    Dentro de `sesion()` las lecturas del hilo se hacen en la conexión
+    escritora, de modo que ven las escrituras aún no confirmadas.
+
+    `db_path` también admite URIs `file:`, como una base en memoria
+    compartida (`file:nombre?mode=memory&cache=shared`). Con
+    `inicializar=False` no se crea el esquema ni se cargan los datos
+    iniciales: la base ya los trae, por ejemplo clonada de una plantilla.
+    """
+
+    def __init__(self, db_path: str = "reserva_cun.db", lectores: int = 4,
+                 perfil: Union[str, PerfilAlmacenamiento, None] = None, inicializar: bool = True):
         self.db_path = db_path
-        self._init_db()
+        self.perfil = perfil_almacenamiento(perfil)
+        self.adjuntos: Dict[str, str] = {}
+        self._local = threading.local()
+        self._candado_escritor = threading.RLock()
+        self._escritor = self._abrir_conexion(solo_lectura=False)
+        if inicializar:
+            self._init_db()
+
+        # Una base en memoria no admite lectoras de solo lectura: todo va al escritor
+        self._lectores: queue.LifoQueue = queue.LifoQueue()
+        self._conexiones_lectoras: List[sqlite3.Connection] = []
+        if not es_memoria(db_path):
+            for _ in range(lectores):
+                conn = self._abrir_conexion(solo_lectura=True)
+                self._conexiones_lectoras.append(conn)
+                self._lectores.put(conn)
+
+    def _abrir_conexion(self, solo_lectura: bool) -> sqlite3.Connection:
+        if solo_lectura:
+            conn = sqlite3.connect(_uri_solo_lectura(self.db_path), uri=True, check_same_thread=False,
+                                   cached_statements=SENTENCIAS_EN_CACHE)
+        else:
+            conn = sqlite3.connect(self.db_path, uri=self.db_path.startswith("file:"), check_same_thread=False,
+                                   cached_statements=SENTENCIAS_EN_CACHE)
+            if not es_memoria(self.db_path):
+                conn.execute("PRAGMA journal_mode = WAL")
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")  # Habilitar claves foráneas
+        for pragma in self.perfil.pragmas(solo_lectura):
+            conn.execute(pragma)
+        return conn
 
     def _init_db(self):
         """Inicializa la base de datos con esquemas y datos de prueba"""
         with self._get_connection() as conn:
             cursor = conn.cursor()
+            self._crear_tablas_catalogo(cursor)
+            self._crear_tablas_reservas(cursor)
+            conn.commit()
 
-            # Tabla de estudiantes
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS estudiantes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    identificacion TEXT UNIQUE NOT NULL,
-                    nombre TEXT NOT NULL,
-                    email TEXT,
-                    creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+            # Poblar datos iniciales
+            self._poblar_datos_iniciales(conn)
 
-            # Tabla de salas
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS salas (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nombre TEXT UNIQUE NOT NULL,
-                    capacidad INTEGER NOT NULL CHECK (capacidad > 0),
-                    estado TEXT DEFAULT 'disponible' CHECK (estado IN ('disponible', 'reservada', 'mantenimiento')),
-                    descripcion TEXT,
-                    horarios_disponibles TEXT,
-                    creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+    def _crear_tablas_catalogo(self, cursor):
+        """Crea las tablas de estudiantes y salas"""
+        # Tabla de estudiantes
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS estudiantes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                identificacion TEXT UNIQUE NOT NULL,
+                nombre TEXT NOT NULL,
+                email TEXT,
+                creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
 
-            # Tabla de reservas
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS reservas (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    estudiante_id INTEGER NOT NULL,
-                    sala_id INTEGER NOT NULL,
-                    fecha_reserva DATE NOT NULL,
-                    hora_inicio TIME NOT NULL,
-                    hora_fin TIME NOT NULL,
-                    estado TEXT DEFAULT 'activa' CHECK (estado IN ('activa', 'cancelada', 'completada')),
-                    creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    actualizado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (estudiante_id) REFERENCES estudiantes (id) ON DELETE CASCADE,
-                    FOREIGN KEY (sala_id) REFERENCES salas (id) ON DELETE CASCADE,
-                    UNIQUE(sala_id, fecha_reserva, hora_inicio)
-                )
+        # Tabla de salas
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS salas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nombre TEXT UNIQUE NOT NULL,
+                capacidad INTEGER NOT NULL CHECK (capacidad > 0),
+                estado TEXT DEFAULT 'disponible' CHECK (estado IN ('disponible', 'reservada', 'mantenimiento')),
+                descripcion TEXT,
+                horarios_disponibles TEXT,
+                creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                sede TEXT
+            )
+        ''')
+
+        # Columnas agregadas después de la versión inicial del esquema
+        self._agregar_columna_si_falta(cursor, 'salas', 'sede', 'TEXT')
+
+        # Índice de bloque de IDs de cada sede cuando las reservas se fragmentan
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS fragmentos (
+                sede TEXT PRIMARY KEY,
+                indice INTEGER UNIQUE NOT NULL
+            )
+        ''')
+
+        self._crear_busqueda_texto(cursor)
+
+    def _crear_busqueda_texto(self, cursor):
+        """Índices FTS5 de estudiantes y salas sincronizados por triggers
+
+        Son tablas de contenido externo: guardan solo el índice invertido y
+        leen el texto de la tabla original. Si SQLite no tiene FTS5, las
+        búsquedas usan LIKE sobre las tablas originales.
+        """
+        for tabla, columnas in COLUMNAS_BUSQUEDA.items():
+            indice = f"{tabla}_fts"
+            existia = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (indice,)
+            ).fetchone()
+            try:
+                cursor.execute(f'''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS {indice} USING fts5(
+                        {", ".join(columnas)},
+                        content='{tabla}', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2'
+                    )
+                ''')
+            except sqlite3.OperationalError:  # SQLite compilado sin FTS5
+                return
+
+            lista = ", ".join(columnas)
+            nuevos = ", ".join(f"NEW.{columna}" for columna in columnas)
+            viejos = ", ".join(f"OLD.{columna}" for columna in columnas)
+            borrar = f"INSERT INTO {indice} ({indice}, rowid, {lista}) VALUES ('delete', OLD.id, {viejos});"
+            insertar = f"INSERT INTO {indice} (rowid, {lista}) VALUES (NEW.id, {nuevos});"
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{indice}_insert AFTER INSERT ON {tabla}
+                BEGIN {insertar} END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{indice}_delete AFTER DELETE ON {tabla}
+                BEGIN {borrar} END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{indice}_update AFTER UPDATE OF {lista} ON {tabla}
+                BEGIN {borrar} {insertar} END
             ''')
 
-            # Índices para rendimiento - RNF6
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservas_estudiante ON reservas(estudiante_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservas_sala ON reservas(sala_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservas_fecha ON reservas(fecha_reserva)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservas_estado ON reservas(estado)')
+            if not existia:
+                cursor.execute(f"INSERT INTO {indice} ({indice}) VALUES ('rebuild')")
 
-            conn.commit()
+    def _crear_tablas_reservas(self, cursor, claves_foraneas: bool = True):
+        """Crea la tabla de reservas y sus índices"""
+        referencias = ''',
+                FOREIGN KEY (estudiante_id) REFERENCES estudiantes (id) ON DELETE CASCADE,
+                FOREIGN KEY (sala_id) REFERENCES salas (id) ON DELETE CASCADE''' if claves_foraneas else ''
 
-            # Poblar datos iniciales
-            self._poblar_datos_iniciales(conn)
+        # Tabla de reservas
+        cursor.execute(self._sql_tabla_reservas("reservas", referencias))
+
+        # Series de reservas recurrentes (cada ocurrencia es una fila de reservas)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS series_reserva (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                estudiante_id INTEGER NOT NULL,
+                sala_id INTEGER NOT NULL,
+                fecha_inicio DATE NOT NULL,
+                fecha_fin DATE NOT NULL,
+                hora_inicio TIME NOT NULL,
+                hora_fin TIME NOT NULL,
+                dias_semana TEXT NOT NULL DEFAULT '[]',
+                intervalo_semanas INTEGER NOT NULL DEFAULT 1,
+                excepciones TEXT NOT NULL DEFAULT '[]',
+                estado TEXT DEFAULT 'activa' CHECK (estado IN ('activa', 'cancelada')),
+                creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Lista de espera por sala, fecha y horario
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS lista_espera (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                estudiante_id INTEGER NOT NULL,
+                sala_id INTEGER NOT NULL,
+                fecha DATE NOT NULL,
+                hora_inicio TIME NOT NULL,
+                hora_fin TIME NOT NULL,
+                prioridad INTEGER NOT NULL DEFAULT 0,
+                estado TEXT DEFAULT 'esperando' CHECK (estado IN ('esperando', 'asignada', 'retirada')),
+                reserva_id INTEGER,
+                creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Columnas agregadas después de la versión inicial del esquema
+        self._agregar_columna_si_falta(cursor, 'reservas', 'version', 'INTEGER NOT NULL DEFAULT 1')
+        self._agregar_columna_si_falta(cursor, 'reservas', 'serie_id', 'INTEGER')
+
+        # Versiones anteriores declaraban UNIQUE(sala_id, fecha_reserva, hora_inicio)
+        # en la tabla, lo que impedía volver a reservar un horario cancelado
+        if cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_autoindex_reservas_1'"
+        ).fetchone():
+            self._reconstruir_tabla_reservas(cursor, referencias)
+
+        # Índices para rendimiento - RNF6
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservas_estudiante ON reservas(estudiante_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservas_sala ON reservas(sala_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservas_fecha ON reservas(fecha_reserva)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservas_estado ON reservas(estado)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservas_estado_fecha ON reservas(estado, fecha_reserva)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservas_serie ON reservas(serie_id) WHERE serie_id IS NOT NULL')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_lista_espera_sala_fecha ON lista_espera(sala_id, fecha) "
+            "WHERE estado = 'esperando'"
+        )
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_lista_espera_estudiante ON lista_espera(estudiante_id)')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_reservas_horario_activo
+            ON reservas(sala_id, fecha_reserva, hora_inicio) WHERE estado = 'activa'
+        ''')
+
+        self._crear_ocupacion_diaria(cursor)
+        self._crear_contadores_cuotas(cursor)
+        self._crear_eventos_reserva(cursor)
+
+    def _sql_tabla_reservas(self, nombre: str, referencias: str) -> str:
+        return f'''
+            CREATE TABLE IF NOT EXISTS {nombre} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                estudiante_id INTEGER NOT NULL,
+                sala_id INTEGER NOT NULL,
+                fecha_reserva DATE NOT NULL,
+                hora_inicio TIME NOT NULL,
+                hora_fin TIME NOT NULL,
+                estado TEXT DEFAULT 'activa' CHECK (estado IN ('activa', 'cancelada', 'completada')),
+                creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                actualizado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                version INTEGER NOT NULL DEFAULT 1,
+                serie_id INTEGER{referencias}
+            )
+        '''
+
+    def _reconstruir_tabla_reservas(self, cursor, referencias: str):
+        """Copia reservas a una tabla con el esquema actual y la reemplaza
+
+        Los índices y triggers se vuelven a crear a continuación en
+        `_crear_tablas_reservas`; la secuencia de IDs se conserva.
+        """
+        columnas = ", ".join(fila[1] for fila in cursor.execute("PRAGMA table_info(reservas)"))
+        secuencia = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'reservas'").fetchone()
+
+        cursor.execute(self._sql_tabla_reservas("reservas_migracion", referencias))
+        cursor.execute(f"INSERT INTO reservas_migracion ({columnas}) SELECT {columnas} FROM reservas")
+        cursor.execute("DROP TABLE reservas")
+        cursor.execute("ALTER TABLE reservas_migracion RENAME TO reservas")
+        if secuencia:
+            cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'reservas'")
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('reservas', ?)", (secuencia[0],))
+
+    def _crear_ocupacion_diaria(self, cursor):
+        """Resumen por sala y día mantenido por triggers sobre reservas"""
+        existia = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ocupacion_diaria'"
+        ).fetchone()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ocupacion_diaria (
+                sala_id INTEGER NOT NULL,
+                fecha DATE NOT NULL,
+                minutos_reservados INTEGER NOT NULL DEFAULT 0,
+                reservas_activas INTEGER NOT NULL DEFAULT 0,
+                mascara_franjas INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (sala_id, fecha)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_ocupacion_fecha ON ocupacion_diaria(fecha)')
+
+        nuevo, viejo = _aporte_ocupacion_sql("NEW"), _aporte_ocupacion_sql("OLD")
+        sumar = f'''
+                INSERT INTO ocupacion_diaria (sala_id, fecha, minutos_reservados, reservas_activas, mascara_franjas)
+                VALUES (NEW.sala_id, NEW.fecha_reserva, {nuevo['minutos']}, {nuevo['activas']}, {nuevo['mascara']})
+                ON CONFLICT (sala_id, fecha) DO UPDATE SET
+                    minutos_reservados = minutos_reservados + excluded.minutos_reservados,
+                    reservas_activas = reservas_activas + excluded.reservas_activas,
+                    mascara_franjas = mascara_franjas | excluded.mascara_franjas;
+        '''
+        restar = f'''
+                UPDATE ocupacion_diaria SET
+                    minutos_reservados = minutos_reservados - {viejo['minutos']},
+                    reservas_activas = reservas_activas - {viejo['activas']},
+                    mascara_franjas = mascara_franjas & ~{viejo['mascara']}
+                WHERE sala_id = OLD.sala_id AND fecha = OLD.fecha_reserva;
+        '''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_ocupacion_insert AFTER INSERT ON reservas
+            WHEN NEW.estado != 'cancelada'
+            BEGIN {sumar} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_ocupacion_update
+            AFTER UPDATE OF estado, sala_id, fecha_reserva, hora_inicio, hora_fin ON reservas
+            WHEN OLD.estado != 'cancelada' OR NEW.estado != 'cancelada'
+            BEGIN {restar} {sumar} END
+        ''')
+        # Solo las reservas activas descuentan al borrarse: el archivado de
+        # historial (completadas/canceladas) conserva la ocupación ya registrada
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_ocupacion_delete AFTER DELETE ON reservas
+            WHEN OLD.estado = 'activa'
+            BEGIN {restar} END
+        ''')
+
+        if not existia:
+            cursor.execute(sql_reconstruir_ocupacion())
+
+    def _crear_contadores_cuotas(self, cursor):
+        """Contadores por estudiante (reservas activas, minutos por semana) mantenidos por triggers"""
+        existia = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cuotas_estudiante'"
+        ).fetchone()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cuotas_estudiante (
+                estudiante_id INTEGER PRIMARY KEY,
+                reservas_activas INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cuotas_semanales (
+                estudiante_id INTEGER NOT NULL,
+                semana DATE NOT NULL,
+                minutos_reservados INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (estudiante_id, semana)
+            ) WITHOUT ROWID
+        ''')
+
+        nuevo, viejo = _aporte_cuotas_sql("NEW"), _aporte_cuotas_sql("OLD")
+        sumar = f'''
+                INSERT INTO cuotas_estudiante (estudiante_id, reservas_activas)
+                VALUES (NEW.estudiante_id, {nuevo['activas']})
+                ON CONFLICT (estudiante_id) DO UPDATE SET
+                    reservas_activas = reservas_activas + excluded.reservas_activas;
+                INSERT INTO cuotas_semanales (estudiante_id, semana, minutos_reservados)
+                VALUES (NEW.estudiante_id, {nuevo['semana']}, {nuevo['minutos']})
+                ON CONFLICT (estudiante_id, semana) DO UPDATE SET
+                    minutos_reservados = minutos_reservados + excluded.minutos_reservados;
+        '''
+        restar = f'''
+                UPDATE cuotas_estudiante SET reservas_activas = reservas_activas - {viejo['activas']}
+                WHERE estudiante_id = OLD.estudiante_id;
+                UPDATE cuotas_semanales SET minutos_reservados = minutos_reservados - {viejo['minutos']}
+                WHERE estudiante_id = OLD.estudiante_id AND semana = {viejo['semana']};
+        '''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_cuotas_insert AFTER INSERT ON reservas
+            WHEN NEW.estado != 'cancelada'
+            BEGIN {sumar} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_cuotas_update
+            AFTER UPDATE OF estado, estudiante_id, fecha_reserva, hora_inicio, hora_fin, serie_id ON reservas
+            WHEN OLD.estado != 'cancelada' OR NEW.estado != 'cancelada'
+            BEGIN {restar} {sumar} END
+        ''')
+        # Igual que en ocupacion_diaria: archivar historial no descuenta lo ya registrado
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_cuotas_delete AFTER DELETE ON reservas
+            WHEN OLD.estado = 'activa'
+            BEGIN {restar} END
+        ''')
+
+        if not existia:
+            for sentencia in sql_reconstruir_cuotas():
+                cursor.execute(sentencia)
+
+    def _crear_eventos_reserva(self, cursor):
+        """Bandeja de salida: un evento por alta, modificación, cancelación o cierre de reserva
+
+        Los triggers escriben el evento en la misma transacción que el cambio,
+        así que un consumidor nunca ve un evento de un cambio revertido ni
+        pierde uno confirmado. El archivado (DELETE de historial) no genera
+        eventos.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS eventos_reserva (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tipo TEXT NOT NULL CHECK (tipo IN ('creada', 'modificada', 'cancelada', 'completada')),
+                reserva_id INTEGER NOT NULL,
+                estudiante_id INTEGER NOT NULL,
+                sala_id INTEGER NOT NULL,
+                fecha_reserva DATE NOT NULL,
+                hora_inicio TIME NOT NULL,
+                hora_fin TIME NOT NULL,
+                estado TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                creado_en TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS consumidores_eventos (
+                nombre TEXT PRIMARY KEY,
+                ultimo_evento INTEGER NOT NULL DEFAULT 0,
+                actualizado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        def registrar(tipo: str) -> str:
+            return f'''
+                INSERT INTO eventos_reserva
+                (tipo, reserva_id, estudiante_id, sala_id, fecha_reserva, hora_inicio, hora_fin, estado, version)
+                VALUES ('{tipo}', NEW.id, NEW.estudiante_id, NEW.sala_id, NEW.fecha_reserva,
+                        NEW.hora_inicio, NEW.hora_fin, NEW.estado, NEW.version);
+            '''
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_eventos_insert AFTER INSERT ON reservas
+            BEGIN {registrar('creada')} END
+        ''')
+        for tipo, estado in (('cancelada', 'cancelada'), ('completada', 'completada')):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_eventos_{tipo} AFTER UPDATE OF estado ON reservas
+                WHEN NEW.estado = '{estado}' AND OLD.estado != '{estado}'
+                BEGIN {registrar(tipo)} END
+            ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_eventos_modificada
+            AFTER UPDATE OF estudiante_id, sala_id, fecha_reserva, hora_inicio, hora_fin ON reservas
+            WHEN NEW.estado = OLD.estado
+             AND (NEW.estudiante_id, NEW.sala_id, NEW.fecha_reserva, NEW.hora_inicio, NEW.hora_fin)
+                 IS NOT (OLD.estudiante_id, OLD.sala_id, OLD.fecha_reserva, OLD.hora_inicio, OLD.hora_fin)
+            BEGIN {registrar('modificada')} END
+        ''')
+
+    def _agregar_columna_si_falta(self, cursor, tabla: str, columna: str, definicion: str):
+        """Migra bases existentes agregando una columna nueva"""
+        columnas = {fila[1] for fila in cursor.execute(f"PRAGMA table_info({tabla})")}
+        if columna not in columnas:
+            cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
 
     def _poblar_datos_iniciales(self, conn):
         """Pobla la base de datos con datos de prueba iniciales"""
@@ -109,36 +639,349 @@ class DatabaseManager:
 
     @contextmanager
     def _get_connection(self) -> Iterator[sqlite3.Connection]:
-        """Context manager para manejo automático de conexiones"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON")  # Habilitar claves foráneas
+        """Context manager que entrega la conexión escritora en exclusiva
+
+        Fuera de una sesión, un error revierte lo pendiente; dentro de una
+        sesión eso le corresponde a `sesion()`, para que un error atrapado
+        por el llamador no descarte lo ya escrito en la unidad de trabajo.
+        """
+        with self._candado_escritor:
+            try:
+                yield self._escritor
+            except Exception:
+                if not self._en_sesion():
+                    self._escritor.rollback()
+                raise
+
+    @contextmanager
+    def _conexion_lectura(self) -> Iterator[sqlite3.Connection]:
+        """Toma una conexión lectora del grupo (o la escritora en una sesión)"""
+        if self._en_sesion() or not self._conexiones_lectoras:
+            with self._get_connection() as conn:
+                yield conn
+            return
+
+        conn = self._lectores.get()
         try:
             yield conn
-        except Exception:
-            conn.rollback()
-            raise
         finally:
-            conn.close()
+            self._lectores.put(conn)
+
+    def _en_sesion(self) -> bool:
+        return getattr(self._local, "profundidad_sesion", 0) > 0
+
+    @contextmanager
+    def sesion(self) -> Iterator["DatabaseManager"]:
+        """Unidad de trabajo sobre la conexión escritora.
+
+        Las escrituras se confirman juntas al salir (o se revierten si hay
+        una excepción) y las lecturas del mismo hilo ven esas escrituras.
+        Las sesiones anidadas se unen a la sesión exterior.
+        """
+        with self._candado_escritor:
+            self._local.profundidad_sesion = getattr(self._local, "profundidad_sesion", 0) + 1
+            try:
+                yield self
+                if self._local.profundidad_sesion == 1:
+                    self._escritor.commit()
+            except Exception:
+                if self._local.profundidad_sesion == 1:
+                    self._escritor.rollback()
+                raise
+            finally:
+                self._local.profundidad_sesion -= 1
+
+    @contextmanager
+    def carga_masiva(self, tablas: tuple = ('reservas', 'lista_espera')) -> Iterator["DatabaseManager"]:
+        """Sesión para importar muchas filas de una vez
+
+        Con un perfil que difiere índices (`carga-masiva`), los índices
+        secundarios de `tablas` se eliminan al empezar y se vuelven a crear
+        al final, dentro de la misma transacción: construir un índice una vez
+        ordenando es mucho más barato que mantenerlo fila por fila, y si la
+        carga falla el ROLLBACK también devuelve los índices. Los índices
+        UNIQUE se conservan porque validan los datos que entran.
+        """
+        with self.sesion():
+            indices = []
+            if self.perfil.diferir_indices:
+                # sqlite3 no abre transacción antes de un DDL: se abre a mano para que el DROP sea reversible
+                if not self._escritor.in_transaction:
+                    self._escritor.execute("BEGIN")
+                marcadores = ", ".join("?" for _ in tablas)
+                indices = self.fetch_all(
+                    f"""
+                    SELECT name, sql FROM sqlite_master
+                    WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({marcadores})
+                      AND sql NOT LIKE 'CREATE UNIQUE%'
+                    """,
+                    tuple(tablas),
+                )
+                for indice in indices:
+                    self.execute_query(f'DROP INDEX "{indice["name"]}"')
+            yield self
+            for indice in indices:
+                self.execute_query(indice["sql"])
 
     def execute_query(self, query: str, params: tuple = ()) -> sqlite3.Cursor:
         """Ejecuta una query y retorna el cursor"""
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
-            conn.commit()
+            if not self._en_sesion():
+                conn.commit()
             return cursor
 
     def fetch_all(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
         """Ejecuta query y retorna todos los resultados"""
-        with self._get_connection() as conn:
+        with self._conexion_lectura() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             return cursor.fetchall()
 
+    def iterar(self, query: str, params: tuple = (), tamano_lote: int = 500) -> Iterator[sqlite3.Row]:
+        """Ejecuta query y entrega las filas de a `tamano_lote` con fetchmany
+
+        Solo un lote vive en memoria a la vez. La conexión lectora (y su
+        instantánea, que retiene el checkpoint del WAL) queda tomada hasta
+        agotar o cerrar el generador; sin lectoras, como en `:memory:`, se
+        retiene la escritora.
+        """
+        with self._conexion_lectura() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                while True:
+                    filas = cursor.fetchmany(tamano_lote)
+                    if not filas:
+                        return
+                    yield from filas
+            finally:
+                cursor.close()
+
     def fetch_one(self, query: str, params: tuple = ()) -> sqlite3.Row | None:
         """Ejecuta query y retorna un único resultado"""
-        with self._get_connection() as conn:
+        with self._conexion_lectura() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
-            return cursor.fetchone()
\ No newline at end of file
+            fila = cursor.fetchone()
+            cursor.close()  # Libera la instantánea de lectura
+            return fila
+
+    def adjuntar(self, ruta: str, alias: str, esquema: List[str] = (), vistas_temporales: List[str] = ()):
+        """Adjunta otra base SQLite a todas las conexiones.
+
+        `esquema` se ejecuta en la conexión escritora después del ATTACH (crea
+        las tablas de la base adjunta); las `vistas_temporales` se crean en
+        cada conexión porque las vistas TEMP no se comparten.
+        """
+        if alias in self.adjuntos:
+            return
+
+        with self._get_connection() as conn:
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (ruta,))
+            for sentencia in esquema:
+                conn.execute(sentencia)
+            conn.commit()
+            for sentencia in vistas_temporales:
+                conn.execute(sentencia)
+
+            # Se toman todas las lectoras para que ninguna quede sin adjuntar
+            lectoras = [self._lectores.get() for _ in self._conexiones_lectoras]
+            try:
+                uri = f"{Path(ruta).resolve().as_uri()}?mode=ro"
+                for lectora in lectoras:
+                    lectora.execute(f"ATTACH DATABASE ? AS {alias}", (uri,))
+                    for sentencia in vistas_temporales:
+                        lectora.execute(sentencia)
+            finally:
+                for lectora in lectoras:
+                    self._lectores.put(lectora)
+
+            self.adjuntos[alias] = ruta
+
+    def cerrar(self):
+        """Cierra la conexión escritora y las lectoras"""
+        with self._candado_escritor:
+            for conn in self._conexiones_lectoras:
+                conn.close()
+            self._conexiones_lectoras.clear()
+            self._escritor.close()
+
+
+class ConexionDirecta:
+    """Expone la interfaz de DatabaseManager sobre conexiones ya abiertas
+
+    `obtener_conexion` entrega la conexión a usar en cada llamada (por
+    ejemplo, la del hilo actual). Estas conexiones no tienen bases
+    adjuntas, así que `adjuntos` queda vacío.
+    """
+
+    def __init__(self, obtener_conexion: Callable[[], sqlite3.Connection], autocommit: bool = True):
+        self._obtener_conexion = obtener_conexion
+        self.autocommit = autocommit
+        self.adjuntos: Dict[str, str] = {}
+        self._local = threading.local()
+
+    def _en_sesion(self) -> bool:
+        return getattr(self._local, "profundidad_sesion", 0) > 0
+
+    @contextmanager
+    def sesion(self) -> Iterator["ConexionDirecta"]:
+        """Unidad de trabajo sobre la conexión del hilo actual
+
+        Abre BEGIN y confirma al salir (ROLLBACK si hay una excepción). Si la
+        conexión ya está en una transacción ajena (por ejemplo, el lote de
+        una cola de escritura), la sesión usa un SAVEPOINT dentro de ella.
+        Las sesiones anidadas se unen a la sesión exterior.
+        """
+        if self._en_sesion():
+            self._local.profundidad_sesion += 1
+            try:
+                yield self
+            finally:
+                self._local.profundidad_sesion -= 1
+            return
+
+        conn = self._obtener_conexion()
+        anidada = conn.in_transaction
+        conn.execute("SAVEPOINT sesion" if anidada else "BEGIN")
+        self._local.profundidad_sesion = 1
+        try:
+            yield self
+        except BaseException:
+            if anidada:
+                conn.execute("ROLLBACK TO sesion")
+                conn.execute("RELEASE sesion")
+            else:
+                conn.rollback()
+            raise
+        else:
+            if anidada:
+                conn.execute("RELEASE sesion")
+            else:
+                conn.commit()
+        finally:
+            self._local.profundidad_sesion = 0
+
+    def execute_query(self, query: str, params: tuple = ()) -> sqlite3.Cursor:
+        """Ejecuta una query y retorna el cursor"""
+        conn = self._obtener_conexion()
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        if self.autocommit and not self._en_sesion():
+            conn.commit()
+        return cursor
+
+    def fetch_all(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
+        """Ejecuta query y retorna todos los resultados"""
+        cursor = self._obtener_conexion().cursor()
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+    def fetch_one(self, query: str, params: tuple = ()) -> sqlite3.Row | None:
+        """Ejecuta query y retorna un único resultado"""
+        cursor = self._obtener_conexion().cursor()
+        cursor.execute(query, params)
+        return cursor.fetchone()
+
+    def iterar(self, query: str, params: tuple = (), tamano_lote: int = 500) -> Iterator[sqlite3.Row]:
+        """Ejecuta query y entrega las filas de a `tamano_lote` con fetchmany"""
+        cursor = self._obtener_conexion().cursor()
+        try:
+            cursor.execute(query, params)
+            while True:
+                filas = cursor.fetchmany(tamano_lote)
+                if not filas:
+                    return
+                yield from filas
+        finally:
+            cursor.close()
+
+
+class EjecutorSQLite:
+    """Hilo escritor dedicado y grupo de hilos lectores para uso desde asyncio.
+
+    Cada hilo abre su propia conexión. Las escrituras se serializan en un único
+    hilo y las lecturas se reparten entre los lectores, que en modo WAL leen
+    una instantánea consistente sin bloquear al escritor.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, lectores: int = 4):
+        self.db_path = db_path = db_manager.db_path
+        self.perfil = db_manager.perfil
+        self._local = threading.local()
+        self._conexiones: List[sqlite3.Connection] = []
+        self._candado = threading.Lock()
+        self.db = ConexionDirecta(self._conexion_hilo)
+
+        self._escritor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="sqlite-escritor",
+            initializer=self._abrir_conexion, initargs=(False,),
+        )
+        # Una base en memoria no se puede compartir entre conexiones
+        self._lectores: Optional[ThreadPoolExecutor] = None
+        if not es_memoria(db_path) and lectores > 0:
+            self._lectores = ThreadPoolExecutor(
+                max_workers=lectores, thread_name_prefix="sqlite-lector",
+                initializer=self._abrir_conexion, initargs=(True,),
+            )
+
+    def _abrir_conexion(self, solo_lectura: bool):
+        if solo_lectura:
+            conn = sqlite3.connect(_uri_solo_lectura(self.db_path), uri=True, check_same_thread=False,
+                                   cached_statements=SENTENCIAS_EN_CACHE)
+        else:
+            conn = sqlite3.connect(self.db_path, uri=self.db_path.startswith("file:"), check_same_thread=False,
+                                   cached_statements=SENTENCIAS_EN_CACHE)
+            if not es_memoria(self.db_path):
+                conn.execute("PRAGMA journal_mode = WAL")
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        for pragma in self.perfil.pragmas(solo_lectura):
+            conn.execute(pragma)
+        self._local.conn = conn
+        with self._candado:
+            self._conexiones.append(conn)
+
+    def _conexion_hilo(self) -> sqlite3.Connection:
+        return self._local.conn
+
+    def _en_instantanea(self, funcion: Callable, *args):
+        """Ejecuta todas las lecturas de la función sobre la misma instantánea"""
+        conn = self._local.conn
+        conn.execute("BEGIN")
+        try:
+            return funcion(*args)
+        finally:
+            conn.rollback()
+
+    def _en_escritor(self, funcion: Callable, *args):
+        conn = self._local.conn
+        try:
+            return funcion(*args)
+        except Exception:
+            conn.rollback()
+            raise
+
+    async def leer(self, funcion: Callable, *args):
+        """Ejecuta una función de solo lectura en un hilo lector"""
+        if self._lectores is None:
+            return await self.escribir(funcion, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._lectores, self._en_instantanea, funcion, *args)
+
+    async def escribir(self, funcion: Callable, *args):
+        """Ejecuta una función en el hilo escritor (serializado)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._escritor, self._en_escritor, funcion, *args)
+
+    def cerrar(self):
+        """Espera las tareas pendientes y cierra todas las conexiones"""
+        self._escritor.shutdown(wait=True)
+        if self._lectores:
+            self._lectores.shutdown(wait=True)
+        with self._candado:
+            for conn in self._conexiones:
+                conn.close()
+            self._conexiones.clear()
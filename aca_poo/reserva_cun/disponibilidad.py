@@ -0,0 +1,101 @@
+import asyncio
+import itertools
+import threading
+import traceback
+from datetime import date
+from typing import Callable, Dict, Optional, Tuple
+
+from models import CambioDisponibilidad
+
+Clave = Tuple[Optional[int], Optional[date]]
+
+
+class PublicadorDisponibilidad:
+    """Publicación en proceso de los cambios de ocupación por sala y día.
+
+    Los suscriptores se registran con una clave `(sala_id, fecha)` en la que
+    cualquiera de los dos puede ser None como comodín. Publicar un cambio
+    mira solo las cuatro claves que pueden coincidir, así que el costo no
+    depende de cuántas suscripciones haya para otras salas o días.
+
+    Los avisos se entregan después de confirmar la transacción y desde el
+    hilo que hizo el cambio: los callbacks deben ser rápidos y no escribir
+    en la base. Las colas asyncio reciben el aviso en el hilo de su bucle;
+    si una cola acotada se llena se descarta el aviso más antiguo, porque al
+    cliente le basta saber que el día cambió para volver a consultarlo.
+    """
+
+    def __init__(self):
+        self._suscripciones: Dict[Clave, Dict[int, Callable[[CambioDisponibilidad], None]]] = {}
+        self._claves: Dict[int, Clave] = {}
+        self._contador = itertools.count(1)
+        self._candado = threading.Lock()
+
+    def suscribir(self, callback: Callable[[CambioDisponibilidad], None],
+                  sala_id: Optional[int] = None, fecha: Optional[date] = None) -> int:
+        """Registra un callback para una sala y día (None = cualquiera)
+
+        Returns: identificador para `cancelar`
+        """
+        clave = (sala_id, fecha)
+        with self._candado:
+            token = next(self._contador)
+            self._suscripciones.setdefault(clave, {})[token] = callback
+            self._claves[token] = clave
+        return token
+
+    def suscribir_cola(self, sala_id: Optional[int] = None, fecha: Optional[date] = None,
+                       maximo: int = 0) -> Tuple[int, asyncio.Queue]:
+        """Registra una cola asyncio en el bucle actual (llamar desde una corrutina)
+
+        Returns: (identificador, cola de CambioDisponibilidad)
+        """
+        bucle = asyncio.get_running_loop()
+        cola: asyncio.Queue = asyncio.Queue(maximo)
+
+        def encolar(cambio: CambioDisponibilidad):
+            if cola.full():
+                cola.get_nowait()
+            cola.put_nowait(cambio)
+
+        def entregar(cambio: CambioDisponibilidad):
+            try:
+                bucle.call_soon_threadsafe(encolar, cambio)
+            except RuntimeError:
+                # El bucle ya se cerró sin cancelar la suscripción
+                self.cancelar(token)
+
+        token = self.suscribir(entregar, sala_id, fecha)
+        return token, cola
+
+    def cancelar(self, token: int) -> bool:
+        """Elimina una suscripción; devuelve si existía"""
+        with self._candado:
+            clave = self._claves.pop(token, None)
+            if clave is None:
+                return False
+            suscriptores = self._suscripciones[clave]
+            del suscriptores[token]
+            if not suscriptores:
+                del self._suscripciones[clave]
+            return True
+
+    def publicar(self, cambio: CambioDisponibilidad) -> int:
+        """Entrega el cambio a las suscripciones que coinciden
+
+        Returns: cantidad de suscriptores notificados
+        """
+        claves = (
+            (cambio.sala_id, cambio.fecha), (cambio.sala_id, None), (None, cambio.fecha), (None, None),
+        )
+        with self._candado:
+            destinatarios = [
+                callback for clave in claves for callback in self._suscripciones.get(clave, {}).values()
+            ]
+        for callback in destinatarios:
+            # Un suscriptor con errores no debe afectar la operación que ya se confirmó
+            try:
+                callback(cambio)
+            except Exception:
+                traceback.print_exc()
+        return len(destinatarios)
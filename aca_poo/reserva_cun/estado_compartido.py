@@ -0,0 +1,362 @@
+import argparse
+import contextlib
+import json
+import os
+import struct
+import sys
+import threading
+import time as reloj
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from multiprocessing import shared_memory
+from typing import List, Optional
+
+from models import EstadoSala, Sala
+
+NOMBRE_SEGMENTO = "reserva_cun_estado_salas"
+
+# secuencia (seqlock), versión, publicado_en (epoch), cantidad de salas, capacidad del segmento
+CABECERA = struct.Struct("<QQdII")
+_SECUENCIA = struct.Struct("<Q")
+_RESTO_CABECERA = struct.Struct("<QdII")
+# sala_id, capacidad, estado, reservas activas, próximo hueco: fecha (ordinal, 0 = ninguno),
+# inicio y fin (minutos del día), nombre (UTF-8 truncado)
+ENTRADA = struct.Struct("<IHBxIIHH48s")
+
+ESTADOS = list(EstadoSala)
+
+
+class InstantaneaNoDisponible(ValueError):
+    """No hay un estado de salas publicado que se pueda leer."""
+
+
+@dataclass
+class EstadoSalaPublicado:
+    """Estado de una sala tal como lo publica el proceso escritor"""
+    sala_id: int
+    nombre: str
+    capacidad: int
+    estado: EstadoSala
+    reservas_activas: int  # desde hoy, según ocupacion_diaria
+    proxima_fecha: Optional[date] = None  # primer hueco libre de 30 minutos
+    proxima_inicio: Optional[time] = None
+    proxima_fin: Optional[time] = None
+
+    @property
+    def puede_reservar(self) -> bool:
+        return self.estado != EstadoSala.MANTENIMIENTO
+
+
+@dataclass
+class InstantaneaEstadoSalas:
+    """Copia consistente del segmento compartido"""
+    version: int
+    publicado_en: datetime
+    salas: List[EstadoSalaPublicado] = field(default_factory=list)
+
+
+def _adjuntar(nombre: str) -> shared_memory.SharedMemory:
+    """Abre un segmento existente sin que este proceso pase a ser su dueño"""
+    try:
+        if sys.version_info >= (3, 13):
+            return shared_memory.SharedMemory(nombre, track=False)
+        memoria = shared_memory.SharedMemory(nombre)
+    except FileNotFoundError:
+        raise InstantaneaNoDisponible(f"No hay un publicador de estado de salas activo ({nombre})") from None
+    if os.name == "posix":
+        # Antes de 3.13 el resource_tracker borra al salir también los segmentos solo adjuntados
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(memoria._name, "shared_memory")
+    return memoria
+
+
+def _a_minutos(hora: Optional[time]) -> int:
+    return hora.hour * 60 + hora.minute if hora else 0
+
+
+class PublicadorEstadoSalas:
+    """Publica el estado de las salas en memoria compartida para otros procesos.
+
+    El proceso que escribe en la base arma una tabla compacta (sala,
+    estado, reservas activas y próximo hueco libre) y la copia a un
+    segmento de `multiprocessing.shared_memory`; los kioscos la leen con
+    LectorEstadoSalas sin consultar la base. La consistencia se logra con
+    un seqlock: la secuencia de la cabecera es impar mientras se escribe y
+    los lectores reintentan si cambió durante su copia.
+
+    Se republica al recibir cualquier CambioDisponibilidad del servicio de
+    reservas (los avisos se agrupan: una ráfaga produce una publicación) y
+    cada `intervalo_segundos`, que recoge los cambios de estado de sala y
+    el avance del reloj sobre el próximo hueco.
+    """
+
+    def __init__(self, reserva_service, sala_service, nombre: str = NOMBRE_SEGMENTO,
+                 capacidad: int = 256, intervalo_segundos: float = 30):
+        self.reserva_service = reserva_service
+        self.sala_service = sala_service
+        self.nombre = nombre
+        self.capacidad = capacidad
+        self.intervalo_segundos = intervalo_segundos
+        tamano = CABECERA.size + capacidad * ENTRADA.size
+        try:
+            self._memoria = shared_memory.SharedMemory(nombre, create=True, size=tamano)
+            self._secuencia = self._version = 0
+        except FileExistsError:
+            # Segmento de un publicador anterior que no se cerró: se reutiliza sin reiniciar la versión
+            self._memoria = shared_memory.SharedMemory(nombre)
+            secuencia, version, _, _, anterior = CABECERA.unpack_from(self._memoria.buf)
+            if anterior != capacidad or self._memoria.size < tamano:
+                self._memoria.close()
+                raise ValueError(f"El segmento {nombre} existe con otra capacidad ({anterior} salas)")
+            self._secuencia, self._version = secuencia + (secuencia & 1), version
+        self._candado = threading.Lock()
+        self._pendiente = threading.Event()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self._suscripcion: Optional[int] = None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def publicar(self, ahora: datetime = None) -> int:
+        """Recalcula el estado desde la base y lo escribe en el segmento
+
+        Returns: versión publicada
+        """
+        ahora = ahora or datetime.now()
+        salas = self.sala_service.listar_salas()
+        if len(salas) > self.capacidad:
+            raise ValueError(f"Hay {len(salas)} salas y el segmento admite {self.capacidad}")
+        activas = self.reserva_service.contar_reservas_activas_por_sala(ahora.date())
+        huecos = self.reserva_service.proximos_huecos(salas, ahora=ahora)
+
+        entradas = []
+        for sala in salas:
+            fecha, inicio, fin = huecos.get(sala.id) or (None, None, None)
+            nombre = sala.nombre.encode("utf-8")[:48].decode("utf-8", "ignore").encode("utf-8")
+            entradas.append((
+                sala.id, min(sala.capacidad, 0xFFFF), ESTADOS.index(sala.estado), activas.get(sala.id, 0),
+                fecha.toordinal() if fecha else 0, _a_minutos(inicio), _a_minutos(fin), nombre,
+            ))
+        return self._escribir(entradas, ahora.timestamp())
+
+    def _escribir(self, entradas: list, publicado_en: float) -> int:
+        with self._candado:
+            buf = self._memoria.buf
+            # Secuencia impar: los lectores que copien ahora descartarán la copia. Se escribe
+            # con una sola copia de 8 bytes; pack_into pone antes el campo en cero y un lector
+            # podría tomar ese 0 por una secuencia par.
+            buf[:_SECUENCIA.size] = _SECUENCIA.pack(self._secuencia + 1)
+            for i, entrada in enumerate(entradas):
+                ENTRADA.pack_into(buf, CABECERA.size + i * ENTRADA.size, *entrada)
+            self._version += 1
+            _RESTO_CABECERA.pack_into(buf, _SECUENCIA.size, self._version, publicado_en,
+                                      len(entradas), self.capacidad)
+            self._secuencia += 2
+            buf[:_SECUENCIA.size] = _SECUENCIA.pack(self._secuencia)
+            return self._version
+
+    def iniciar(self):
+        """Publica ahora y luego ante cada cambio de disponibilidad, en un hilo de fondo"""
+        if self._hilo and self._hilo.is_alive():
+            return
+        self.publicar()
+        self._suscripcion = self.reserva_service.suscribir_disponibilidad(lambda cambio: self._pendiente.set())
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="estado-salas", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """Deja de republicar (el segmento sigue disponible hasta `cerrar`)"""
+        if self._suscripcion is not None:
+            self.reserva_service.cancelar_suscripcion(self._suscripcion)
+            self._suscripcion = None
+        self._detener.set()
+        self._pendiente.set()
+        if self._hilo:
+            self._hilo.join()
+
+    def cerrar(self):
+        """Detiene el hilo y elimina el segmento"""
+        self.detener()
+        self._memoria.close()
+        with contextlib.suppress(FileNotFoundError):
+            self._memoria.unlink()
+
+    def _bucle(self):
+        while True:
+            self._pendiente.wait(self.intervalo_segundos)
+            if self._detener.is_set():
+                return
+            self._pendiente.clear()
+            try:
+                self.publicar()
+            except Exception as e:
+                print(f"⚠️  Error al publicar el estado de salas: {e}")
+
+
+class LectorEstadoSalas:
+    """Lee el estado de salas publicado por otro proceso, sin tocar la base.
+
+    `leer` copia el segmento dentro del seqlock y reintenta si el escritor
+    lo modificó durante la copia; si la versión no cambió desde la última
+    lectura devuelve la instantánea anterior sin decodificar nada.
+    """
+
+    def __init__(self, nombre: str = NOMBRE_SEGMENTO, reintentos: int = 1000):
+        self.nombre = nombre
+        self.reintentos = reintentos
+        self._memoria = _adjuntar(nombre)
+        capacidad = CABECERA.unpack_from(self._memoria.buf)[4]
+        self._tamano = CABECERA.size + capacidad * ENTRADA.size
+        self._ultima: Optional[InstantaneaEstadoSalas] = None
+
+    def version(self) -> int:
+        """Versión publicada actualmente (0 si todavía no se publicó nada)"""
+        return self._copiar(solo_cabecera=True)[1]
+
+    def leer(self) -> InstantaneaEstadoSalas:
+        """Instantánea consistente del estado de todas las salas"""
+        _, version, datos = self._copiar()
+        if version == 0:
+            raise InstantaneaNoDisponible("El publicador todavía no escribió el estado de salas")
+        if self._ultima is None or self._ultima.version != version:
+            self._ultima = self._decodificar(datos)
+        return self._ultima
+
+    def obtener_estado_salas(self) -> List[dict]:
+        """Mismo formato que SalaService.obtener_estado_salas, más reservas activas y próximo hueco"""
+        return [
+            {
+                'sala': Sala(id=s.sala_id, nombre=s.nombre, capacidad=s.capacidad, estado=s.estado),
+                'estado': s.estado,
+                'puede_reservar': s.puede_reservar,
+                'reservas_activas': s.reservas_activas,
+                'proximo_hueco': (s.proxima_fecha, s.proxima_inicio, s.proxima_fin) if s.proxima_fecha else None,
+            }
+            for s in self.leer().salas
+        ]
+
+    def cerrar(self):
+        self._memoria.close()
+
+    def _copiar(self, solo_cabecera: bool = False):
+        buf = self._memoria.buf
+        for _ in range(self.reintentos):
+            antes = _SECUENCIA.unpack_from(buf)[0]
+            if not antes & 1:
+                version = CABECERA.unpack_from(buf)[1]
+                if solo_cabecera or (self._ultima is not None and self._ultima.version == version):
+                    datos = None
+                else:
+                    datos = bytes(buf[:self._tamano])
+                if _SECUENCIA.unpack_from(buf)[0] == antes:
+                    return antes, version, datos
+            reloj.sleep(0)
+        raise InstantaneaNoDisponible(f"El estado de salas cambió en cada uno de {self.reintentos} intentos")
+
+    @staticmethod
+    def _decodificar(datos: bytes) -> InstantaneaEstadoSalas:
+        _, version, publicado_en, cantidad, _ = CABECERA.unpack_from(datos)
+        salas = []
+        for sala_id, capacidad, estado, activas, fecha, inicio, fin, nombre in ENTRADA.iter_unpack(
+                datos[CABECERA.size:CABECERA.size + cantidad * ENTRADA.size]):
+            salas.append(EstadoSalaPublicado(
+                sala_id=sala_id,
+                nombre=nombre.rstrip(b"\0").decode("utf-8"),
+                capacidad=capacidad,
+                estado=ESTADOS[estado],
+                reservas_activas=activas,
+                proxima_fecha=date.fromordinal(fecha) if fecha else None,
+                proxima_inicio=time(inicio // 60, inicio % 60) if fecha else None,
+                proxima_fin=time(fin // 60, fin % 60) if fecha else None,
+            ))
+        return InstantaneaEstadoSalas(version, datetime.fromtimestamp(publicado_en), salas)
+
+
+def _imprimir(instantanea: InstantaneaEstadoSalas, como_json: bool):
+    if como_json:
+        print(json.dumps({
+            'version': instantanea.version,
+            'publicado_en': instantanea.publicado_en.isoformat(timespec="seconds"),
+            'salas': [
+                {
+                    'id': s.sala_id, 'nombre': s.nombre, 'capacidad': s.capacidad, 'estado': s.estado.value,
+                    'reservas_activas': s.reservas_activas,
+                    'proximo_hueco': None if s.proxima_fecha is None else {
+                        'fecha': s.proxima_fecha.isoformat(),
+                        'inicio': s.proxima_inicio.isoformat(timespec="minutes"),
+                        'fin': s.proxima_fin.isoformat(timespec="minutes"),
+                    },
+                }
+                for s in instantanea.salas
+            ],
+        }, ensure_ascii=False), flush=True)
+        return
+    print(f"\n📋 Estado de salas (versión {instantanea.version}, {instantanea.publicado_en:%H:%M:%S})")
+    for s in instantanea.salas:
+        hueco = (f"{s.proxima_fecha} {s.proxima_inicio:%H:%M}-{s.proxima_fin:%H:%M}"
+                 if s.proxima_fecha else "sin huecos")
+        print(f"   {s.sala_id:>4}  {s.nombre:<28} {s.estado.value:<13} {s.reservas_activas:>4} activas  {hueco}")
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    """Publica el estado de salas en memoria compartida o lo muestra desde un kiosco"""
+    parser = argparse.ArgumentParser(description="Estado de salas en memoria compartida")
+    parser.add_argument("--nombre", default=NOMBRE_SEGMENTO, help="Nombre del segmento compartido")
+    acciones = parser.add_subparsers(dest="accion", required=True)
+
+    publicar = acciones.add_parser("publicar", help="Publica desde la base cada --intervalo segundos hasta Ctrl+C")
+    publicar.add_argument("--db", default="reserva_cun.db", help="Ruta de la base de datos SQLite")
+    publicar.add_argument("--intervalo", type=float, default=30, help="Segundos entre publicaciones")
+    publicar.add_argument("--capacidad", type=int, default=256, help="Máximo de salas del segmento")
+    leer = acciones.add_parser("leer", help="Muestra el estado publicado (sin consultar la base)")
+    leer.add_argument("--seguir", type=float, metavar="SEGUNDOS",
+                      help="Vuelve a mostrar el estado cada vez que cambia la versión")
+    leer.add_argument("--json", action="store_true", help="Una línea JSON por versión")
+    args = parser.parse_args(argv)
+
+    if args.accion == "leer":
+        try:
+            lector = LectorEstadoSalas(args.nombre)
+        except InstantaneaNoDisponible as e:
+            print(f"❌ {e}")
+            raise SystemExit(1)
+        try:
+            version = None
+            while True:
+                if lector.version() != version:
+                    instantanea = lector.leer()
+                    version = instantanea.version
+                    _imprimir(instantanea, args.json)
+                if args.seguir is None:
+                    break
+                reloj.sleep(args.seguir)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            lector.cerrar()
+        return
+
+    from database import DatabaseManager
+    from main import construir_servicios
+
+    db_manager = DatabaseManager(args.db)
+    reserva_service, sala_service, _ = construir_servicios(db_manager)
+    publicador = PublicadorEstadoSalas(reserva_service, sala_service, args.nombre, args.capacidad, args.intervalo)
+    publicador.iniciar()
+    print(f"📡 Publicando el estado de salas en '{args.nombre}' (versión {publicador.version})")
+    try:
+        while True:
+            reloj.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        publicador.cerrar()
+        db_manager.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import json
+import time as reloj
+from datetime import date, datetime, time
+from typing import Iterable, List
+
+from database import DatabaseManager
+from models import EstadoReserva, EventoReserva
+
+
+def evento_a_dict(evento: EventoReserva) -> dict:
+    """Representación JSON de un evento"""
+    return {
+        'id': evento.id,
+        'tipo': evento.tipo,
+        'reserva_id': evento.reserva_id,
+        'estudiante_id': evento.estudiante_id,
+        'sala_id': evento.sala_id,
+        'fecha_reserva': evento.fecha_reserva.isoformat(),
+        'hora_inicio': evento.hora_inicio.isoformat(),
+        'hora_fin': evento.hora_fin.isoformat(),
+        'estado': evento.estado.value,
+        'version': evento.version,
+        'creado_en': evento.creado_en.isoformat() if evento.creado_en else None,
+    }
+
+
+class BuzonEventos:
+    """Lectura incremental de `eventos_reserva` con posiciones confirmadas.
+
+    Cada consumidor (señalización, correo, analítica...) guarda el ID del
+    último evento que procesó; `leer` devuelve los siguientes por ID
+    creciente recorriendo la clave primaria, de modo que integrarse cuesta
+    O(cambios) y no O(tabla). La entrega es "al menos una vez": si el
+    consumidor cae antes de `confirmar`, vuelve a recibir esos eventos.
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db = db_manager
+
+    def posicion(self, consumidor: str) -> int:
+        """ID del último evento confirmado por el consumidor (0 si es nuevo)"""
+        fila = self.db.fetch_one(
+            "SELECT ultimo_evento FROM consumidores_eventos WHERE nombre = ?", (consumidor,)
+        )
+        return fila["ultimo_evento"] if fila else 0
+
+    def leer(self, consumidor: str, limite: int = 100) -> List[EventoReserva]:
+        """Eventos posteriores a la posición confirmada del consumidor"""
+        filas = self.db.fetch_all(
+            """
+            SELECT * FROM eventos_reserva
+            WHERE id > COALESCE((SELECT ultimo_evento FROM consumidores_eventos WHERE nombre = ?), 0)
+            ORDER BY id
+            LIMIT ?
+            """,
+            (consumidor, limite),
+        )
+        return [self._row_to_evento(fila) for fila in filas]
+
+    def confirmar(self, consumidor: str, hasta_id: int) -> int:
+        """Marca como procesados los eventos hasta `hasta_id`; la posición nunca retrocede
+
+        Returns: posición resultante del consumidor
+        """
+        self.db.execute_query(
+            """
+            INSERT INTO consumidores_eventos (nombre, ultimo_evento) VALUES (?, ?)
+            ON CONFLICT (nombre) DO UPDATE SET
+                ultimo_evento = MAX(ultimo_evento, excluded.ultimo_evento),
+                actualizado_en = CURRENT_TIMESTAMP
+            """,
+            (consumidor, hasta_id),
+        )
+        return self.posicion(consumidor)
+
+    def confirmar_lote(self, consumidor: str, eventos: Iterable[EventoReserva]):
+        """Confirma un lote devuelto por `leer`"""
+        ultimo = max((evento.id for evento in eventos), default=None)
+        if ultimo is not None:
+            self.confirmar(consumidor, ultimo)
+
+    def purgar(self) -> int:
+        """Borra los eventos que ya confirmaron todos los consumidores registrados
+
+        Un consumidor que se registre después no verá los eventos purgados.
+
+        Returns: cantidad de eventos borrados
+        """
+        cursor = self.db.execute_query(
+            """
+            DELETE FROM eventos_reserva
+            WHERE id <= (SELECT MIN(ultimo_evento) FROM consumidores_eventos)
+            """
+        )
+        return cursor.rowcount
+
+    def _row_to_evento(self, row) -> EventoReserva:
+        """Convierte fila a objeto EventoReserva."""
+        return EventoReserva(
+            id=row["id"],
+            tipo=row["tipo"],
+            reserva_id=row["reserva_id"],
+            estudiante_id=row["estudiante_id"],
+            sala_id=row["sala_id"],
+            fecha_reserva=date.fromisoformat(row["fecha_reserva"]),
+            hora_inicio=time.fromisoformat(row["hora_inicio"]),
+            hora_fin=time.fromisoformat(row["hora_fin"]),
+            estado=EstadoReserva(row["estado"]),
+            version=row["version"],
+            creado_en=datetime.fromisoformat(row["creado_en"]) if row["creado_en"] else None,
+        )
+
+
+def main(argv=None):
+    """Imprime los eventos pendientes de un consumidor como NDJSON"""
+    parser = argparse.ArgumentParser(description="Lee la bandeja de eventos de reservas")
+    parser.add_argument("--db", default="reserva_cun.db", help="Ruta de la base de datos SQLite")
+    parser.add_argument("--consumidor", required=True, help="Nombre del consumidor cuya posición se usa")
+    parser.add_argument("--limite", type=int, default=100, help="Eventos por lectura")
+    parser.add_argument("--confirmar", action="store_true", help="Avanza la posición tras imprimir cada lote")
+    parser.add_argument("--seguir", type=float, metavar="SEGUNDOS",
+                        help="Sigue leyendo, esperando este intervalo cuando no hay eventos nuevos")
+    parser.add_argument("--purgar", action="store_true",
+                        help="Borra los eventos ya confirmados por todos los consumidores y termina")
+    args = parser.parse_args(argv)
+
+    db_manager = DatabaseManager(args.db)
+    buzon = BuzonEventos(db_manager)
+    try:
+        if args.purgar:
+            print(f"🧹 {buzon.purgar()} eventos purgados")
+            return
+        while True:
+            eventos = buzon.leer(args.consumidor, args.limite)
+            for evento in eventos:
+                print(json.dumps(evento_a_dict(evento), ensure_ascii=False), flush=True)
+            # Sin --confirmar la posición no avanza: solo tiene sentido una lectura
+            if not args.confirmar:
+                break
+            buzon.confirmar_lote(args.consumidor, eventos)
+            if len(eventos) < args.limite:
+                if args.seguir is None:
+                    break
+                reloj.sleep(args.seguir)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db_manager.cerrar()
+
+
+if __name__ == "__main__":
+    main()
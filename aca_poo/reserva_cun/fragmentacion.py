@@ -0,0 +1,459 @@
+import heapq
+import itertools
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, time, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from consultas import CONSULTAS
+from database import DatabaseManager
+from eventos import BuzonEventos
+from models import Reserva, Estudiante, Sala, EstadoSala, OcupacionDiaria, SerieReserva, EsperaReserva, UsoCuota, EventoReserva
+from repositories import Flujo, ReservaRepository, OcupacionRepository, SalaRepository
+
+
+# Cada fragmento numera sus reservas en un bloque propio de IDs, de modo que
+# el ID de una reserva indica en qué archivo está sin consultar a los demás.
+BLOQUE_IDS = 10 ** 12
+
+
+class FragmentoReservas(DatabaseManager):
+    """Base SQLite de una sede: solo guarda la tabla de reservas.
+
+    Estudiantes y salas viven en la base catálogo, por eso la tabla del
+    fragmento no declara claves foráneas.
+    """
+
+    def __init__(self, db_path: str, indice: int, lectores: int = 2, perfil=None):
+        self.indice = indice
+        super().__init__(db_path, lectores=lectores, perfil=perfil)
+
+    def _init_db(self):
+        """Crea el esquema de reservas y reserva el bloque de IDs del fragmento"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            self._crear_tablas_reservas(cursor, claves_foraneas=False)
+            for tabla in ('reservas', 'series_reserva', 'lista_espera', 'eventos_reserva'):
+                cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (tabla,))
+                if cursor.fetchone() is None:
+                    cursor.execute(
+                        "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                        (tabla, self.indice * BLOQUE_IDS),
+                    )
+            conn.commit()
+
+
+class EnrutadorFragmentos:
+    """Reparte las reservas en un archivo SQLite por sede.
+
+    La sede de cada sala se lee del catálogo (`salas.sede`) en cada
+    operación, sin caché, para que editar o eliminar una sala se vea de
+    inmediato; las salas sin sede van a `sede_por_defecto`. Las reservas
+    guardadas no se mueven de fragmento, por eso SalaRepositoryFragmentado
+    solo deja cambiar la sede de salas sin reservas. Cada fragmento tiene su
+    propio escritor, así que las reservas de sedes distintas no se
+    serializan entre sí.
+    """
+
+    def __init__(self, catalogo: DatabaseManager, directorio: str,
+                 sede_por_defecto: str = "principal", hilos: int = 4):
+        self.catalogo = catalogo
+        self.directorio = directorio
+        self.sede_por_defecto = sede_por_defecto
+        self._fragmentos: Dict[str, FragmentoReservas] = {}
+        self._por_indice: Dict[int, FragmentoReservas] = {}
+        self._candado = threading.Lock()
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="fragmento")
+
+        os.makedirs(directorio, exist_ok=True)
+        for fila in self.catalogo.fetch_all(CONSULTAS["fragmentos.sedes"]):
+            self.fragmento_de_sede(fila["sede"])
+
+    def fragmento_de_sede(self, sede: Optional[str]) -> FragmentoReservas:
+        """Devuelve (creándolo si hace falta) el fragmento de una sede"""
+        sede = sede or self.sede_por_defecto
+        with self._candado:
+            fragmento = self._fragmentos.get(sede)
+            if fragmento:
+                return fragmento
+
+            with self.catalogo.sesion():
+                fila = self.catalogo.fetch_one(CONSULTAS["fragmentos.indice"], (sede,))
+                if fila:
+                    indice = fila["indice"]
+                else:
+                    indice = self.catalogo.fetch_one(CONSULTAS["fragmentos.siguiente_indice"])["indice"]
+                    self.catalogo.execute_query(CONSULTAS["fragmentos.insertar"], (sede, indice))
+
+            nombre = re.sub(r"[^a-z0-9]+", "_", sede.lower()).strip("_") or f"sede{indice}"
+            ruta = os.path.join(self.directorio, f"reservas_{indice}_{nombre}.db")
+            fragmento = FragmentoReservas(ruta, indice, perfil=self.catalogo.perfil)
+            self._fragmentos[sede] = fragmento
+            self._por_indice[indice] = fragmento
+            return fragmento
+
+    def fragmento_de_sala(self, sala_id: int) -> FragmentoReservas:
+        """Fragmento donde se guardan las reservas de una sala"""
+        fila = self.catalogo.fetch_one(CONSULTAS["fragmentos.sede_de_sala"], (sala_id,))
+        if not fila:
+            raise ValueError("Sala no encontrada")
+        return self.fragmento_de_sede(fila["sede"])
+
+    def fragmento_de_reserva(self, reserva_id: int) -> Optional[FragmentoReservas]:
+        """Fragmento que generó un ID de reserva"""
+        return self._por_indice.get(reserva_id // BLOQUE_IDS)
+
+    def fragmentos(self) -> List[FragmentoReservas]:
+        with self._candado:
+            return list(self._fragmentos.values())
+
+    def dispersar(self, funcion: Callable[[FragmentoReservas], list]) -> List[list]:
+        """Ejecuta la función en todos los fragmentos en paralelo"""
+        return list(self._ejecutor.map(funcion, self.fragmentos()))
+
+    def cerrar(self):
+        self._ejecutor.shutdown(wait=True)
+        for fragmento in self.fragmentos():
+            fragmento.cerrar()
+
+
+class ReservaRepositoryFragmentado(ReservaRepository):
+    """ReservaRepository que enruta cada operación al fragmento de su sede.
+
+    Las operaciones de una sala o de un ID van a un solo fragmento; los
+    listados que cruzan sedes consultan todos en paralelo y mezclan los
+    resultados ya ordenados de cada uno.
+    """
+
+    def __init__(self, enrutador: EnrutadorFragmentos):
+        super().__init__(enrutador.catalogo)
+        self.enrutador = enrutador
+        self._repos: Dict[int, ReservaRepository] = {}
+
+    def _repo(self, fragmento: FragmentoReservas) -> ReservaRepository:
+        repo = self._repos.get(fragmento.indice)
+        if repo is None:
+            repo = self._repos[fragmento.indice] = ReservaRepository(fragmento)
+        return repo
+
+    def _repo_de_sala(self, sala_id: int) -> ReservaRepository:
+        return self._repo(self.enrutador.fragmento_de_sala(sala_id))
+
+    def _repo_de_reserva(self, reserva_id: int) -> Optional[ReservaRepository]:
+        fragmento = self.enrutador.fragmento_de_reserva(reserva_id)
+        return self._repo(fragmento) if fragmento else None
+
+    # ========== OPERACIONES DE UN SOLO FRAGMENTO ==========
+
+    def crear(self, reserva: Reserva) -> int:
+        return self._repo_de_sala(reserva.sala_id).crear(reserva)
+
+    def _existe_reserva_conflicto(self, sala_id: int, fecha: date, hora_inicio: time, hora_fin: time,
+                                  excluir_reserva_id: Optional[int] = None) -> bool:
+        return self._repo_de_sala(sala_id)._existe_reserva_conflicto(
+            sala_id, fecha, hora_inicio, hora_fin, excluir_reserva_id
+        )
+
+    def obtener_por_id(self, reserva_id: int) -> Optional[Reserva]:
+        repo = self._repo_de_reserva(reserva_id)
+        return repo.obtener_por_id(reserva_id) if repo else None
+
+    def obtener_por_sala(self, sala_id: int, incluir_archivo: bool = False) -> List[Reserva]:
+        repo = self._repo_de_sala(sala_id)
+        query = repo._consulta_reservas("fragmentos.reservas_por_sala", incluir_archivo)
+        reservas = [repo._row_to_reserva(row) for row in repo.db.fetch_all(query, (sala_id,))]
+        return self._completar_nombres(reservas)
+
+    def obtener_activas_por_sala_y_fecha(self, sala_id: int, fecha: date) -> List[Reserva]:
+        return self._repo_de_sala(sala_id).obtener_activas_por_sala_y_fecha(sala_id, fecha)
+
+    def tiene_activas(self, sala_id: int) -> bool:
+        return self._repo_de_sala(sala_id).tiene_activas(sala_id)
+
+    def actualizar(self, reserva: Reserva) -> None:
+        fragmento = self.enrutador.fragmento_de_reserva(reserva.id)
+        if fragmento is None:
+            raise ValueError("Reserva no encontrada")
+        if self.enrutador.fragmento_de_sala(reserva.sala_id) is not fragmento:
+            raise ValueError("No se puede mover una reserva a una sala de otra sede")
+        self._repo(fragmento).actualizar(reserva)
+
+    def cancelar(self, reserva_id: int, version: Optional[int] = None) -> bool:
+        repo = self._repo_de_reserva(reserva_id)
+        return repo.cancelar(reserva_id, version) if repo else False
+
+    def obtener_serie(self, serie_id: int) -> Optional[SerieReserva]:
+        repo = self._repo_de_reserva(serie_id)
+        return repo.obtener_serie(serie_id) if repo else None
+
+    def cancelar_serie(self, serie_id: int, desde: date) -> List[date]:
+        repo = self._repo_de_reserva(serie_id)
+        return repo.cancelar_serie(serie_id, desde) if repo else []
+
+    def fechas_en_conflicto(self, estudiante_id: int, sala_id: int, fechas: List[date],
+                            hora_inicio: time, hora_fin: time) -> Dict[date, str]:
+        # Secuencial: puede llamarse dentro de una transacción del fragmento de la sala
+        fragmento = self.enrutador.fragmento_de_sala(sala_id)
+        conflictos: Dict[date, str] = {}
+        for otro in self.enrutador.fragmentos():
+            if otro is not fragmento:
+                conflictos.update(self._repo(otro).fechas_en_conflicto(
+                    estudiante_id, sala_id, fechas, hora_inicio, hora_fin
+                ))
+        conflictos.update(self._repo(fragmento).fechas_en_conflicto(
+            estudiante_id, sala_id, fechas, hora_inicio, hora_fin
+        ))
+        return conflictos
+
+    def crear_serie(self, serie: SerieReserva, omitir_conflictos: bool = False,
+                    conflictos_externos: Optional[Dict[date, str]] = None) -> Tuple[List[date], Dict[date, str]]:
+        # Las reservas del estudiante en otras sedes se revisan antes de
+        # abrir la transacción en el fragmento de la sala
+        fragmento = self.enrutador.fragmento_de_sala(serie.sala_id)
+        fechas = serie.fechas()
+        externos = dict(conflictos_externos or {})
+        for otro in self.enrutador.fragmentos():
+            if otro is not fragmento:
+                externos.update(self._repo(otro).fechas_en_conflicto(
+                    serie.estudiante_id, serie.sala_id, fechas, serie.hora_inicio, serie.hora_fin
+                ))
+        return self._repo(fragmento).crear_serie(serie, omitir_conflictos, externos)
+
+    @contextmanager
+    def transaccion(self, sala_id: int):
+        # La sede puede cambiar mientras se espera el escritor: se vuelve a
+        # enrutar ya con el candado tomado
+        while True:
+            fragmento = self.enrutador.fragmento_de_sala(sala_id)
+            with fragmento.sesion():
+                if self.enrutador.fragmento_de_sala(sala_id) is not fragmento:
+                    continue
+                yield fragmento
+                return
+
+    def agregar_espera(self, espera: EsperaReserva) -> int:
+        return self._repo_de_sala(espera.sala_id).agregar_espera(espera)
+
+    def obtener_esperas(self, sala_id: int, fecha: date) -> List[EsperaReserva]:
+        return self._repo_de_sala(sala_id).obtener_esperas(sala_id, fecha)
+
+    def obtener_espera(self, espera_id: int) -> Optional[EsperaReserva]:
+        repo = self._repo_de_reserva(espera_id)
+        return repo.obtener_espera(espera_id) if repo else None
+
+    def tomar_espera(self, espera_id: int) -> bool:
+        repo = self._repo_de_reserva(espera_id)
+        return repo.tomar_espera(espera_id) if repo else False
+
+    def vincular_espera(self, espera_id: int, reserva_id: int) -> None:
+        repo = self._repo_de_reserva(espera_id)
+        if repo:
+            repo.vincular_espera(espera_id, reserva_id)
+
+    def retirar_espera(self, espera_id: int) -> bool:
+        repo = self._repo_de_reserva(espera_id)
+        return repo.retirar_espera(espera_id) if repo else False
+
+    # ========== OPERACIONES ENTRE FRAGMENTOS ==========
+
+    def obtener_por_estudiante(self, estudiante_id: int, incluir_archivo: bool = False) -> List[Reserva]:
+        def consultar(fragmento: FragmentoReservas) -> List[Reserva]:
+            query = self._repo(fragmento)._consulta_reservas("fragmentos.reservas_por_estudiante", incluir_archivo)
+            return [self._row_to_reserva(row) for row in fragmento.fetch_all(query, (estudiante_id,))]
+
+        partes = self.enrutador.dispersar(consultar)
+        reservas = list(heapq.merge(
+            *partes, key=lambda r: (r.fecha_reserva, r.hora_inicio, r.id), reverse=True
+        ))
+        return self._completar_nombres(reservas)
+
+    def obtener_esperas_por_estudiante(self, estudiante_id: int) -> List[EsperaReserva]:
+        partes = self.enrutador.dispersar(lambda f: self._repo(f).obtener_esperas_por_estudiante(estudiante_id))
+        return list(heapq.merge(
+            *partes, key=lambda e: (e.fecha, e.hora_inicio, e.id), reverse=True
+        ))
+
+    def uso_cuota(self, estudiante_id: int, semanas: List[date]) -> UsoCuota:
+        # Secuencial, como fechas_en_conflicto: se consulta dentro de la transacción de reserva
+        uso = UsoCuota(estudiante_id)
+        for fragmento in self.enrutador.fragmentos():
+            parcial = self._repo(fragmento).uso_cuota(estudiante_id, semanas)
+            uso.reservas_activas += parcial.reservas_activas
+            for semana, minutos in parcial.minutos_por_semana.items():
+                uso.minutos_por_semana[semana] = uso.minutos_por_semana.get(semana, 0) + minutos
+        return uso
+
+    def recontar_cuotas(self, estudiante_id: Optional[int] = None) -> int:
+        partes = self.enrutador.dispersar(lambda f: self._repo(f).recontar_cuotas(estudiante_id))
+        return sum(partes)
+
+    def obtener_todas(self) -> List[Reserva]:
+        partes = self._dispersar(CONSULTAS["fragmentos.reservas_todas"])
+        reservas = list(heapq.merge(*partes, key=lambda r: (r.fecha_reserva, r.hora_inicio, r.id)))
+        return self._completar_nombres(reservas)
+
+    def obtener_ocupados_en_rango(self, desde: date, hasta: date) -> List[tuple]:
+        partes = self.enrutador.dispersar(lambda f: self._repo(f).obtener_ocupados_en_rango(desde, hasta))
+        return [intervalo for parte in partes for intervalo in parte]
+
+    def contar_activas_por_sala(self, desde: date) -> Dict[int, int]:
+        # Cada sala vive en un solo fragmento: basta con unir los resultados
+        partes = self.enrutador.dispersar(lambda f: self._repo(f).contar_activas_por_sala(desde))
+        return {sala_id: activas for parte in partes for sala_id, activas in parte.items()}
+
+    def completar_vencidas(self, ahora: datetime, limite: int = 500) -> List[int]:
+        partes = self.enrutador.dispersar(lambda f: self._repo(f).completar_vencidas(ahora, limite))
+        return [sala_id for parte in partes for sala_id in parte]
+
+    # ========== RECORRIDOS PEREZOSOS ==========
+
+    def iterar_por_sala(self, sala_id: int, incluir_archivo: bool = False, tamano_lote: int = 500) -> Flujo:
+        repo = self._repo_de_sala(sala_id)
+        query = repo._consulta_reservas("fragmentos.reservas_por_sala", incluir_archivo)
+        filas = Flujo(repo.db.iterar(query, (sala_id,), tamano_lote)).mapear(self._row_to_reserva)
+        return self._con_nombres(filas, tamano_lote)
+
+    def iterar_por_estudiante(self, estudiante_id: int, incluir_archivo: bool = False,
+                              tamano_lote: int = 500) -> Flujo:
+        def consultar(fragmento: FragmentoReservas) -> Flujo:
+            query = self._repo(fragmento)._consulta_reservas("fragmentos.reservas_por_estudiante", incluir_archivo)
+            return Flujo(fragmento.iterar(query, (estudiante_id,), tamano_lote)).mapear(self._row_to_reserva)
+
+        partes = [consultar(fragmento) for fragmento in self.enrutador.fragmentos()]
+        reservas = heapq.merge(*partes, key=lambda r: (r.fecha_reserva, r.hora_inicio, r.id), reverse=True)
+        return self._con_nombres(reservas, tamano_lote)
+
+    def iterar_todas(self, tamano_lote: int = 500) -> Flujo:
+        partes = [
+            Flujo(fragmento.iterar(CONSULTAS["fragmentos.reservas_todas"], (), tamano_lote)).mapear(self._row_to_reserva)
+            for fragmento in self.enrutador.fragmentos()
+        ]
+        reservas = heapq.merge(*partes, key=lambda r: (r.fecha_reserva, r.hora_inicio, r.id))
+        return self._con_nombres(reservas, tamano_lote)
+
+    def _con_nombres(self, reservas: Iterable[Reserva], tamano_lote: int) -> Flujo:
+        """Completa los nombres del catálogo lote a lote, sin materializar el recorrido"""
+        lotes = Flujo(reservas).lotes(tamano_lote)
+        return Flujo(reserva for lote in lotes for reserva in self._completar_nombres(lote))
+
+    def _dispersar(self, query: str, params: tuple = ()) -> List[List[Reserva]]:
+        def consultar(fragmento: FragmentoReservas) -> List[Reserva]:
+            return [self._row_to_reserva(row) for row in fragmento.fetch_all(query, params)]
+
+        return self.enrutador.dispersar(consultar)
+
+    def _completar_nombres(self, reservas: Iterable[Reserva]) -> List[Reserva]:
+        """Agrega nombres de estudiante y sala consultando el catálogo en bloque"""
+        reservas = list(reservas)
+        estudiantes = self._nombres("estudiantes", {r.estudiante_id for r in reservas})
+        salas = self._nombres("salas", {r.sala_id for r in reservas})
+        for reserva in reservas:
+            reserva.estudiante = Estudiante(
+                id=reserva.estudiante_id,
+                identificacion="",
+                nombre=estudiantes.get(reserva.estudiante_id, "N/A"),
+            )
+            reserva.sala = Sala(
+                id=reserva.sala_id,
+                nombre=salas.get(reserva.sala_id, "N/A"),
+                capacidad=0,
+                estado=EstadoSala.DISPONIBLE,
+            )
+        return reservas
+
+    def _nombres(self, tabla: str, ids: set) -> Dict[int, str]:
+        if not ids:
+            return {}
+        filas = self.enrutador.catalogo.fetch_all(CONSULTAS[f"fragmentos.nombres_{tabla}"], (json.dumps(sorted(ids)),))
+        return {fila["id"]: fila["nombre"] for fila in filas}
+
+
+class SalaRepositoryFragmentado(SalaRepository):
+    """SalaRepository que no deja cambiar de sede una sala con reservas.
+
+    Las reservas guardadas se quedan en el fragmento donde se crearon (su ID
+    lo indica), así que tras mover la sala los conflictos y listados, que se
+    enrutan por la sede nueva, dejarían de verlas.
+    """
+
+    def __init__(self, enrutador: EnrutadorFragmentos):
+        super().__init__(enrutador.catalogo)
+        self.enrutador = enrutador
+
+    def actualizar(self, sala: Sala) -> bool:
+        fila = self.db.fetch_one(CONSULTAS["fragmentos.sede_de_sala"], (sala.id,))
+        por_defecto = self.enrutador.sede_por_defecto
+        if not fila or (fila["sede"] or por_defecto) == (sala.sede or por_defecto):
+            return super().actualizar(sala)
+
+        # Con el escritor del fragmento actual tomado no entran reservas nuevas de la sala
+        fragmento = self.enrutador.fragmento_de_sede(fila["sede"])
+        with fragmento.sesion():
+            if fragmento.fetch_one(CONSULTAS["fragmentos.sala_con_reservas"], (sala.id, sala.id))["hay"]:
+                raise ValueError("No se puede cambiar la sede de una sala con reservas o lista de espera")
+            return super().actualizar(sala)
+
+
+class OcupacionRepositoryFragmentado(OcupacionRepository):
+    """OcupacionRepository sobre fragmentos: cada sede mantiene su propia tabla."""
+
+    def __init__(self, enrutador: EnrutadorFragmentos):
+        super().__init__(enrutador.catalogo)
+        self.enrutador = enrutador
+
+    def obtener_por_sala(self, sala_id: int, desde: date, hasta: date) -> List[OcupacionDiaria]:
+        fragmento = self.enrutador.fragmento_de_sala(sala_id)
+        return OcupacionRepository(fragmento).obtener_por_sala(sala_id, desde, hasta)
+
+    def obtener_por_rango(self, desde: date, hasta: date) -> List[OcupacionDiaria]:
+        partes = self.enrutador.dispersar(lambda f: OcupacionRepository(f).obtener_por_rango(desde, hasta))
+        return list(heapq.merge(*partes, key=lambda o: (o.fecha, o.sala_id)))
+
+    def reconstruir(self, desde: Optional[date] = None, hasta: Optional[date] = None) -> int:
+        return sum(self.enrutador.dispersar(lambda f: OcupacionRepository(f).reconstruir(desde, hasta)))
+
+
+class BuzonEventosFragmentado(BuzonEventos):
+    """BuzonEventos sobre fragmentos: cada sede lleva sus eventos y sus posiciones.
+
+    Los IDs de evento son crecientes dentro de cada fragmento, no entre
+    fragmentos, así que la posición de un consumidor se guarda por fragmento
+    y `confirmar` se enruta por el bloque de IDs del evento.
+    """
+
+    def __init__(self, enrutador: EnrutadorFragmentos):
+        super().__init__(enrutador.catalogo)
+        self.enrutador = enrutador
+
+    def _buzon(self, evento_id: int) -> BuzonEventos:
+        fragmento = self.enrutador.fragmento_de_reserva(evento_id)
+        if fragmento is None:
+            raise ValueError("Evento no encontrado")
+        return BuzonEventos(fragmento)
+
+    def posicion(self, consumidor: str) -> int:
+        """Evento confirmado más reciente del consumidor entre todos los fragmentos"""
+        return max(self.enrutador.dispersar(lambda f: BuzonEventos(f).posicion(consumidor)), default=0)
+
+    def leer(self, consumidor: str, limite: int = 100) -> List[EventoReserva]:
+        partes = self.enrutador.dispersar(lambda f: BuzonEventos(f).leer(consumidor, limite))
+        mezcla = heapq.merge(*partes, key=lambda e: (e.creado_en or datetime.min, e.id))
+        return list(itertools.islice(mezcla, limite))
+
+    def confirmar(self, consumidor: str, hasta_id: int) -> int:
+        return self._buzon(hasta_id).confirmar(consumidor, hasta_id)
+
+    def confirmar_lote(self, consumidor: str, eventos: Iterable[EventoReserva]):
+        ultimos: Dict[int, int] = {}
+        for evento in eventos:
+            bloque = evento.id // BLOQUE_IDS
+            ultimos[bloque] = max(ultimos.get(bloque, 0), evento.id)
+        for ultimo in ultimos.values():
+            self.confirmar(consumidor, ultimo)
+
+    def purgar(self) -> int:
+        return sum(self.enrutador.dispersar(lambda f: BuzonEventos(f).purgar()))
@@ -0,0 +1,94 @@
+import heapq
+import threading
+from datetime import date, time
+from typing import Callable, Dict, List, Tuple
+
+from models import EsperaReserva
+from repositories import ReservaRepository
+
+
+def _minutos(hora: time) -> int:
+    return hora.hour * 60 + hora.minute
+
+
+class ColaEspera:
+    """Réplica en memoria de la lista de espera, ordenada con montículos.
+
+    SQLite (`lista_espera`) es la fuente de verdad; aquí se guarda, por sala y
+    fecha, un montículo por franja de inicio con entradas
+    `(-prioridad, id, espera)`. Al liberarse un horario solo se miran las
+    cabezas de las franjas que empiezan antes de su fin, así que encontrar al
+    siguiente candidato cuesta O(log n) en lugar de recorrer toda la lista.
+
+    Cada sala y fecha se carga desde la base la primera vez que se necesita.
+    La réplica es por proceso: si la transacción que promovía falla, o si la
+    lista se modifica desde otro proceso, basta con `invalidar` para que se
+    vuelva a leer.
+    """
+
+    def __init__(self, reserva_repo: ReservaRepository):
+        self.reserva_repo = reserva_repo
+        self._colas: Dict[Tuple[int, date], Dict[int, list]] = {}
+        self._candado = threading.Lock()
+
+    def _cola(self, sala_id: int, fecha: date) -> Dict[int, list]:
+        clave = (sala_id, fecha)
+        cola = self._colas.get(clave)
+        if cola is None:
+            cola = self._colas[clave] = {}
+            # Ya vienen ordenadas por prioridad, así que cada lista es un montículo válido
+            for espera in self.reserva_repo.obtener_esperas(sala_id, fecha):
+                cola.setdefault(_minutos(espera.hora_inicio), []).append((-espera.prioridad, espera.id, espera))
+        return cola
+
+    def agregar(self, espera: EsperaReserva):
+        """Refleja una solicitud recién guardada si su sala y fecha ya están cargadas"""
+        with self._candado:
+            cola = self._colas.get((espera.sala_id, espera.fecha))
+            if cola is not None:
+                heapq.heappush(
+                    cola.setdefault(_minutos(espera.hora_inicio), []), (-espera.prioridad, espera.id, espera)
+                )
+
+    def invalidar(self, sala_id: int, fecha: date):
+        """Descarta la réplica de una sala y fecha; se recarga en el próximo uso"""
+        with self._candado:
+            self._colas.pop((sala_id, fecha), None)
+
+    def promover(self, sala_id: int, fecha: date, hora_inicio: time, hora_fin: time,
+                 asignar: Callable[[EsperaReserva], bool]) -> List[EsperaReserva]:
+        """Asigna el horario liberado a las solicitudes compatibles, por prioridad
+
+        `asignar` intenta convertir la solicitud en reserva y devuelve si lo
+        logró; las que no caben siguen esperando. Debe llamarse dentro de la
+        misma transacción que liberó el horario.
+
+        Returns: solicitudes asignadas, en orden
+        """
+        inicio, fin = _minutos(hora_inicio), _minutos(hora_fin)
+        asignadas: List[EsperaReserva] = []
+
+        with self._candado:
+            cola = self._cola(sala_id, fecha)
+            # Montículo de cabezas: el mejor candidato de cada franja que empieza antes del fin
+            cabezas = [(monticulo[0], franja) for franja, monticulo in cola.items() if franja < fin and monticulo]
+            heapq.heapify(cabezas)
+            saltadas = []
+
+            while cabezas:
+                (_, _, espera), franja = heapq.heappop(cabezas)
+                monticulo = cola[franja]
+                entrada = heapq.heappop(monticulo)
+                if _minutos(espera.hora_fin) > inicio and asignar(espera):
+                    asignadas.append(espera)
+                else:
+                    saltadas.append((franja, entrada))
+                if monticulo:
+                    heapq.heappush(cabezas, (monticulo[0], franja))
+
+            for franja, entrada in saltadas:
+                heapq.heappush(cola[franja], entrada)
+            for franja in [franja for franja, monticulo in cola.items() if not monticulo]:
+                del cola[franja]
+
+        return asignadas
@@ -1,12 +1,37 @@
 from database import DatabaseManager
 from repositories import SalaRepository, ReservaRepository, EstudianteRepository
-from services import ReservaService, SalaService, EstudianteService
+from services import ReservaService, SalaService, EstudianteService, PoliticaCuotas
 from cli import CLIHandler
+from cola_escritura import ColaEscrituraAgrupada, ReservaRepositoryAgrupado
+from fragmentacion import EnrutadorFragmentos, ReservaRepositoryFragmentado, SalaRepositoryFragmentado
+from mantenimiento import BarridoReservasVencidas
+from analitica import MotorAnalitica
 import sys
 import traceback
 from datetime import datetime
 
 
+def construir_servicios(db_manager: DatabaseManager, cola_escritura: ColaEscrituraAgrupada = None,
+                        enrutador: EnrutadorFragmentos = None, politica_cuotas: PoliticaCuotas = None):
+    """Arma el grafo repositorios → servicios sobre una base de datos"""
+    # Inicializar repositorios
+    sala_repo = SalaRepositoryFragmentado(enrutador) if enrutador else SalaRepository(db_manager)
+    if enrutador:
+        reserva_repo = ReservaRepositoryFragmentado(enrutador)
+    elif cola_escritura:
+        reserva_repo = ReservaRepositoryAgrupado(db_manager, cola_escritura)
+    else:
+        reserva_repo = ReservaRepository(db_manager)
+    estudiante_repo = EstudianteRepository(db_manager)
+
+    # Inicializar servicios con dependencias inyectadas
+    reserva_service = ReservaService(reserva_repo, sala_repo, estudiante_repo, politica_cuotas)
+    sala_service = SalaService(sala_repo, reserva_service)  # ← Inyectar reserva_service
+    estudiante_service = EstudianteService(estudiante_repo)
+
+    return reserva_service, sala_service, estudiante_service
+
+
 def inicializar_servicios():
 
     try:
@@ -14,19 +39,17 @@ def inicializar_servicios():
 
         # Configuración e inicialización de la base de datos
         db_manager = DatabaseManager()
+        reserva_service, sala_service, estudiante_service = construir_servicios(db_manager)
 
-        # Inicializar repositorios
-        sala_repo = SalaRepository(db_manager)
-        reserva_repo = ReservaRepository(db_manager)
-        estudiante_repo = EstudianteRepository(db_manager)
-
-        # Inicializar servicios con dependencias inyectadas
-        reserva_service = ReservaService(reserva_repo, sala_repo, estudiante_repo)
-        sala_service = SalaService(sala_repo, reserva_service)  # ← Inyectar reserva_service
-        estudiante_service = EstudianteService(estudiante_repo)
+        # Completar reservas vencidas al arrancar y luego periódicamente
+        barrido = BarridoReservasVencidas(reserva_service)
+        completadas = barrido.ejecutar()
+        if completadas:
+            print(f"🗂️  {completadas} reservas vencidas marcadas como completadas")
+        barrido.iniciar()
 
         # Inicializar CLI con servicios
-        cli = CLIHandler(reserva_service, estudiante_service, sala_service)
+        cli = CLIHandler(reserva_service, estudiante_service, sala_service, MotorAnalitica(db_manager))
 
         print("✅ Sistema inicializado correctamente")
         return cli
@@ -38,8 +61,17 @@ def inicializar_servicios():
         sys.exit(1)
 
 
-def main():
-    """Función principal de la aplicación"""
+def main(argv=None):
+    """Función principal de la aplicación
+
+    Con argumentos (`python main.py reservar --sala 3 ...`) ejecuta el modo
+    de comandos no interactivo de `comandos.py` en lugar del menú.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        from comandos import main as ejecutar_comandos
+        sys.exit(ejecutar_comandos(argv))
+
     print("🚀 Iniciando Sistema de Gestión de Reservas de la Universidad CUN...")
     print("📅 " + datetime.now().strftime("%d/%m/%Y %H:%M:%S"))
 
@@ -0,0 +1,96 @@
+import argparse
+import os
+import threading
+from datetime import date, datetime
+from typing import Optional
+
+from archivo import ArchivadorReservas
+from database import DatabaseManager
+from repositories import OcupacionRepository, ReservaRepository
+
+
+class BarridoReservasVencidas:
+    """Pasa a COMPLETADA las reservas activas cuyo horario ya terminó.
+
+    Trabaja en lotes acotados para no retener el escritor mucho tiempo y
+    mantiene el conjunto de reservas 'activa' limitado al calendario futuro,
+    que es lo que recorren las validaciones de cruces y de estado de sala.
+    Se puede ejecutar una vez (al arrancar) o de forma periódica en un hilo.
+    """
+
+    def __init__(self, reserva_service, tamano_lote: int = 500, intervalo_segundos: float = 300):
+        self.reserva_service = reserva_service
+        self.tamano_lote = tamano_lote
+        self.intervalo_segundos = intervalo_segundos
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def ejecutar(self, ahora: datetime = None) -> int:
+        """Completa todas las reservas vencidas, lote por lote
+
+        Returns: total de reservas completadas
+        """
+        ahora = ahora or datetime.now()
+        total = 0
+        while not self._detener.is_set():
+            completadas = self.reserva_service.completar_reservas_vencidas(ahora, self.tamano_lote)
+            total += completadas
+            if completadas < self.tamano_lote:
+                break
+        return total
+
+    def iniciar(self):
+        """Ejecuta el barrido periódicamente en un hilo de fondo"""
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="barrido-reservas", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """Detiene el hilo de fondo al terminar el lote en curso"""
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join()
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            try:
+                self.ejecutar()
+            except Exception as e:
+                print(f"⚠️  Error en el barrido de reservas vencidas: {e}")
+            self._detener.wait(self.intervalo_segundos)
+
+
+def main(argv=None):
+    """Reconstruye la tabla ocupacion_diaria (o los contadores de cuotas) desde las reservas"""
+    parser = argparse.ArgumentParser(description="Reconstruye la ocupación diaria de las salas")
+    parser.add_argument("--db", default="reserva_cun.db", help="Ruta de la base de datos SQLite")
+    parser.add_argument("--desde", type=date.fromisoformat, help="Primera fecha a recalcular (AAAA-MM-DD)")
+    parser.add_argument("--hasta", type=date.fromisoformat, help="Última fecha a recalcular (AAAA-MM-DD)")
+    parser.add_argument("--cuotas", action="store_true",
+                        help="Recuenta los contadores de cuotas por estudiante en lugar de la ocupación")
+    parser.add_argument("--estudiante", type=int, help="Con --cuotas, recuenta solo este estudiante")
+    parser.add_argument("--archivo", help="Base de archivo a incluir (por defecto <db>_archivo.db si existe)")
+    args = parser.parse_args(argv)
+    if args.archivo and not os.path.exists(args.archivo):
+        parser.error(f"No existe la base de archivo {args.archivo}")
+
+    db_manager = DatabaseManager(args.db)
+    try:
+        # Sin el archivo adjunto, reconstruir borraría la ocupación de las reservas archivadas
+        archivador = ArchivadorReservas(db_manager, args.archivo)
+        if os.path.exists(archivador.ruta_archivo):
+            archivador.adjuntar()
+        if args.cuotas:
+            filas = ReservaRepository(db_manager).recontar_cuotas(args.estudiante)
+            print(f"🎟️  Cuotas recontadas: {filas} filas (estudiante, semana)")
+        else:
+            filas = OcupacionRepository(db_manager).reconstruir(args.desde, args.hasta)
+            print(f"📊 Ocupación diaria reconstruida: {filas} filas (sala, día)")
+    finally:
+        db_manager.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
-from dataclasses import dataclass
-from datetime import date, time, datetime
-from typing import List, Optional
+from dataclasses import dataclass, field
+from datetime import date, time, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 from enum import Enum
 import json
 
@@ -17,6 +17,12 @@ class EstadoReserva(Enum):
     COMPLETADA = "completada"
 
 
+class EstadoEspera(Enum):
+    ESPERANDO = "esperando"
+    ASIGNADA = "asignada"
+    RETIRADA = "retirada"
+
+
 @dataclass
 class Horario:
     """Value Object para manejo de horarios"""
@@ -60,6 +66,67 @@ class Estudiante:
         return errores
 
 
+MINUTOS_FRANJA_HORARIO = 15
+FRANJAS_HORARIO_DIA = 24 * 60 // MINUTOS_FRANJA_HORARIO
+
+
+@dataclass(frozen=True)
+class HorarioSemanal:
+    """Horario de apertura de una sala compilado en máscaras de bits
+
+    Un entero por día de la semana (lunes = 0); el bit i indica que la
+    franja de 15 minutos que empieza en el minuto i * 15 está abierta.
+    Verificar un horario es una intersección de bits, sin volver a leer el
+    JSON de `horarios_disponibles`, cuyo formato es una lista de bloques
+    `{"dias": [0, 1, ...], "inicio": "HH:MM", "fin": "HH:MM"}` (sin
+    `dias`, el bloque vale para toda la semana).
+    """
+    mascaras: Tuple[int, ...]
+
+    @classmethod
+    def compilar(cls, horarios: Optional[List[dict]]) -> Optional["HorarioSemanal"]:
+        """Máscaras de una lista de bloques; None si la sala no restringe horario"""
+        if not horarios:
+            return None
+        mascaras = [0] * 7
+        try:
+            for bloque in horarios:
+                dias = bloque.get("dias", [bloque["dia"]] if "dia" in bloque else range(7))
+                bits = cls.mascara_intervalo(time.fromisoformat(bloque["inicio"]), time.fromisoformat(bloque["fin"]))
+                for dia in dias:
+                    mascaras[int(dia)] |= bits
+        except (AttributeError, IndexError, KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Horario de la sala inválido: {e}")
+        return cls(tuple(mascaras))
+
+    @staticmethod
+    def mascara_intervalo(hora_inicio: time, hora_fin: time) -> int:
+        """Bits de las franjas que toca el intervalo [hora_inicio, hora_fin)"""
+        inicio = (hora_inicio.hour * 60 + hora_inicio.minute) // MINUTOS_FRANJA_HORARIO
+        fin = -(-(hora_fin.hour * 60 + hora_fin.minute) // MINUTOS_FRANJA_HORARIO)
+        return ((1 << max(fin - inicio, 0)) - 1) << inicio
+
+    def admite(self, fecha: date, hora_inicio: time, hora_fin: time) -> bool:
+        """Indica si la sala está abierta durante todo el intervalo"""
+        requerida = self.mascara_intervalo(hora_inicio, hora_fin)
+        return self.mascaras[fecha.weekday()] & requerida == requerida
+
+    def cerrados(self, dia_semana: int, desde: int, hasta: int) -> List[Tuple[int, int]]:
+        """Intervalos cerrados (en minutos) de un día dentro de [desde, hasta)"""
+        mascara = self.mascaras[dia_semana]
+        intervalos = []
+        franja, ultima = desde // MINUTOS_FRANJA_HORARIO, -(-hasta // MINUTOS_FRANJA_HORARIO)
+        while franja < ultima:
+            if mascara >> franja & 1:
+                franja += 1
+                continue
+            inicio = franja
+            while franja < ultima and not mascara >> franja & 1:
+                franja += 1
+            intervalos.append((inicio * MINUTOS_FRANJA_HORARIO, franja * MINUTOS_FRANJA_HORARIO))
+        return intervalos
+
+
 @dataclass
 class Sala:
     """Entidad Sala - RF1, RF2, RF9"""
@@ -70,10 +137,15 @@ class Sala:
     descripcion: Optional[str] = None
     horarios_disponibles: Optional[List[dict]] = None
     creado_en: Optional[datetime] = None
+    sede: Optional[str] = None
+    horario: Optional[HorarioSemanal] = field(default=None, repr=False, compare=False)
 
     def __post_init__(self):
+        # SalaRepository entrega la lista y el horario ya compilados desde su caché
         if self.horarios_disponibles and isinstance(self.horarios_disponibles, str):
             self.horarios_disponibles = json.loads(self.horarios_disponibles)
+        if self.horario is None:
+            self.horario = HorarioSemanal.compilar(self.horarios_disponibles)
 
     def validar(self) -> List[str]:
         errores = []
@@ -84,8 +156,16 @@ class Sala:
         return errores
 
     def puede_ser_reservada(self) -> bool:
-        """Verifica condiciones básicas para reserva - RF8"""
-        return self.estado == EstadoSala.DISPONIBLE
+        """Verifica condiciones básicas para reserva - RF8
+
+        RESERVADA solo indica que la sala tiene reservas activas; los
+        cruces de horario se validan contra las reservas existentes.
+        """
+        return self.estado != EstadoSala.MANTENIMIENTO
+
+    def admite(self, fecha: date, hora_inicio: time, hora_fin: time) -> bool:
+        """Verifica que el intervalo cae dentro del horario de apertura de la sala"""
+        return self.horario is None or self.horario.admite(fecha, hora_inicio, hora_fin)
 
 
 @dataclass
@@ -100,6 +180,8 @@ class Reserva:
     estado: EstadoReserva = EstadoReserva.ACTIVA
     creado_en: Optional[datetime] = None
     actualizado_en: Optional[datetime] = None
+    version: int = 1  # Control de concurrencia optimista
+    serie_id: Optional[int] = None
 
     # Objetos relacionados (no persistidos)
     estudiante: Optional[Estudiante] = None
@@ -120,3 +202,131 @@ class Reserva:
         """Comportamiento de cancelación - RF7"""
         self.estado = EstadoReserva.CANCELADA
         self.actualizado_en = datetime.now()
+
+
+@dataclass
+class SerieReserva:
+    """Reserva recurrente: mismas sala y horario cada N semanas"""
+    id: Optional[int]
+    estudiante_id: int
+    sala_id: int
+    fecha_inicio: date
+    fecha_fin: date
+    hora_inicio: time
+    hora_fin: time
+    dias_semana: List[int] = field(default_factory=list)  # 0 = lunes; vacío = día de fecha_inicio
+    intervalo_semanas: int = 1
+    excepciones: List[date] = field(default_factory=list)
+    estado: EstadoReserva = EstadoReserva.ACTIVA
+    creado_en: Optional[datetime] = None
+
+    MAX_OCURRENCIAS = 200
+
+    def validar(self) -> List[str]:
+        errores = Horario(self.hora_inicio, self.hora_fin).validar()
+        if self.fecha_fin < self.fecha_inicio:
+            errores.append("La fecha final de la serie debe ser posterior a la inicial")
+        if self.intervalo_semanas < 1:
+            errores.append("El intervalo debe ser de al menos una semana")
+        if any(dia not in range(7) for dia in self.dias_semana):
+            errores.append("Los días de la semana van de 0 (lunes) a 6 (domingo)")
+        if errores:
+            return errores
+
+        # Cada semana activa aporta al menos una ocurrencia: un rango más largo
+        # excede el máximo sin necesidad de expandirlo
+        if (self.fecha_fin - self.fecha_inicio).days >= 7 * self.MAX_OCURRENCIAS * self.intervalo_semanas \
+                or len(self.fechas()) > self.MAX_OCURRENCIAS:
+            errores.append(f"La serie no puede tener más de {self.MAX_OCURRENCIAS} ocurrencias")
+        return errores
+
+    def fechas(self) -> List[date]:
+        """Fechas de las ocurrencias según la regla, sin las excepciones"""
+        dias = sorted(set(self.dias_semana or [self.fecha_inicio.weekday()]))
+        excluidas = set(self.excepciones)
+        lunes = self.fecha_inicio - timedelta(days=self.fecha_inicio.weekday())
+        fechas = []
+        # Solo se recorren las semanas activas
+        while True:
+            for dia in dias:
+                fecha = lunes + timedelta(days=dia)
+                if self.fecha_inicio <= fecha <= self.fecha_fin and fecha not in excluidas:
+                    fechas.append(fecha)
+            if (self.fecha_fin - lunes).days < 7 * self.intervalo_semanas:
+                return fechas
+            lunes += timedelta(weeks=self.intervalo_semanas)
+
+
+@dataclass
+class EsperaReserva:
+    """Solicitud en lista de espera para un horario ocupado"""
+    id: Optional[int]
+    estudiante_id: int
+    sala_id: int
+    fecha: date
+    hora_inicio: time
+    hora_fin: time
+    prioridad: int = 0  # Mayor prioridad se atiende primero; a igual prioridad, por orden de llegada
+    estado: EstadoEspera = EstadoEspera.ESPERANDO
+    reserva_id: Optional[int] = None
+    creado_en: Optional[datetime] = None
+
+
+@dataclass
+class EventoReserva:
+    """Cambio de una reserva registrado en la bandeja de salida `eventos_reserva`"""
+    id: int
+    tipo: str  # creada, modificada, cancelada, completada
+    reserva_id: int
+    estudiante_id: int
+    sala_id: int
+    fecha_reserva: date
+    hora_inicio: time
+    hora_fin: time
+    estado: EstadoReserva
+    version: int
+    creado_en: Optional[datetime] = None
+
+
+@dataclass
+class CambioDisponibilidad:
+    """Aviso de que cambió la ocupación de una sala en un día"""
+    sala_id: int
+    fecha: date
+    tipo: str  # creada, modificada, cancelada
+    reserva_id: int  # en los avisos de una serie, el ID de la serie
+    hora_inicio: time  # franja afectada en ese día
+    hora_fin: time
+
+
+@dataclass
+class UsoCuota:
+    """Contadores de cuota de un estudiante leídos antes de reservar"""
+    estudiante_id: int
+    reservas_activas: int = 0  # reservas sueltas activas (sin contar series)
+    minutos_por_semana: Dict[date, int] = field(default_factory=dict)  # lunes de la semana → minutos
+
+    def minutos_semana(self, fecha: date) -> int:
+        return self.minutos_por_semana.get(fecha - timedelta(days=fecha.weekday()), 0)
+
+
+@dataclass
+class OcupacionDiaria:
+    """Resumen precalculado de uso de una sala en un día"""
+    sala_id: int
+    fecha: date
+    minutos_reservados: int = 0
+    reservas_activas: int = 0
+    mascara_franjas: int = 0  # bit i = franja de 30 min que empieza a las 8:00 + 30*i
+
+    def franjas_ocupadas(self) -> List[time]:
+        """Horas de inicio de las franjas de 30 minutos ocupadas"""
+        franjas = []
+        mascara, indice = self.mascara_franjas, 0
+        while mascara:
+            if mascara & 1:
+                minutos = 8 * 60 + 30 * indice
+                franjas.append(time(minutos // 60, minutos % 60))
+            mascara >>= 1
+            indice += 1
+        return franjas
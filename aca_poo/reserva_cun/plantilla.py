@@ -0,0 +1,181 @@
+import argparse
+import contextlib
+import itertools
+import os
+import sqlite3
+import sys
+import tempfile
+import time as reloj
+from typing import Callable, Iterator, Optional
+
+from database import DatabaseManager, es_memoria
+
+_CONTADOR_COMPARTIDAS = itertools.count(1)
+
+
+class PlantillaBase:
+    """Base de datos modelo que se construye una vez y se clona por prueba.
+
+    Construir un DatabaseManager ejecuta todo el DDL del esquema (tablas,
+    triggers, FTS) y carga los datos iniciales en disco. La plantilla lo
+    hace una sola vez (más lo que agregue `poblar`), guarda el resultado
+    en una conexión en memoria y entrega copias independientes con la API
+    de respaldo de SQLite, que solo copia páginas: cada clon en memoria
+    tarda milisegundos y abre su DatabaseManager con `inicializar=False`.
+
+    Si se indica `ruta`, la plantilla también se guarda en ese archivo y
+    las siguientes ejecuciones la reutilizan (borre el archivo o llame a
+    `reconstruir` tras cambiar el esquema o `poblar`).
+    """
+
+    def __init__(self, poblar: Optional[Callable[[DatabaseManager], None]] = None, ruta: Optional[str] = None):
+        self.poblar = poblar
+        self.ruta = ruta
+        self._fuente: Optional[sqlite3.Connection] = None
+
+    def _conexion_fuente(self) -> sqlite3.Connection:
+        if self._fuente is None:
+            if self.ruta is None or not os.path.exists(self.ruta):
+                self.reconstruir()
+            else:
+                self._cargar(self.ruta)
+        return self._fuente
+
+    def reconstruir(self):
+        """Crea la plantilla desde cero: esquema, datos iniciales y `poblar`"""
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, "plantilla.db")
+            with contextlib.redirect_stdout(sys.stderr):
+                db = DatabaseManager(ruta, lectores=0, perfil="carga-masiva")
+            try:
+                if self.poblar:
+                    self.poblar(db)
+                db.execute_query("ANALYZE")
+                # Checkpoint para que el archivo quede completo sin su -wal
+                db.execute_query("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                db.cerrar()
+            self._cargar(ruta)
+        if self.ruta:
+            destino = sqlite3.connect(self.ruta)
+            try:
+                self._fuente.backup(destino)
+            finally:
+                destino.close()
+
+    def _cargar(self, ruta: str):
+        origen = sqlite3.connect(ruta)
+        fuente = sqlite3.connect(":memory:", check_same_thread=False)
+        try:
+            origen.backup(fuente)
+        finally:
+            origen.close()
+        if self._fuente is not None:
+            self._fuente.close()
+        self._fuente = fuente
+
+    def clonar(self, destino: str = ":memory:", lectores: int = 4, perfil=None) -> DatabaseManager:
+        """Copia independiente de la plantilla
+
+        `destino` puede ser `:memory:`, una URI de memoria compartida
+        (`file:nombre?mode=memory&cache=shared`, visible para otras
+        conexiones del proceso mientras el DatabaseManager siga abierto) o
+        la ruta de un archivo, que se sobrescribe.
+        """
+        fuente = self._conexion_fuente()
+        if es_memoria(destino):
+            db = DatabaseManager(destino, lectores=0, perfil=perfil, inicializar=False)
+            with db._get_connection() as conn:
+                fuente.backup(conn)
+            return db
+
+        for sufijo in ("", "-wal", "-shm"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(destino + sufijo)
+        copia = sqlite3.connect(destino)
+        try:
+            fuente.backup(copia)
+        finally:
+            copia.close()
+        return DatabaseManager(destino, lectores=lectores, perfil=perfil, inicializar=False)
+
+    @contextlib.contextmanager
+    def base(self, en_archivo: bool = False, compartida: bool = False) -> Iterator[DatabaseManager]:
+        """Clon desechable: en memoria (por defecto), en memoria compartida o en un archivo temporal"""
+        if en_archivo:
+            with tempfile.TemporaryDirectory() as directorio:
+                db = self.clonar(os.path.join(directorio, "prueba.db"))
+                try:
+                    yield db
+                finally:
+                    db.cerrar()
+            return
+
+        destino = ":memory:"
+        if compartida:
+            destino = f"file:plantilla_{os.getpid()}_{next(_CONTADOR_COMPARTIDAS)}?mode=memory&cache=shared"
+        db = self.clonar(destino)
+        try:
+            yield db
+        finally:
+            db.cerrar()
+
+    def cerrar(self):
+        if self._fuente is not None:
+            self._fuente.close()
+            self._fuente = None
+
+
+def _medir(funcion: Callable[[], None], veces: int) -> float:
+    """Milisegundos promedio por llamada"""
+    inicio = reloj.perf_counter()
+    for _ in range(veces):
+        funcion()
+    return (reloj.perf_counter() - inicio) * 1000 / veces
+
+
+def main(argv=None):
+    """Compara crear una base por prueba contra clonarla de una plantilla"""
+    from consultas import cargar_datos_sinteticos
+
+    parser = argparse.ArgumentParser(description="Plantilla de base de datos para pruebas y benchmarks")
+    parser.add_argument("--veces", type=int, default=50, help="Bases creadas por método")
+    parser.add_argument("--estudiantes", type=int, default=0, help="Estudiantes sintéticos en la plantilla")
+    parser.add_argument("--reservas", type=int, default=0, help="Reservas sintéticas en la plantilla")
+    parser.add_argument("--ruta", help="Archivo donde guardar y reutilizar la plantilla")
+    args = parser.parse_args(argv)
+
+    poblar = None
+    if args.estudiantes or args.reservas:
+        def poblar(db):
+            cargar_datos_sinteticos(db, args.estudiantes, args.reservas)
+
+    plantilla = PlantillaBase(poblar, args.ruta)
+    inicio = reloj.perf_counter()
+    plantilla._conexion_fuente()
+    print(f"Plantilla lista en {(reloj.perf_counter() - inicio) * 1000:,.0f} ms\n")
+
+    def usar(base):
+        with base as db:
+            db.fetch_one("SELECT COUNT(*) FROM reservas")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        rutas = (os.path.join(directorio, f"nueva{i}.db") for i in itertools.count())
+
+        def nueva_en_disco():
+            with contextlib.redirect_stdout(open(os.devnull, "w")) as nulo, nulo:
+                db = DatabaseManager(next(rutas))
+            db.fetch_one("SELECT COUNT(*) FROM reservas")
+            db.cerrar()
+
+        print("| Método | ms por base |")
+        print("|--------|------------:|")
+        print(f"| DatabaseManager nuevo en disco | {_medir(nueva_en_disco, args.veces):,.2f} |")
+        print(f"| Clon en :memory: | {_medir(lambda: usar(plantilla.base()), args.veces):,.2f} |")
+        print(f"| Clon en memoria compartida | {_medir(lambda: usar(plantilla.base(compartida=True)), args.veces):,.2f} |")
+        print(f"| Clon en archivo temporal | {_medir(lambda: usar(plantilla.base(en_archivo=True)), args.veces):,.2f} |")
+    plantilla.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,137 @@
+import itertools
 import json
+import sqlite3
 from datetime import datetime, date, time
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
+from archivo import ALIAS_ARCHIVO, VISTA_HISTORICA
+from consultas import CONSULTAS
+from database import sql_reconstruir_cuotas, sql_reconstruir_ocupacion
 from models import (
     Sala,
     Reserva,
     Estudiante,
     EstadoSala,
     EstadoReserva,
+    EstadoEspera,
+    EsperaReserva,
+    HorarioSemanal,
+    OcupacionDiaria,
+    SerieReserva,
+    UsoCuota,
 )
 
 
+class ConflictoConcurrencia(ValueError):
+    """La fila cambió desde que se leyó (control de concurrencia optimista)."""
+
+
+class ConflictoSerie(ValueError):
+    """Algunas ocurrencias de una serie chocan con reservas existentes."""
+
+    def __init__(self, conflictos: Dict[date, str]):
+        fechas = ", ".join(fecha.isoformat() for fecha in sorted(conflictos))
+        super().__init__(f"{len(conflictos)} ocurrencias de la serie no están disponibles: {fechas}")
+        self.conflictos = conflictos
+
+
+class Flujo:
+    """Resultados perezosos de un repositorio, encadenables.
+
+    `filtrar`, `mapear`, `tomar` y `lotes` devuelven otro Flujo sin leer
+    nada: las filas se traen de la base a medida que se consumen, así que
+    un recorrido completo usa memoria constante. Si se abandona antes de
+    agotarlo, `cerrar` (o usarlo con `with`) devuelve la conexión lectora.
+    """
+
+    def __init__(self, iterable: Iterable, origen: Optional[Iterator] = None):
+        self._iterable = iterable
+        self._origen = origen if origen is not None else iterable
+
+    def __iter__(self) -> Iterator:
+        return iter(self._iterable)
+
+    def __enter__(self) -> "Flujo":
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def _seguir(self, iterable: Iterable) -> "Flujo":
+        return Flujo(iterable, self._origen)
+
+    def filtrar(self, predicado: Callable) -> "Flujo":
+        return self._seguir(filter(predicado, self._iterable))
+
+    def mapear(self, funcion: Callable) -> "Flujo":
+        return self._seguir(map(funcion, self._iterable))
+
+    def tomar(self, cantidad: int) -> "Flujo":
+        return self._seguir(itertools.islice(self._iterable, cantidad))
+
+    def lotes(self, tamano: int) -> "Flujo":
+        """Agrupa los elementos en listas de hasta `tamano`"""
+        iterador = iter(self._iterable)
+        return self._seguir(iter(lambda: list(itertools.islice(iterador, tamano)), []))
+
+    def contar(self) -> int:
+        return sum(1 for _ in self._iterable)
+
+    def cerrar(self):
+        cerrar = getattr(self._origen, "close", None)
+        if cerrar:
+            cerrar()
+
+
 class BaseRepository:
     """Clase base para todos los repositorios."""
 
     def __init__(self, db_manager):
         self.db = db_manager
 
+    def _iterar(self, query: str, params: tuple, convertir: Callable, tamano_lote: int) -> Flujo:
+        """Flujo de modelos hidratados fila a fila desde `db.iterar`"""
+        return Flujo(convertir(row) for row in self.db.iterar(query, params, tamano_lote))
+
+    def _buscar_texto(self, tabla: str, texto: str, limite: int) -> list:
+        """Filas de `tabla` cuyo texto contiene todos los términos como prefijo
+
+        Usa el índice FTS5 `<tabla>_fts` ordenado por bm25 (pesos por
+        columna en el catálogo); si la base no tiene FTS5, recurre a LIKE
+        sobre la tabla original ordenado por nombre.
+        """
+        terminos = texto.split()
+        if not terminos or limite <= 0:
+            return []
+
+        consulta = " ".join('"' + termino.replace('"', '""') + '"*' for termino in terminos)
+        try:
+            return self.db.fetch_all(CONSULTAS[f"{tabla}.buscar"], (consulta, limite))
+        except sqlite3.OperationalError:
+            pass
+
+        patrones = [
+            "%" + termino.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            for termino in terminos
+        ]
+        return self.db.fetch_all(CONSULTAS[f"{tabla}.buscar_like"], (json.dumps(patrones), limite))
+
 
 class SalaRepository(BaseRepository):
     """Maneja operaciones CRUD para salas."""
 
+    def __init__(self, db_manager):
+        super().__init__(db_manager)
+        # sala_id -> (JSON de horarios, lista, HorarioSemanal); se recompila si el JSON cambia
+        self._horarios: Dict[int, Tuple[Optional[str], Optional[List[dict]], Optional[HorarioSemanal]]] = {}
+
+    def _horario_compilado(self, sala_id: int, texto: Optional[str]):
+        entrada = self._horarios.get(sala_id)
+        if entrada is None or entrada[0] != texto:
+            horarios = json.loads(texto) if texto else None
+            entrada = self._horarios[sala_id] = (texto, horarios, HorarioSemanal.compilar(horarios))
+        return entrada[1], entrada[2]
+
     def crear(self, sala: Sala) -> int:
         """Crea una nueva sala - RF1"""
         errores = sala.validar()
@@ -33,53 +144,49 @@ class SalaRepository(BaseRepository):
             else None
         )
 
-        query = """
-            INSERT INTO salas (nombre, capacidad, estado, descripcion, horarios_disponibles)
-            VALUES (?, ?, ?, ?, ?)
-        """
         cursor = self.db.execute_query(
-            query,
+            CONSULTAS["salas.insertar"],
             (
                 sala.nombre,
                 sala.capacidad,
                 sala.estado.value,
                 sala.descripcion,
                 horarios_json,
+                sala.sede,
             ),
         )
         return cursor.lastrowid
 
     def obtener_por_id(self, sala_id: int) -> Optional[Sala]:
         """Obtiene una sala por su ID."""
-        query = "SELECT * FROM salas WHERE id = ?"
-        row = self.db.fetch_one(query, (sala_id,))
+        row = self.db.fetch_one(CONSULTAS["salas.por_id"], (sala_id,))
         return self._row_to_sala(row) if row else None
 
     def obtener_todas(self) -> List[Sala]:
         """Obtiene todas las salas - RF9."""
-        query = "SELECT * FROM salas ORDER BY nombre"
-        rows = self.db.fetch_all(query)
+        rows = self.db.fetch_all(CONSULTAS["salas.todas"])
+        return [self._row_to_sala(row) for row in rows]
+
+    def iterar_todas(self, tamano_lote: int = 500) -> Flujo:
+        """Como obtener_todas, pero perezoso: trae las salas de a `tamano_lote`"""
+        return self._iterar(CONSULTAS["salas.todas"], (), self._row_to_sala, tamano_lote)
+
+    def buscar(self, texto: str, limite: int = 20) -> List[Sala]:
+        """Salas por prefijos de nombre, descripción o sede, las más relevantes primero"""
+        rows = self._buscar_texto("salas", texto, limite)
         return [self._row_to_sala(row) for row in rows]
 
     def obtener_disponibles(self) -> List[Sala]:
         """Obtiene solo las salas disponibles."""
-        query = "SELECT * FROM salas WHERE estado = 'disponible' ORDER BY nombre"
-        rows = self.db.fetch_all(query)
+        rows = self.db.fetch_all(CONSULTAS["salas.disponibles"])
         return [self._row_to_sala(row) for row in rows]
 
     def actualizar_estado(self, sala_id: int, estado: EstadoSala) -> None:
         """Actualiza el estado de una sala."""
-        query = "UPDATE salas SET estado = ? WHERE id = ?"
-        self.db.execute_query(query, (estado.value, sala_id))
+        self.db.execute_query(CONSULTAS["salas.actualizar_estado"], (estado.value, sala_id))
 
     def actualizar(self, sala: Sala) -> bool:
         """Actualiza una sala existente."""
-        query = """
-            UPDATE salas 
-            SET nombre = ?, capacidad = ?, estado = ?, descripcion = ?, 
-                horarios_disponibles = ?
-            WHERE id = ?
-        """
         horarios_json = (
             json.dumps(sala.horarios_disponibles)
             if sala.horarios_disponibles
@@ -88,13 +195,14 @@ class SalaRepository(BaseRepository):
 
         try:
             self.db.execute_query(
-                query,
+                CONSULTAS["salas.actualizar"],
                 (
                     sala.nombre,
                     sala.capacidad,
                     sala.estado.value,
                     sala.descripcion,
                     horarios_json,
+                    sala.sede,
                     sala.id,
                 ),
             )
@@ -104,27 +212,29 @@ class SalaRepository(BaseRepository):
 
     def eliminar(self, sala_id: int) -> bool:
         """Elimina una sala por ID."""
-        query = "DELETE FROM salas WHERE id = ?"
         try:
-            self.db.execute_query(query, (sala_id,))
+            self.db.execute_query(CONSULTAS["salas.eliminar"], (sala_id,))
             return True
         except Exception:
             return False
 
     def _row_to_sala(self, row) -> Sala:
         """Convierte una fila de la DB a objeto Sala."""
+        horarios, horario = self._horario_compilado(row["id"], row["horarios_disponibles"])
         return Sala(
             id=row["id"],
             nombre=row["nombre"],
             capacidad=row["capacidad"],
             estado=EstadoSala(row["estado"]),
             descripcion=row["descripcion"],
-            horarios_disponibles=row["horarios_disponibles"],
+            horarios_disponibles=horarios,
+            horario=horario,
             creado_en=(
                 datetime.fromisoformat(row["creado_en"])
                 if row["creado_en"]
                 else None
             ),
+            sede=row["sede"],
         )
 
 
@@ -145,13 +255,8 @@ class ReservaRepository(BaseRepository):
         ):
             raise ValueError("Ya existe una reserva para esta sala en el mismo horario")
 
-        query = """
-            INSERT INTO reservas 
-            (estudiante_id, sala_id, fecha_reserva, hora_inicio, hora_fin, estado)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """
         cursor = self.db.execute_query(
-            query,
+            CONSULTAS["reservas.insertar"],
             (
                 reserva.estudiante_id,
                 reserva.sala_id,
@@ -172,85 +277,328 @@ class ReservaRepository(BaseRepository):
             excluir_reserva_id: Optional[int] = None,
     ) -> bool:
         """Verifica solapamiento de horarios - RF8"""
-        query = """
-            SELECT COUNT(*) as count FROM reservas 
-            WHERE sala_id = ? 
-              AND fecha_reserva = ? 
-              AND estado = 'activa'
-              AND hora_inicio < ? 
-              AND hora_fin > ?
-        """
-        params = [
-            sala_id,
-            fecha.isoformat(),
-            hora_fin.isoformat(),
-            hora_inicio.isoformat(),
-        ]
-
-        if excluir_reserva_id:
-            query += " AND id != ?"
-            params.append(excluir_reserva_id)
-
-        row = self.db.fetch_one(query, tuple(params))
+        excluir = excluir_reserva_id or None
+        row = self.db.fetch_one(
+            CONSULTAS["reservas.conflicto"],
+            (sala_id, fecha.isoformat(), hora_fin.isoformat(), hora_inicio.isoformat(), excluir, excluir),
+        )
         return row["count"] > 0 if row else False
 
     def obtener_por_id(self, reserva_id: int) -> Optional[Reserva]:
         """Obtiene una reserva por su ID."""
-        query = "SELECT * FROM reservas WHERE id = ?"
-        row = self.db.fetch_one(query, (reserva_id,))
+        row = self.db.fetch_one(CONSULTAS["reservas.por_id"], (reserva_id,))
         return self._row_to_reserva(row) if row else None
 
-    def obtener_por_sala(self, sala_id: int) -> List[Reserva]:
+    def _tabla_reservas(self, incluir_archivo: bool) -> str:
+        """Tabla a consultar: solo reservas o también el historial archivado."""
+        if incluir_archivo and ALIAS_ARCHIVO in self.db.adjuntos:
+            return VISTA_HISTORICA
+        return "reservas"
+
+    def _consulta_reservas(self, nombre: str, incluir_archivo: bool) -> str:
+        """Variante de catálogo sobre `reservas` o sobre el historial archivado."""
+        if self._tabla_reservas(incluir_archivo) == VISTA_HISTORICA:
+            return CONSULTAS[f"{nombre}_historial"]
+        return CONSULTAS[nombre]
+
+    def obtener_por_sala(self, sala_id: int, incluir_archivo: bool = False) -> List[Reserva]:
         """Obtiene todas las reservas de una sala - RF4"""
-        query = """
-            SELECT r.*, e.nombre as estudiante_nombre, s.nombre as sala_nombre
-            FROM reservas r
-            JOIN estudiantes e ON r.estudiante_id = e.id
-            JOIN salas s ON r.sala_id = s.id
-            WHERE r.sala_id = ?
-            ORDER BY r.fecha_reserva, r.hora_inicio
-        """
-        rows = self.db.fetch_all(query, (sala_id,))
+        rows = self.db.fetch_all(self._consulta_reservas("reservas.por_sala", incluir_archivo), (sala_id,))
         return [self._row_to_reserva(row) for row in rows]
 
-    def obtener_por_estudiante(self, estudiante_id: int) -> List[Reserva]:
+    def obtener_por_estudiante(self, estudiante_id: int, incluir_archivo: bool = False) -> List[Reserva]:
         """Obtiene todas las reservas de un estudiante - RF5"""
-        query = """
-            SELECT r.*, e.nombre as estudiante_nombre, s.nombre as sala_nombre
-            FROM reservas r
-            JOIN estudiantes e ON r.estudiante_id = e.id
-            JOIN salas s ON r.sala_id = s.id
-            WHERE r.estudiante_id = ?
-            ORDER BY r.fecha_reserva DESC, r.hora_inicio DESC
-        """
-        rows = self.db.fetch_all(query, (estudiante_id,))
+        rows = self.db.fetch_all(
+            self._consulta_reservas("reservas.por_estudiante", incluir_archivo), (estudiante_id,)
+        )
         return [self._row_to_reserva(row) for row in rows]
 
+    def obtener_todas(self) -> List[Reserva]:
+        """Obtiene todas las reservas ordenadas por fecha y hora."""
+        rows = self.db.fetch_all(CONSULTAS["reservas.todas"])
+        return [self._row_to_reserva(row) for row in rows]
+
+    # ========== RECORRIDOS PEREZOSOS ==========
+
+    def iterar_por_sala(self, sala_id: int, incluir_archivo: bool = False, tamano_lote: int = 500) -> Flujo:
+        """Como obtener_por_sala, con memoria acotada a un lote"""
+        return self._iterar(
+            self._consulta_reservas("reservas.por_sala", incluir_archivo), (sala_id,),
+            self._row_to_reserva, tamano_lote,
+        )
+
+    def iterar_por_estudiante(self, estudiante_id: int, incluir_archivo: bool = False,
+                              tamano_lote: int = 500) -> Flujo:
+        """Como obtener_por_estudiante, con memoria acotada a un lote"""
+        return self._iterar(
+            self._consulta_reservas("reservas.por_estudiante", incluir_archivo), (estudiante_id,),
+            self._row_to_reserva, tamano_lote,
+        )
+
+    def iterar_todas(self, tamano_lote: int = 500) -> Flujo:
+        """Como obtener_todas, con memoria acotada a un lote"""
+        return self._iterar(CONSULTAS["reservas.todas"], (), self._row_to_reserva, tamano_lote)
+
     def obtener_activas_por_sala_y_fecha(
             self, sala_id: int, fecha: date
     ) -> List[Reserva]:
         """Obtiene reservas activas por sala y fecha."""
-        query = """
-            SELECT * FROM reservas 
-            WHERE sala_id = ? 
-              AND fecha_reserva = ? 
-              AND estado = 'activa'
-            ORDER BY hora_inicio
-        """
-        rows = self.db.fetch_all(query, (sala_id, fecha.isoformat()))
+        rows = self.db.fetch_all(CONSULTAS["reservas.activas_sala_fecha"], (sala_id, fecha.isoformat()))
         return [self._row_to_reserva(row) for row in rows]
 
+    def obtener_ocupados_en_rango(self, desde: date, hasta: date) -> List[tuple]:
+        """Intervalos (sala_id, fecha, hora_inicio, hora_fin) de las reservas activas entre dos fechas"""
+        rows = self.db.fetch_all(CONSULTAS["reservas.ocupadas_rango"], (desde.isoformat(), hasta.isoformat()))
+        return [
+            (
+                row["sala_id"],
+                date.fromisoformat(row["fecha_reserva"]),
+                time.fromisoformat(row["hora_inicio"]),
+                time.fromisoformat(row["hora_fin"]),
+            )
+            for row in rows
+        ]
+
+    def contar_activas_por_sala(self, desde: date) -> Dict[int, int]:
+        """Reservas activas desde una fecha por sala, según los contadores de ocupacion_diaria"""
+        rows = self.db.fetch_all(CONSULTAS["ocupacion.activas_por_sala"], (desde.isoformat(),))
+        return {row["sala_id"]: row["activas"] for row in rows}
+
+    def tiene_activas(self, sala_id: int) -> bool:
+        """Indica si la sala tiene al menos una reserva activa."""
+        return self.db.fetch_one(CONSULTAS["reservas.tiene_activas"], (sala_id,)) is not None
+
+    def completar_vencidas(self, ahora: datetime, limite: int = 500) -> List[int]:
+        """Marca como completadas hasta `limite` reservas activas ya terminadas.
+
+        Retorna los IDs de sala afectados (con repetidos).
+        """
+        hoy = ahora.date().isoformat()
+        with self.db.sesion():
+            filas = self.db.fetch_all(
+                CONSULTAS["reservas.vencidas"], (hoy, hoy, ahora.time().isoformat(timespec="seconds"), limite)
+            )
+            if not filas:
+                return []
+
+            self.db.execute_query(
+                CONSULTAS["reservas.completar"], (json.dumps([fila["id"] for fila in filas]),)
+            )
+        return [fila["sala_id"] for fila in filas]
+
+    # ========== SERIES RECURRENTES ==========
+
+    def fechas_en_conflicto(self, estudiante_id: int, sala_id: int, fechas: List[date],
+                            hora_inicio: time, hora_fin: time) -> Dict[date, str]:
+        """Ocurrencias que chocan con reservas existentes, en una sola consulta
+
+        Returns: fecha → motivo del conflicto
+        """
+        if not fechas:
+            return {}
+        rows = self.db.fetch_all(
+            CONSULTAS["reservas.fechas_en_conflicto"],
+            (
+                sala_id,
+                json.dumps([fecha.isoformat() for fecha in fechas]),
+                hora_fin.isoformat(),
+                hora_inicio.isoformat(),
+                sala_id,
+                estudiante_id,
+            ),
+        )
+        return {
+            date.fromisoformat(row["fecha_reserva"]):
+                "Sala ocupada" if row["en_sala"] else "Ya tiene otra reserva en ese horario"
+            for row in rows
+        }
+
+    def crear_serie(self, serie: SerieReserva, omitir_conflictos: bool = False,
+                    conflictos_externos: Optional[Dict[date, str]] = None) -> Tuple[List[date], Dict[date, str]]:
+        """Guarda la serie y todas sus ocurrencias en una sola transacción
+
+        Si alguna ocurrencia choca, no se guarda nada (ConflictoSerie), salvo
+        que `omitir_conflictos` sea verdadero: entonces las fechas en conflicto
+        pasan a ser excepciones de la serie.
+
+        Returns: (fechas creadas, conflictos omitidos)
+        """
+        with self.db.sesion():
+            fechas = serie.fechas()
+            conflictos = dict(conflictos_externos or {})
+            conflictos.update(self.fechas_en_conflicto(
+                serie.estudiante_id, serie.sala_id, fechas, serie.hora_inicio, serie.hora_fin
+            ))
+            if conflictos and not omitir_conflictos:
+                raise ConflictoSerie(conflictos)
+
+            creadas = [fecha for fecha in fechas if fecha not in conflictos]
+            if not creadas:
+                raise ValueError("Ninguna ocurrencia de la serie está disponible")
+            serie.excepciones = sorted(set(serie.excepciones) | set(conflictos))
+
+            cursor = self.db.execute_query(
+                CONSULTAS["series.insertar"],
+                (
+                    serie.estudiante_id,
+                    serie.sala_id,
+                    serie.fecha_inicio.isoformat(),
+                    serie.fecha_fin.isoformat(),
+                    serie.hora_inicio.isoformat(),
+                    serie.hora_fin.isoformat(),
+                    json.dumps(serie.dias_semana),
+                    serie.intervalo_semanas,
+                    json.dumps([fecha.isoformat() for fecha in serie.excepciones]),
+                    serie.estado.value,
+                ),
+            )
+            serie.id = cursor.lastrowid
+
+            for fecha in creadas:
+                self.db.execute_query(
+                    CONSULTAS["series.insertar_ocurrencia"],
+                    (
+                        serie.estudiante_id,
+                        serie.sala_id,
+                        fecha.isoformat(),
+                        serie.hora_inicio.isoformat(),
+                        serie.hora_fin.isoformat(),
+                        serie.id,
+                    ),
+                )
+        return creadas, conflictos
+
+    def obtener_serie(self, serie_id: int) -> Optional[SerieReserva]:
+        row = self.db.fetch_one(CONSULTAS["series.por_id"], (serie_id,))
+        return self._row_to_serie(row) if row else None
+
+    def cancelar_serie(self, serie_id: int, desde: date) -> List[date]:
+        """Cancela con un solo UPDATE las ocurrencias activas desde una fecha
+
+        Returns: fechas de las ocurrencias canceladas
+        """
+        with self.db.sesion():
+            filas = self.db.fetch_all(CONSULTAS["series.ocurrencias_activas"], (serie_id, desde.isoformat()))
+            self.db.execute_query(CONSULTAS["series.cancelar_ocurrencias"], (serie_id, desde.isoformat()))
+            self.db.execute_query(CONSULTAS["series.cancelar"], (serie_id,))
+            return [date.fromisoformat(fila["fecha_reserva"]) for fila in filas]
+
+    def _row_to_serie(self, row) -> SerieReserva:
+        """Convierte fila a objeto SerieReserva."""
+        return SerieReserva(
+            id=row["id"],
+            estudiante_id=row["estudiante_id"],
+            sala_id=row["sala_id"],
+            fecha_inicio=date.fromisoformat(row["fecha_inicio"]),
+            fecha_fin=date.fromisoformat(row["fecha_fin"]),
+            hora_inicio=time.fromisoformat(row["hora_inicio"]),
+            hora_fin=time.fromisoformat(row["hora_fin"]),
+            dias_semana=json.loads(row["dias_semana"]),
+            intervalo_semanas=row["intervalo_semanas"],
+            excepciones=[date.fromisoformat(fecha) for fecha in json.loads(row["excepciones"])],
+            estado=EstadoReserva(row["estado"]),
+            creado_en=datetime.fromisoformat(row["creado_en"]) if row["creado_en"] else None,
+        )
+
+    # ========== CUOTAS ==========
+
+    def uso_cuota(self, estudiante_id: int, semanas: List[date]) -> UsoCuota:
+        """Contadores de cuota del estudiante para las semanas indicadas (lunes)"""
+        fila = self.db.fetch_one(CONSULTAS["cuotas.activas"], (estudiante_id,))
+        uso = UsoCuota(estudiante_id, fila["reservas_activas"] if fila else 0)
+        if semanas:
+            filas = self.db.fetch_all(
+                CONSULTAS["cuotas.semanas"],
+                (estudiante_id, json.dumps(sorted({semana.isoformat() for semana in semanas}))),
+            )
+            uso.minutos_por_semana = {date.fromisoformat(f["semana"]): f["minutos_reservados"] for f in filas}
+        return uso
+
+    def recontar_cuotas(self, estudiante_id: Optional[int] = None) -> int:
+        """Recalcula los contadores de cuotas desde reservas
+
+        Mantenimiento: su SQL se arma con los constructores de database.py,
+        no con el catálogo.
+
+        Returns: cantidad de filas (estudiante, semana) regeneradas
+        """
+        filtro, params = ("AND r.estudiante_id = ?", (estudiante_id,)) if estudiante_id else ("", ())
+        condicion = "WHERE estudiante_id = ?" if estudiante_id else ""
+        with self.db.sesion():
+            self.db.execute_query(f"DELETE FROM cuotas_estudiante {condicion}", params)
+            self.db.execute_query(f"DELETE FROM cuotas_semanales {condicion}", params)
+            activas, semanales = sql_reconstruir_cuotas(filtro)
+            self.db.execute_query(activas, params)
+            return self.db.execute_query(semanales, params).rowcount
+
+    # ========== LISTA DE ESPERA ==========
+
+    def transaccion(self, sala_id: int):
+        """Unidad de trabajo sobre la base donde viven las reservas de la sala"""
+        return self.db.sesion()
+
+    def agregar_espera(self, espera: EsperaReserva) -> int:
+        cursor = self.db.execute_query(
+            CONSULTAS["espera.insertar"],
+            (
+                espera.estudiante_id,
+                espera.sala_id,
+                espera.fecha.isoformat(),
+                espera.hora_inicio.isoformat(),
+                espera.hora_fin.isoformat(),
+                espera.prioridad,
+            ),
+        )
+        return cursor.lastrowid
+
+    def obtener_esperas(self, sala_id: int, fecha: date) -> List[EsperaReserva]:
+        """Solicitudes pendientes de una sala y fecha"""
+        rows = self.db.fetch_all(CONSULTAS["espera.pendientes"], (sala_id, fecha.isoformat()))
+        return [self._row_to_espera(row) for row in rows]
+
+    def obtener_espera(self, espera_id: int) -> Optional[EsperaReserva]:
+        row = self.db.fetch_one(CONSULTAS["espera.por_id"], (espera_id,))
+        return self._row_to_espera(row) if row else None
+
+    def obtener_esperas_por_estudiante(self, estudiante_id: int) -> List[EsperaReserva]:
+        rows = self.db.fetch_all(CONSULTAS["espera.por_estudiante"], (estudiante_id,))
+        return [self._row_to_espera(row) for row in rows]
+
+    def tomar_espera(self, espera_id: int) -> bool:
+        """Marca la solicitud como asignada si sigue pendiente"""
+        cursor = self.db.execute_query(CONSULTAS["espera.tomar"], (espera_id,))
+        return cursor.rowcount > 0
+
+    def vincular_espera(self, espera_id: int, reserva_id: int) -> None:
+        self.db.execute_query(CONSULTAS["espera.vincular"], (reserva_id, espera_id))
+
+    def retirar_espera(self, espera_id: int) -> bool:
+        cursor = self.db.execute_query(CONSULTAS["espera.retirar"], (espera_id,))
+        return cursor.rowcount > 0
+
+    def _row_to_espera(self, row) -> EsperaReserva:
+        """Convierte fila a objeto EsperaReserva."""
+        return EsperaReserva(
+            id=row["id"],
+            estudiante_id=row["estudiante_id"],
+            sala_id=row["sala_id"],
+            fecha=date.fromisoformat(row["fecha"]),
+            hora_inicio=time.fromisoformat(row["hora_inicio"]),
+            hora_fin=time.fromisoformat(row["hora_fin"]),
+            prioridad=row["prioridad"],
+            estado=EstadoEspera(row["estado"]),
+            reserva_id=row["reserva_id"],
+            creado_en=datetime.fromisoformat(row["creado_en"]) if row["creado_en"] else None,
+        )
+
     def actualizar(self, reserva: Reserva) -> None:
-        """Actualiza una reserva existente - RF6, RF7"""
-        query = """
-            UPDATE reservas 
-            SET estudiante_id = ?, sala_id = ?, fecha_reserva = ?, 
-                hora_inicio = ?, hora_fin = ?, estado = ?, 
-                actualizado_en = CURRENT_TIMESTAMP
-            WHERE id = ?
+        """Actualiza una reserva existente - RF6, RF7
+
+        Solo escribe si la fila conserva la versión leída (compare-and-swap);
+        en caso contrario lanza ConflictoConcurrencia.
         """
-        self.db.execute_query(
-            query,
+        cursor = self.db.execute_query(
+            CONSULTAS["reservas.actualizar"],
             (
                 reserva.estudiante_id,
                 reserva.sala_id,
@@ -259,29 +607,43 @@ class ReservaRepository(BaseRepository):
                 reserva.hora_fin.isoformat(),
                 reserva.estado.value,
                 reserva.id,
+                reserva.version,
             ),
         )
+        if cursor.rowcount == 0:
+            raise ConflictoConcurrencia("La reserva fue modificada por otra operación")
+        reserva.version += 1
+
+    def cancelar(self, reserva_id: int, version: Optional[int] = None) -> bool:
+        """Marca como cancelada una reserva activa - RF7
+
+        Si se indica `version`, solo cancela si la reserva no cambió desde
+        que se leyó.
+        """
+        cursor = self.db.execute_query(CONSULTAS["reservas.cancelar"], (reserva_id, version, version))
+        return cursor.rowcount > 0
 
     def _row_to_reserva(self, row) -> Reserva:
         """Convierte fila a objeto Reserva con relaciones."""
+        columnas = row.keys()
         estudiante_obj = (
             Estudiante(
                 id=row["estudiante_id"],
                 identificacion="",
-                nombre=row.get("estudiante_nombre", "N/A"),
+                nombre=row["estudiante_nombre"],
             )
-            if "estudiante_id" in row
+            if "estudiante_nombre" in columnas
             else None
         )
 
         sala_obj = (
             Sala(
                 id=row["sala_id"],
-                nombre=row.get("sala_nombre", "N/A"),
+                nombre=row["sala_nombre"],
                 capacidad=0,
                 estado=EstadoSala.DISPONIBLE,
             )
-            if "sala_id" in row
+            if "sala_nombre" in columnas
             else None
         )
 
@@ -303,6 +665,8 @@ class ReservaRepository(BaseRepository):
                 if row["actualizado_en"]
                 else None
             ),
+            version=row["version"],
+            serie_id=row["serie_id"] if "serie_id" in columnas else None,
             estudiante=estudiante_obj,
             sala=sala_obj,
         )
@@ -317,34 +681,36 @@ class EstudianteRepository(BaseRepository):
         if errores:
             raise ValueError(f"Errores de validación: {', '.join(errores)}")
 
-        query = """
-            INSERT INTO estudiantes (identificacion, nombre, email)
-            VALUES (?, ?, ?)
-        """
         cursor = self.db.execute_query(
-            query,
+            CONSULTAS["estudiantes.insertar"],
             (estudiante.identificacion, estudiante.nombre, estudiante.email),
         )
         return cursor.lastrowid
 
     def obtener_por_id(self, estudiante_id: int) -> Optional[Estudiante]:
         """Obtiene un estudiante por su ID."""
-        query = "SELECT * FROM estudiantes WHERE id = ?"
-        row = self.db.fetch_one(query, (estudiante_id,))
+        row = self.db.fetch_one(CONSULTAS["estudiantes.por_id"], (estudiante_id,))
         return self._row_to_estudiante(row) if row else None
 
     def obtener_por_identificacion(self, identificacion: str) -> Optional[Estudiante]:
         """Obtiene un estudiante por su identificación."""
-        query = "SELECT * FROM estudiantes WHERE identificacion = ?"
-        row = self.db.fetch_one(query, (identificacion,))
+        row = self.db.fetch_one(CONSULTAS["estudiantes.por_identificacion"], (identificacion,))
         return self._row_to_estudiante(row) if row else None
 
+    def buscar(self, texto: str, limite: int = 20) -> List[Estudiante]:
+        """Estudiantes por prefijos de nombre, email o identificación, los más relevantes primero"""
+        rows = self._buscar_texto("estudiantes", texto, limite)
+        return [self._row_to_estudiante(row) for row in rows]
+
     def obtener_todos(self) -> List[Estudiante]:
         """Obtiene todos los estudiantes."""
-        query = "SELECT * FROM estudiantes ORDER BY nombre"
-        rows = self.db.fetch_all(query)
+        rows = self.db.fetch_all(CONSULTAS["estudiantes.todos"])
         return [self._row_to_estudiante(row) for row in rows]
 
+    def iterar_todos(self, tamano_lote: int = 500) -> Flujo:
+        """Como obtener_todos, pero perezoso: trae los estudiantes de a `tamano_lote`"""
+        return self._iterar(CONSULTAS["estudiantes.todos"], (), self._row_to_estudiante, tamano_lote)
+
     def _row_to_estudiante(self, row) -> Estudiante:
         """Convierte fila a objeto Estudiante."""
         return Estudiante(
@@ -357,4 +723,61 @@ class EstudianteRepository(BaseRepository):
                 if row["creado_en"]
                 else None
             ),
-        )
\ No newline at end of file
+        )
+
+
+class OcupacionRepository(BaseRepository):
+    """Lectura de ocupacion_diaria (mantenida por triggers) y su reconstrucción."""
+
+    def obtener_por_sala(self, sala_id: int, desde: date, hasta: date) -> List[OcupacionDiaria]:
+        """Ocupación de una sala entre dos fechas (inclusive)"""
+        rows = self.db.fetch_all(CONSULTAS["ocupacion.por_sala"], (sala_id, desde.isoformat(), hasta.isoformat()))
+        return [self._row_to_ocupacion(row) for row in rows]
+
+    def obtener_por_rango(self, desde: date, hasta: date) -> List[OcupacionDiaria]:
+        """Ocupación de todas las salas entre dos fechas (inclusive)"""
+        rows = self.db.fetch_all(CONSULTAS["ocupacion.por_rango"], (desde.isoformat(), hasta.isoformat()))
+        return [self._row_to_ocupacion(row) for row in rows]
+
+    def franjas_pico(self, desde: date, hasta: date) -> Dict[time, int]:
+        """Cantidad de salas-día ocupadas por franja de 30 minutos"""
+        conteo: Dict[time, int] = {}
+        for ocupacion in self.obtener_por_rango(desde, hasta):
+            for franja in ocupacion.franjas_ocupadas():
+                conteo[franja] = conteo.get(franja, 0) + 1
+        return dict(sorted(conteo.items()))
+
+    def reconstruir(self, desde: Optional[date] = None, hasta: Optional[date] = None) -> int:
+        """Recalcula la tabla desde las reservas (incluye el archivo si está adjunto)
+
+        Como recontar_cuotas, arma su SQL fuera del catálogo.
+
+        Returns: cantidad de filas (sala, día) regeneradas
+        """
+        rango, params = "", []
+        if desde:
+            rango += " AND {columna} >= ?"
+            params.append(desde.isoformat())
+        if hasta:
+            rango += " AND {columna} <= ?"
+            params.append(hasta.isoformat())
+        tabla = VISTA_HISTORICA if ALIAS_ARCHIVO in self.db.adjuntos else "reservas"
+
+        with self.db.sesion():
+            self.db.execute_query(
+                "DELETE FROM ocupacion_diaria WHERE 1 = 1" + rango.format(columna="fecha"), tuple(params)
+            )
+            cursor = self.db.execute_query(
+                sql_reconstruir_ocupacion(tabla, rango.format(columna="r.fecha_reserva")), tuple(params)
+            )
+            return cursor.rowcount
+
+    def _row_to_ocupacion(self, row) -> OcupacionDiaria:
+        """Convierte fila a objeto OcupacionDiaria."""
+        return OcupacionDiaria(
+            sala_id=row["sala_id"],
+            fecha=date.fromisoformat(row["fecha"]),
+            minutos_reservados=row["minutos_reservados"],
+            reservas_activas=row["reservas_activas"],
+            mascara_franjas=row["mascara_franjas"],
+        )
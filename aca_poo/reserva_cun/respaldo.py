@@ -0,0 +1,301 @@
+import argparse
+import glob
+import os
+import sqlite3
+import threading
+import time as reloj
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from database import es_memoria
+
+
+class RespaldoFragmentado(ValueError):
+    """Las reservas viven en fragmentos por sede que este respaldo no incluye."""
+
+
+@dataclass
+class EstadisticasRespaldo:
+    """Resultado de copiar una base con la API de respaldo de SQLite"""
+    origen: str
+    destino: str
+    paginas: int = 0
+    tamano_pagina: int = 0
+    pasos: int = 0
+    reinicios: int = 0  # veces que la copia volvió a empezar porque cambió el origen
+    segundos: float = 0.0
+    pausa_max_ms: float = 0.0  # paso más largo: lo que más tiempo se retuvo el origen
+    pausa_total_ms: float = 0.0
+
+    @property
+    def bytes(self) -> int:
+        return self.paginas * self.tamano_pagina
+
+    @property
+    def mb_por_segundo(self) -> float:
+        return self.bytes / 1_048_576 / self.segundos if self.segundos else 0.0
+
+    def resumen(self) -> str:
+        return (
+            f"{self.bytes / 1_048_576:.1f} MB en {self.segundos:.2f} s ({self.mb_por_segundo:.1f} MB/s), "
+            f"{self.pasos} pasos, paso máximo {self.pausa_max_ms:.1f} ms, "
+            f"total bajo lectura {self.pausa_total_ms:.0f} ms, {self.reinicios} reinicios"
+        )
+
+
+@dataclass
+class VerificacionRespaldo:
+    """Resultado de revisar un archivo de respaldo"""
+    ruta: str
+    integridad: List[str]
+    filas: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def valido(self) -> bool:
+        return self.integridad == ["ok"]
+
+
+class RespaldoEnLinea:
+    """Copias consistentes de la base en uso con `sqlite3.Connection.backup`.
+
+    Copiar el archivo a mano mientras la aplicación escribe puede dejar un
+    respaldo corrupto (y en WAL, sin los cambios que aún viven en el -wal).
+    Aquí la copia se hace por pasos de `paginas_por_paso` páginas sobre una
+    conexión de solo lectura que mantiene abierta una transacción de
+    lectura: en WAL eso fija una instantánea, así que la copia es
+    consistente, no se reinicia por las escrituras concurrentes y no
+    bloquea a la conexión escritora. Entre pasos se cede `pausa_ms` para
+    acotar la E/S que compite con las reservas.
+
+    Mientras dura la copia el checkpoint no puede avanzar más allá de la
+    instantánea y el -wal crece; con bases grandes conviene no bajar
+    demasiado el ritmo.
+    """
+
+    TABLAS_VERIFICADAS = ('estudiantes', 'salas', 'reservas', 'series_reserva', 'lista_espera', 'eventos_reserva')
+
+    def __init__(self, db_path: str, paginas_por_paso: int = 256, pausa_ms: float = 5.0):
+        if es_memoria(db_path):
+            raise ValueError("No se puede respaldar una base en memoria por ruta")
+        self.db_path = db_path
+        self.paginas_por_paso = paginas_por_paso
+        self.pausa_ms = pausa_ms
+
+    def respaldar(self, destino: str) -> EstadisticasRespaldo:
+        """Copia la base a `destino`; el archivo final solo aparece si la copia terminó"""
+        parcial = f"{destino}.parcial"
+        if os.path.exists(parcial):
+            os.remove(parcial)
+
+        origen = sqlite3.connect(f"{Path(self.db_path).resolve().as_uri()}?mode=ro", uri=True)
+        if self._fragmentada(origen):
+            origen.close()
+            raise RespaldoFragmentado(
+                "Las reservas están fragmentadas por sede; el respaldo en línea solo copiaría el catálogo"
+            )
+        copia = sqlite3.connect(parcial)
+        try:
+            # Transacción de lectura abierta: en WAL fija la instantánea durante todos los pasos
+            origen.execute("BEGIN")
+            origen.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            estadisticas = self._copiar(origen, copia, self.db_path, destino)
+            origen.rollback()
+            copia.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            copia.close()
+            origen.close()
+
+        os.replace(parcial, destino)
+        return estadisticas
+
+    @staticmethod
+    def _fragmentada(conn: sqlite3.Connection) -> bool:
+        """Indica si la base es el catálogo de un EnrutadorFragmentos ya en uso"""
+        tabla = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'fragmentos'").fetchone()
+        return bool(tabla and conn.execute("SELECT 1 FROM fragmentos LIMIT 1").fetchone())
+
+    def restaurar(self, respaldo: str, destino: Optional[str] = None) -> EstadisticasRespaldo:
+        """Vuelca un respaldo verificado sobre la base (con la aplicación detenida)
+
+        Se usa la API de respaldo en lugar de copiar el archivo para que el
+        -wal de la base destino quede coherente con el contenido restaurado.
+        """
+        destino = destino or self.db_path
+        verificacion = self.verificar(respaldo)
+        if not verificacion.valido:
+            raise ValueError(f"El respaldo no pasó la verificación: {'; '.join(verificacion.integridad[:5])}")
+
+        origen = sqlite3.connect(f"{Path(respaldo).resolve().as_uri()}?mode=ro", uri=True)
+        base = sqlite3.connect(destino)
+        try:
+            return self._copiar(origen, base, respaldo, destino)
+        finally:
+            base.close()
+            origen.close()
+
+    def verificar(self, ruta: str) -> VerificacionRespaldo:
+        """Ejecuta `PRAGMA integrity_check` y cuenta las filas de las tablas principales"""
+        if not os.path.exists(ruta):
+            raise ValueError(f"No existe el respaldo {ruta}")
+        conn = sqlite3.connect(f"{Path(ruta).resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            integridad = [fila[0] for fila in conn.execute("PRAGMA integrity_check")]
+            existentes = {fila[0] for fila in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            filas = {
+                tabla: conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+                for tabla in self.TABLAS_VERIFICADAS if tabla in existentes
+            }
+        except sqlite3.DatabaseError as e:
+            integridad, filas = [str(e)], {}
+        finally:
+            conn.close()
+        return VerificacionRespaldo(ruta, integridad, filas)
+
+    def _copiar(self, origen: sqlite3.Connection, destino: sqlite3.Connection,
+                ruta_origen: str, ruta_destino: str) -> EstadisticasRespaldo:
+        estadisticas = EstadisticasRespaldo(
+            origen=ruta_origen,
+            destino=ruta_destino,
+            tamano_pagina=origen.execute("PRAGMA page_size").fetchone()[0],
+        )
+        pausa = self.pausa_ms / 1000
+        inicio = fin_pausa = reloj.perf_counter()
+        anterior = None
+
+        def progreso(estado, restantes, total):
+            nonlocal fin_pausa, anterior
+            # El paso abarca desde que terminó la pausa anterior hasta ahora
+            paso_ms = (reloj.perf_counter() - fin_pausa) * 1000
+            estadisticas.pasos += 1
+            estadisticas.pausa_total_ms += paso_ms
+            estadisticas.pausa_max_ms = max(estadisticas.pausa_max_ms, paso_ms)
+            if anterior is not None and restantes > anterior:
+                estadisticas.reinicios += 1
+            anterior = restantes
+            estadisticas.paginas = total
+            if restantes and pausa:
+                reloj.sleep(pausa)
+            fin_pausa = reloj.perf_counter()
+
+        origen.backup(destino, pages=self.paginas_por_paso, progress=progreso)
+        estadisticas.segundos = reloj.perf_counter() - inicio
+        return estadisticas
+
+
+class RespaldoProgramado:
+    """Toma respaldos periódicos en un directorio y conserva los más recientes."""
+
+    PREFIJO = "reserva_cun-"
+
+    def __init__(self, respaldador: RespaldoEnLinea, directorio: str,
+                 intervalo_segundos: float = 3600, conservar: int = 24):
+        self.respaldador = respaldador
+        self.directorio = directorio
+        self.intervalo_segundos = intervalo_segundos
+        self.conservar = conservar
+        self.ultimo: Optional[EstadisticasRespaldo] = None
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def ejecutar(self) -> EstadisticasRespaldo:
+        """Toma un respaldo ahora, lo verifica y rota los antiguos"""
+        os.makedirs(self.directorio, exist_ok=True)
+        marca = datetime.now().strftime("%Y%m%d-%H%M%S")
+        destino = os.path.join(self.directorio, f"{self.PREFIJO}{marca}.db")
+        self.ultimo = self.respaldador.respaldar(destino)
+        verificacion = self.respaldador.verificar(destino)
+        if not verificacion.valido:
+            os.remove(destino)
+            raise ValueError(f"Respaldo descartado por fallar la verificación: {verificacion.integridad[:3]}")
+        self._rotar()
+        return self.ultimo
+
+    def _rotar(self):
+        # Las marcas de tiempo ordenan los nombres cronológicamente
+        respaldos = sorted(glob.glob(os.path.join(self.directorio, f"{self.PREFIJO}*.db")))
+        for ruta in respaldos[:-self.conservar] if self.conservar > 0 else []:
+            os.remove(ruta)
+
+    def iniciar(self):
+        """Toma respaldos periódicamente en un hilo de fondo"""
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="respaldo-programado", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """Detiene el hilo de fondo al terminar el respaldo en curso"""
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join()
+
+    def _bucle(self):
+        while not self._detener.wait(self.intervalo_segundos):
+            try:
+                estadisticas = self.ejecutar()
+                print(f"💾 Respaldo {estadisticas.destino}: {estadisticas.resumen()}")
+            except Exception as e:
+                print(f"⚠️  Error en el respaldo programado: {e}")
+
+
+def _respaldar_o_salir(respaldar) -> EstadisticasRespaldo:
+    try:
+        return respaldar()
+    except RespaldoFragmentado as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+
+def main(argv=None):
+    """Respalda, verifica o restaura la base de reservas sin detener la aplicación"""
+    parser = argparse.ArgumentParser(description="Respaldos en línea de la base de reservas")
+    parser.add_argument("--db", default="reserva_cun.db", help="Ruta de la base de datos SQLite")
+    parser.add_argument("--paginas", type=int, default=256, help="Páginas copiadas por paso")
+    parser.add_argument("--pausa-ms", type=float, default=5.0, help="Pausa entre pasos")
+    acciones = parser.add_subparsers(dest="accion", required=True)
+
+    crear = acciones.add_parser("crear", help="Toma un respaldo consistente")
+    crear.add_argument("destino", help="Archivo de respaldo a generar")
+    verificar = acciones.add_parser("verificar", help="Revisa la integridad de un respaldo")
+    verificar.add_argument("respaldo")
+    restaurar = acciones.add_parser("restaurar", help="Restaura un respaldo sobre --db (aplicación detenida)")
+    restaurar.add_argument("respaldo")
+    programar = acciones.add_parser("programar", help="Toma respaldos periódicos hasta Ctrl+C")
+    programar.add_argument("directorio")
+    programar.add_argument("--intervalo", type=float, default=3600, help="Segundos entre respaldos")
+    programar.add_argument("--conservar", type=int, default=24, help="Respaldos que se conservan")
+    args = parser.parse_args(argv)
+
+    respaldador = RespaldoEnLinea(args.db, args.paginas, args.pausa_ms)
+    if args.accion == "crear":
+        estadisticas = _respaldar_o_salir(lambda: respaldador.respaldar(args.destino))
+        print(f"💾 Respaldo en {args.destino}: {estadisticas.resumen()}")
+    elif args.accion == "verificar":
+        verificacion = respaldador.verificar(args.respaldo)
+        print(("✅ Respaldo válido" if verificacion.valido else "❌ Respaldo dañado") + f": {args.respaldo}")
+        for mensaje in verificacion.integridad[:10] if not verificacion.valido else []:
+            print(f"   {mensaje}")
+        for tabla, cantidad in verificacion.filas.items():
+            print(f"   {tabla}: {cantidad} filas")
+        if not verificacion.valido:
+            raise SystemExit(1)
+    elif args.accion == "restaurar":
+        estadisticas = respaldador.restaurar(args.respaldo)
+        print(f"♻️  {args.db} restaurada desde {args.respaldo}: {estadisticas.resumen()}")
+    else:
+        programado = RespaldoProgramado(respaldador, args.directorio, args.intervalo, args.conservar)
+        estadisticas = _respaldar_o_salir(programado.ejecutar)
+        print(f"💾 Respaldo {estadisticas.destino}: {estadisticas.resumen()}")
+        programado.iniciar()
+        try:
+            while True:
+                reloj.sleep(3600)
+        except KeyboardInterrupt:
+            programado.detener()
+
+
+if __name__ == "__main__":
+    main()
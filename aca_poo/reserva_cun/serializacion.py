@@ -0,0 +1,62 @@
+from datetime import date, time, datetime
+from enum import Enum
+
+from models import Sala, Reserva, Estudiante, EsperaReserva
+
+
+def serializar(valor):
+    """Convierte tipos del dominio a valores JSON"""
+    if isinstance(valor, Enum):
+        return valor.value
+    if isinstance(valor, (date, time, datetime)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def sala_a_dict(sala: Sala) -> dict:
+    return {
+        'id': sala.id,
+        'nombre': sala.nombre,
+        'capacidad': sala.capacidad,
+        'estado': sala.estado,
+        'descripcion': sala.descripcion,
+        'puede_reservar': sala.puede_ser_reservada(),
+    }
+
+
+def reserva_a_dict(reserva: Reserva) -> dict:
+    return {
+        'id': reserva.id,
+        'estudiante_id': reserva.estudiante_id,
+        'sala_id': reserva.sala_id,
+        'fecha_reserva': reserva.fecha_reserva,
+        'hora_inicio': reserva.hora_inicio,
+        'hora_fin': reserva.hora_fin,
+        'estado': reserva.estado,
+        'serie_id': reserva.serie_id,
+        'estudiante_nombre': reserva.estudiante.nombre if reserva.estudiante else None,
+        'sala_nombre': reserva.sala.nombre if reserva.sala else None,
+    }
+
+
+def estudiante_a_dict(estudiante: Estudiante) -> dict:
+    return {
+        'id': estudiante.id,
+        'identificacion': estudiante.identificacion,
+        'nombre': estudiante.nombre,
+        'email': estudiante.email,
+    }
+
+
+def espera_a_dict(espera: EsperaReserva) -> dict:
+    return {
+        'id': espera.id,
+        'estudiante_id': espera.estudiante_id,
+        'sala_id': espera.sala_id,
+        'fecha': espera.fecha,
+        'hora_inicio': espera.hora_inicio,
+        'hora_fin': espera.hora_fin,
+        'prioridad': espera.prioridad,
+        'estado': espera.estado,
+        'reserva_id': espera.reserva_id,
+    }
@@ -1,11 +1,19 @@
-from typing import List, Optional, TYPE_CHECKING
+from typing import Dict, Iterator, List, Optional, TYPE_CHECKING
 from datetime import date, time, datetime, timedelta
+import heapq
+import itertools
 import json
 import sqlite3
 
 # Importaciones de modelos y repositorios
-from models import Sala, Reserva, Estudiante
-from repositories import SalaRepository, ReservaRepository, EstudianteRepository, BaseRepository
+from disponibilidad import PublicadorDisponibilidad
+from lista_espera import ColaEspera
+from models import (
+    Sala, Reserva, Estudiante, EstadoReserva, SerieReserva, EsperaReserva, UsoCuota, CambioDisponibilidad,
+)
+from repositories import (
+    SalaRepository, ReservaRepository, EstudianteRepository, BaseRepository, ConflictoConcurrencia,
+)
 
 from models import EstadoSala  # ← AGREGA ESTO AL INICIO
 
@@ -14,6 +22,19 @@ if TYPE_CHECKING:
     from services import ReservaService
 
 
+def _a_minutos(hora: time) -> int:
+    return hora.hour * 60 + hora.minute
+
+
+def _desde_minutos(minutos: int) -> time:
+    return time(minutos // 60, minutos % 60)
+
+
+def _alinear_franja(minutos: int) -> int:
+    """Redondea hacia arriba al siguiente múltiplo de 30 minutos"""
+    return -(-minutos // 30) * 30
+
+
 class PoliticaCancelacion:
     """Define políticas de cancelación de reservas - RF7"""
 
@@ -34,6 +55,63 @@ class PoliticaCancelacion:
         return True
 
 
+class CuotaExcedida(ValueError):
+    """La reserva supera un límite de la política de cuotas."""
+
+
+class PoliticaCuotas:
+    """Límites de uso por estudiante
+
+    Se verifican contra contadores que mantienen triggers sobre `reservas`
+    (`cuotas_estudiante` y `cuotas_semanales`), de modo que cada reserva lee
+    un par de filas por clave en lugar de recorrer el historial del
+    estudiante. Las ocurrencias de una serie cuentan para las horas
+    semanales pero no para el máximo de reservas activas. None desactiva
+    el límite correspondiente.
+    """
+
+    def __init__(self, max_reservas_activas: Optional[int] = 5, max_horas_semana: Optional[float] = 12):
+        self.max_reservas_activas = max_reservas_activas
+        self.max_horas_semana = max_horas_semana
+
+    @staticmethod
+    def semanas(fechas: List[date]) -> List[date]:
+        """Lunes de las semanas que tocan las fechas"""
+        return sorted({fecha - timedelta(days=fecha.weekday()) for fecha in fechas})
+
+    def verificar(self, uso: UsoCuota, fechas: List[date], hora_inicio: time, hora_fin: time,
+                  es_serie: bool = False, liberada: Optional[Reserva] = None):
+        """Lanza CuotaExcedida si agregar esas reservas supera algún límite
+
+        `liberada` es la reserva que se reemplaza (al modificarla), cuyo uso
+        se descuenta antes de comparar.
+        """
+        nuevas = 0 if es_serie else len(fechas)
+        if liberada is not None and liberada.serie_id is None:
+            nuevas -= 1
+        if (self.max_reservas_activas is not None and nuevas > 0
+                and uso.reservas_activas + nuevas > self.max_reservas_activas):
+            raise CuotaExcedida(f"Alcanzó el máximo de {self.max_reservas_activas} reservas activas")
+
+        if self.max_horas_semana is None:
+            return
+        duracion = _a_minutos(hora_fin) - _a_minutos(hora_inicio)
+        agregados: Dict[date, int] = {}
+        for fecha in fechas:
+            semana = fecha - timedelta(days=fecha.weekday())
+            agregados[semana] = agregados.get(semana, 0) + duracion
+        if liberada is not None:
+            semana = liberada.fecha_reserva - timedelta(days=liberada.fecha_reserva.weekday())
+            agregados[semana] = agregados.get(semana, 0) - (
+                _a_minutos(liberada.hora_fin) - _a_minutos(liberada.hora_inicio)
+            )
+        for semana, minutos in sorted(agregados.items()):
+            if minutos > 0 and uso.minutos_semana(semana) + minutos > self.max_horas_semana * 60:
+                raise CuotaExcedida(
+                    f"Supera el máximo de {self.max_horas_semana:g} horas reservadas en la semana del {semana}"
+                )
+
+
 class EstudianteService:
     """Servicio para gestión de estudiantes - RF10"""
 
@@ -58,6 +136,10 @@ class EstudianteService:
         """Obtiene un estudiante por su ID"""
         return self.estudiante_repo.obtener_por_id(estudiante_id)
 
+    def buscar_estudiantes(self, texto: str, limite: int = 20) -> List[Estudiante]:
+        """Busca estudiantes por nombre, email o identificación parciales"""
+        return self.estudiante_repo.buscar(texto, limite)
+
 
 class SalaService:
     """Servicio para gestión de salas - RF1, RF2, RF9"""
@@ -89,7 +171,7 @@ class SalaService:
             estado_salas.append({
                 'sala': sala,
                 'estado': sala.estado,
-                'puede_reservar': sala.estado == 'disponible'
+                'puede_reservar': sala.puede_ser_reservada()
             })
 
         return estado_salas
@@ -111,7 +193,8 @@ class SalaService:
             descripcion=descripcion or sala_actual.descripcion,
             estado=nuevo_estado,
             horarios_disponibles=sala_actual.horarios_disponibles,
-            creado_en=sala_actual.creado_en
+            creado_en=sala_actual.creado_en,
+            sede=sala_actual.sede
         )
 
         return self.sala_repo.actualizar(sala_actualizada)
@@ -147,7 +230,7 @@ class SalaService:
         finally:
             self.pausar()
 
-    def crear_sala(self, nombre: str, capacidad: int, descripcion: str = None) -> int:
+    def crear_sala(self, nombre: str, capacidad: int, descripcion: str = None, sede: str = None) -> int:
         """Crea una nueva sala - RF1"""
         sala = Sala(
             id=None,
@@ -155,7 +238,8 @@ class SalaService:
             capacidad=capacidad,
             descripcion=descripcion,
             estado=EstadoSala.DISPONIBLE,  # ← ENUM CORRECTO
-            horarios_disponibles=None
+            horarios_disponibles=None,
+            sede=sede
         )
         return self.sala_repo.crear(sala)
 
@@ -167,6 +251,10 @@ class SalaService:
         """Obtiene solo las salas disponibles"""
         return self.sala_repo.obtener_disponibles()
 
+    def buscar_salas(self, texto: str, limite: int = 20) -> List[Sala]:
+        """Busca salas por nombre, descripción o sede parciales"""
+        return self.sala_repo.buscar(texto, limite)
+
     def obtener_sala_por_id(self, sala_id: int) -> Optional[Sala]:
         """Obtiene una sala por su ID"""
         if not isinstance(sala_id, int) or sala_id <= 0:
@@ -182,14 +270,19 @@ class SalaService:
             estado_salas.append({
                 'sala': sala,
                 'estado': sala.estado,
-                'puede_reservar': sala.estado == 'disponible'
+                'puede_reservar': sala.puede_ser_reservada()
             })
 
         return estado_salas
 
     def actualizar_sala(self, sala_id: int, nombre: str, capacidad: int,
-                        descripcion: str = None, estado: str = None) -> bool:
-        """Actualiza una sala existente"""
+                        descripcion: str = None, estado: str = None,
+                        horarios_disponibles: Optional[List[dict]] = None) -> bool:
+        """Actualiza una sala existente
+
+        `horarios_disponibles` reemplaza el horario de apertura (lista vacía
+        para quitar la restricción); None conserva el actual.
+        """
         from models import EstadoSala
 
         sala_actual = self.sala_repo.obtener_por_id(sala_id)
@@ -207,8 +300,11 @@ class SalaService:
             capacidad=capacidad,
             descripcion=descripcion or sala_actual.descripcion,
             estado=nuevo_estado,
-            horarios_disponibles=sala_actual.horarios_disponibles,
-            creado_en=sala_actual.creado_en
+            horarios_disponibles=(
+                sala_actual.horarios_disponibles if horarios_disponibles is None else horarios_disponibles or None
+            ),
+            creado_en=sala_actual.creado_en,
+            sede=sala_actual.sede
         )
 
         return self.sala_repo.actualizar(sala_actualizada)
@@ -221,7 +317,7 @@ class SalaService:
         # Verificar si hay reservas activas para esta sala
         if self.reserva_service:
             reservas = self.reserva_service.obtener_reservas_por_sala(sala_id)
-            reservas_activas = [r for r in reservas if r.estado == 'activa']
+            reservas_activas = [r for r in reservas if r.estado == EstadoReserva.ACTIVA]
 
             if reservas_activas:
                 raise ValueError("No se puede eliminar la sala porque tiene reservas activas")
@@ -239,7 +335,7 @@ class SalaService:
             if self.reserva_service:
                 try:
                     reservas = self.reserva_service.obtener_reservas_por_sala(sala.id)
-                    reservas_count = len([r for r in reservas if r.estado == 'activa'])
+                    reservas_count = len([r for r in reservas if r.estado == EstadoReserva.ACTIVA])
                 except:
                     pass
 
@@ -262,7 +358,7 @@ class SalaService:
             if self.reserva_service:
                 try:
                     reservas = self.reserva_service.obtener_reservas_por_sala(sala.id)
-                    reservas_count = len([r for r in reservas if r.estado == 'activa'])
+                    reservas_count = len([r for r in reservas if r.estado == EstadoReserva.ACTIVA])
                 except:
                     pass
 
@@ -278,12 +374,31 @@ class SalaService:
 class ReservaService:
     """Servicio para gestión de reservas - RF3, RF4, RF5, RF6, RF7, RF8"""
 
+    # Reintentos ante ConflictoConcurrencia antes de informar al usuario
+    MAX_REINTENTOS_CONFLICTO = 3
+
     def __init__(self, reserva_repo: ReservaRepository, sala_repo: SalaRepository,
-                 estudiante_repo: EstudianteRepository):
+                 estudiante_repo: EstudianteRepository, politica_cuotas: Optional[PoliticaCuotas] = None,
+                 publicador: Optional[PublicadorDisponibilidad] = None):
         self.reserva_repo = reserva_repo
         self.sala_repo = sala_repo
         self.estudiante_repo = estudiante_repo
         self.politica_cancelacion = PoliticaCancelacion()
+        self.politica_cuotas = politica_cuotas or PoliticaCuotas()
+        self.cola_espera = ColaEspera(reserva_repo)
+        self.publicador = publicador or PublicadorDisponibilidad()
+
+    def suscribir_disponibilidad(self, callback, sala_id: Optional[int] = None, fecha: Optional[date] = None) -> int:
+        """Avisa con un CambioDisponibilidad cada vez que cambia la ocupación de la sala y día
+
+        None en `sala_id` o `fecha` equivale a cualquiera.
+        Returns: identificador de la suscripción
+        """
+        return self.publicador.suscribir(callback, sala_id, fecha)
+
+    def cancelar_suscripcion(self, token: int) -> bool:
+        """Deja de recibir avisos de una suscripción"""
+        return self.publicador.cancelar(token)
 
     def crear_reserva(self, estudiante_id: int, sala_id: int, fecha: date,
                       hora_inicio: time, hora_fin: time) -> int:
@@ -302,8 +417,8 @@ class ReservaService:
             raise ValueError("Sala no encontrada")
 
         # Validar que la sala puede ser reservada
-        if sala.estado != 'disponible':
-            raise ValueError(f"La sala no está disponible para reservas. Estado: {sala.estado}")
+        if not sala.puede_ser_reservada():
+            raise ValueError(f"La sala no está disponible para reservas. Estado: {sala.estado.value}")
 
         # Validar horario
         if hora_inicio >= hora_fin:
@@ -326,18 +441,14 @@ class ReservaService:
         if fecha < date.today():
             raise ValueError("No se pueden hacer reservas en fechas pasadas")
 
+        # Validar horario de apertura de la sala
+        if not sala.admite(fecha, hora_inicio, hora_fin):
+            raise ValueError("La sala no abre en ese horario")
+
         # Validar disponibilidad - RF8
         if not self.consultar_disponibilidad(sala_id, fecha, hora_inicio, hora_fin):
             raise ValueError("La sala no está disponible en ese horario")
 
-        # Validar que el estudiante no tenga otra reserva en el mismo horario
-        reservas_estudiante = self.reserva_repo.obtener_por_estudiante(estudiante_id)
-        for reserva in reservas_estudiante:
-            if (reserva.estado == 'activa' and
-                    reserva.fecha_reserva == fecha and
-                    not (reserva.hora_fin <= hora_inicio or reserva.hora_inicio >= hora_fin)):
-                raise ValueError("Ya tiene una reserva activa en ese horario")
-
         # Crear objeto reserva
         reserva = Reserva(
             id=None,
@@ -346,14 +457,25 @@ class ReservaService:
             fecha_reserva=fecha,
             hora_inicio=hora_inicio,
             hora_fin=hora_fin,
-            estado='activa'
+            estado=EstadoReserva.ACTIVA
         )
 
-        # Crear reserva en la base de datos
-        reserva_id = self.reserva_repo.crear(reserva)
+        # Cruces del estudiante y cuotas se validan en la misma transacción que la inserción
+        with self.reserva_repo.transaccion(sala_id):
+            conflictos = self.reserva_repo.fechas_en_conflicto(estudiante_id, sala_id, [fecha], hora_inicio, hora_fin)
+            if conflictos.get(fecha) == "Sala ocupada":
+                raise ValueError("La sala no está disponible en ese horario")
+            if conflictos:
+                raise ValueError("Ya tiene una reserva activa en ese horario")
+
+            uso = self.reserva_repo.uso_cuota(estudiante_id, PoliticaCuotas.semanas([fecha]))
+            self.politica_cuotas.verificar(uso, [fecha], hora_inicio, hora_fin)
+
+            reserva_id = self.reserva_repo.crear(reserva)
 
         # Actualizar estado de la sala si es necesario
         self._actualizar_estado_sala(sala_id)
+        self.publicador.publicar(CambioDisponibilidad(sala_id, fecha, 'creada', reserva_id, hora_inicio, hora_fin))
 
         return reserva_id
 
@@ -361,11 +483,11 @@ class ReservaService:
         """Consulta la disponibilidad de una sala en un horario específico - RF8"""
         # Validar sala
         sala = self.sala_repo.obtener_por_id(sala_id)
-        if not sala or sala.estado != 'disponible':
+        if not sala or not sala.puede_ser_reservada():
             return False
 
-        # Validar fecha
-        if fecha < date.today():
+        # Validar fecha y horario de apertura
+        if fecha < date.today() or not sala.admite(fecha, hora_inicio, hora_fin):
             return False
 
         # Verificar conflictos de horario
@@ -376,6 +498,10 @@ class ReservaService:
         if fecha < date.today():
             return []
 
+        sala = self.sala_repo.obtener_por_id(sala_id)
+        if not sala:
+            return []
+
         # Obtener reservas existentes para esa sala y fecha
         reservas = self.reserva_repo.obtener_activas_por_sala_y_fecha(sala_id, fecha)
 
@@ -384,13 +510,13 @@ class ReservaService:
         hora_actual = time(8, 0)
 
         # Último inicio posible a las 19:30
-        while hora_actual < time(19, 30):
-            hora_fin = time(hora_actual.hour, hora_actual.minute + 30)
+        while hora_actual <= time(19, 30):
+            hora_fin = _desde_minutos(_a_minutos(hora_actual) + 30)
             if hora_fin > time(20, 0):
                 break
 
             # Verificar si este horario está disponible
-            disponible = True
+            disponible = sala.admite(fecha, hora_actual, hora_fin)
             for reserva in reservas:
                 if not (hora_fin <= reserva.hora_inicio or hora_actual >= reserva.hora_fin):
                     disponible = False
@@ -411,13 +537,121 @@ class ReservaService:
 
         return horarios_disponibles
 
+    def buscar_primeros_huecos(self, capacidad_minima: int, duracion_minutos: int,
+                               desde: date = None, hasta: date = None,
+                               hora_desde: time = time(8, 0), hora_hasta: time = time(20, 0),
+                               k: int = 5, ahora: datetime = None) -> List[dict]:
+        """Primeros k huecos (sala, fecha, hora) donde cabe una reserva
+
+        Lee una sola vez los intervalos ocupados del período, recorre en orden
+        los huecos libres de cada sala y combina esos recorridos con una cola
+        de prioridad: solo se calculan los huecos necesarios para los k
+        resultados. A igual hora se prefiere la sala más pequeña que alcance.
+        Los inicios se alinean a la grilla de 30 minutos.
+        """
+        if duracion_minutos < 30 or duracion_minutos > 240:
+            raise ValueError("La duración debe estar entre 30 minutos y 4 horas")
+        if hora_desde < time(8, 0) or hora_hasta > time(20, 0) or hora_desde >= hora_hasta:
+            raise ValueError("El rango de horas preferido debe estar entre 8:00 y 20:00")
+
+        ahora = ahora or datetime.now()
+        desde = max(desde or ahora.date(), ahora.date())
+        hasta = hasta or desde + timedelta(days=6)
+        if hasta < desde:
+            return []
+
+        salas = [sala for sala in self.sala_repo.obtener_disponibles() if sala.capacidad >= capacidad_minima]
+        if not salas:
+            return []
+
+        ocupados: Dict[tuple, List[tuple]] = {}
+        for sala_id, fecha, inicio, fin in self.reserva_repo.obtener_ocupados_en_rango(desde, hasta):
+            ocupados.setdefault((sala_id, fecha), []).append((_a_minutos(inicio), _a_minutos(fin)))
+
+        dias = [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+        ventana = (_a_minutos(hora_desde), _a_minutos(hora_hasta))
+        recorridos = [
+            self._huecos_de_sala(sala, dias, ocupados, ventana, duracion_minutos, ahora)
+            for sala in salas
+        ]
+        salas_por_id = {sala.id: sala for sala in salas}
+
+        return [
+            {
+                'sala': salas_por_id[sala_id],
+                'fecha': fecha,
+                'inicio': _desde_minutos(inicio),
+                'fin': _desde_minutos(inicio + duracion_minutos),
+            }
+            for fecha, inicio, _, sala_id in itertools.islice(heapq.merge(*recorridos), k)
+        ]
+
+    def contar_reservas_activas_por_sala(self, desde: date) -> Dict[int, int]:
+        """Reservas activas de cada sala desde una fecha"""
+        return self.reserva_repo.contar_activas_por_sala(desde)
+
+    def proximos_huecos(self, salas: List[Sala], duracion_minutos: int = 30, dias: int = 7,
+                        ahora: datetime = None) -> Dict[int, Optional[tuple]]:
+        """Primer hueco libre de cada sala en los próximos `dias` días
+
+        Returns: sala_id → (fecha, inicio, fin), o None si no hay hueco o la
+        sala está en mantenimiento
+        """
+        ahora = ahora or datetime.now()
+        fechas = [ahora.date() + timedelta(days=i) for i in range(dias)]
+        ocupados: Dict[tuple, List[tuple]] = {}
+        for sala_id, fecha, inicio, fin in self.reserva_repo.obtener_ocupados_en_rango(fechas[0], fechas[-1]):
+            ocupados.setdefault((sala_id, fecha), []).append((_a_minutos(inicio), _a_minutos(fin)))
+
+        ventana = (_a_minutos(time(8, 0)), _a_minutos(time(20, 0)))
+        huecos: Dict[int, Optional[tuple]] = {}
+        for sala in salas:
+            hueco = None
+            if sala.puede_ser_reservada():
+                recorrido = self._huecos_de_sala(sala, fechas, ocupados, ventana, duracion_minutos, ahora)
+                hueco = next(recorrido, None)
+            if hueco is not None:
+                fecha, inicio, _, _ = hueco
+                hueco = (fecha, _desde_minutos(inicio), _desde_minutos(inicio + duracion_minutos))
+            huecos[sala.id] = hueco
+        return huecos
+
+    def _huecos_de_sala(self, sala: Sala, dias: List[date], ocupados: Dict[tuple, List[tuple]],
+                        ventana: tuple, duracion: int, ahora: datetime) -> Iterator[tuple]:
+        """Huecos libres de una sala en orden cronológico: (fecha, inicio, capacidad, sala_id)"""
+        apertura, cierre = ventana
+        for fecha in dias:
+            cursor = apertura
+            if fecha == ahora.date():
+                cursor = max(cursor, _alinear_franja(ahora.hour * 60 + ahora.minute + 1))
+
+            intervalos = ocupados.get((sala.id, fecha), ())
+            if sala.horario is not None:
+                # Las horas en que la sala está cerrada cuentan como ocupadas
+                intervalos = heapq.merge(intervalos, sala.horario.cerrados(fecha.weekday(), apertura, cierre))
+
+            for inicio, fin in intervalos:
+                if cursor + duracion > cierre:
+                    break
+                if fin <= cursor:
+                    continue
+                if inicio - cursor >= duracion:
+                    yield fecha, cursor, sala.capacidad, sala.id
+                cursor = max(cursor, _alinear_franja(fin))
+
+            if cursor + duracion <= cierre:
+                yield fecha, cursor, sala.capacidad, sala.id
+
     def cancelar_reserva(self, reserva_id: int, es_administrador: bool = False) -> bool:
         """Cancela una reserva existente - RF7"""
+        return self._reintentar_conflictos(self._cancelar_reserva, reserva_id, es_administrador)
+
+    def _cancelar_reserva(self, reserva_id: int, es_administrador: bool) -> bool:
         reserva = self.reserva_repo.obtener_por_id(reserva_id)
         if not reserva:
             raise ValueError("Reserva no encontrada")
 
-        if reserva.estado != 'activa':
+        if reserva.estado != EstadoReserva.ACTIVA:
             raise ValueError("La reserva ya está cancelada o completada")
 
         # Aplicar políticas de cancelación
@@ -428,24 +662,123 @@ class ReservaService:
             if not self.politica_cancelacion.puede_cancelar_estudiante(reserva):
                 raise ValueError("No se pueden cancelar reservas con menos de 1 hora de anticipación")
 
-        # Ejecutar cancelación
-        reserva.estado = 'cancelada'
-        self.reserva_repo.actualizar(reserva)
+        # Ejecutar cancelación y ceder el horario a la lista de espera en la misma transacción
+        try:
+            with self.reserva_repo.transaccion(reserva.sala_id):
+                reserva.cancelar()
+                self.reserva_repo.actualizar(reserva)
+                self.cola_espera.promover(
+                    reserva.sala_id, reserva.fecha_reserva, reserva.hora_inicio, reserva.hora_fin,
+                    self._asignar_espera,
+                )
+        except Exception:
+            self.cola_espera.invalidar(reserva.sala_id, reserva.fecha_reserva)
+            raise
 
         # Actualizar estado de la sala
         self._actualizar_estado_sala(reserva.sala_id)
+        # Un solo aviso cubre también las solicitudes promovidas: son del mismo día y franja
+        self.publicador.publicar(CambioDisponibilidad(
+            reserva.sala_id, reserva.fecha_reserva, 'cancelada', reserva.id, reserva.hora_inicio, reserva.hora_fin
+        ))
 
         return True
 
+    # ========== LISTA DE ESPERA ==========
+
+    def unirse_lista_espera(self, estudiante_id: int, sala_id: int, fecha: date,
+                            hora_inicio: time, hora_fin: time, prioridad: int = 0) -> int:
+        """Anota al estudiante para un horario ocupado; se le asigna si se libera
+
+        Returns: ID de la solicitud
+        """
+        if not self.estudiante_repo.obtener_por_id(estudiante_id):
+            raise ValueError("Estudiante no encontrado")
+        sala = self.sala_repo.obtener_por_id(sala_id)
+        if not sala:
+            raise ValueError("Sala no encontrada")
+        if hora_inicio >= hora_fin:
+            raise ValueError("La hora de inicio debe ser anterior a la hora de fin")
+        if hora_inicio < time(8, 0) or hora_fin > time(20, 0):
+            raise ValueError("El horario de reserva debe estar entre 8:00 y 20:00")
+        if fecha < date.today():
+            raise ValueError("No se pueden hacer reservas en fechas pasadas")
+        if not sala.admite(fecha, hora_inicio, hora_fin):
+            raise ValueError("La sala no abre en ese horario")
+        if self.consultar_disponibilidad(sala_id, fecha, hora_inicio, hora_fin):
+            raise ValueError("La sala está disponible en ese horario; puede reservarla directamente")
+
+        espera = EsperaReserva(
+            id=None,
+            estudiante_id=estudiante_id,
+            sala_id=sala_id,
+            fecha=fecha,
+            hora_inicio=hora_inicio,
+            hora_fin=hora_fin,
+            prioridad=prioridad,
+        )
+        espera.id = self.reserva_repo.agregar_espera(espera)
+        self.cola_espera.agregar(espera)
+        return espera.id
+
+    def retirar_de_lista_espera(self, espera_id: int, estudiante_id: Optional[int] = None) -> bool:
+        """Retira una solicitud pendiente (del estudiante indicado, si se da)"""
+        espera = self.reserva_repo.obtener_espera(espera_id)
+        if not espera or (estudiante_id is not None and espera.estudiante_id != estudiante_id):
+            raise ValueError("Solicitud de lista de espera no encontrada")
+        if not self.reserva_repo.retirar_espera(espera_id):
+            raise ValueError("La solicitud ya fue asignada o retirada")
+        self.cola_espera.invalidar(espera.sala_id, espera.fecha)
+        return True
+
+    def obtener_esperas_por_estudiante(self, estudiante_id: int) -> List[EsperaReserva]:
+        """Solicitudes de lista de espera de un estudiante, más recientes primero"""
+        return self.reserva_repo.obtener_esperas_por_estudiante(estudiante_id)
+
+    def _asignar_espera(self, espera: EsperaReserva) -> bool:
+        """Convierte una solicitud en reserva si el horario quedó libre para ella"""
+        if datetime.combine(espera.fecha, espera.hora_inicio) <= datetime.now():
+            return False
+        if self.reserva_repo.fechas_en_conflicto(
+            espera.estudiante_id, espera.sala_id, [espera.fecha], espera.hora_inicio, espera.hora_fin
+        ):
+            return False
+        uso = self.reserva_repo.uso_cuota(espera.estudiante_id, PoliticaCuotas.semanas([espera.fecha]))
+        try:
+            self.politica_cuotas.verificar(uso, [espera.fecha], espera.hora_inicio, espera.hora_fin)
+        except CuotaExcedida:
+            return False
+        if not self.reserva_repo.tomar_espera(espera.id):
+            return False
+
+        reserva_id = self.reserva_repo.crear(Reserva(
+            id=None,
+            estudiante_id=espera.estudiante_id,
+            sala_id=espera.sala_id,
+            fecha_reserva=espera.fecha,
+            hora_inicio=espera.hora_inicio,
+            hora_fin=espera.hora_fin,
+            estado=EstadoReserva.ACTIVA,
+        ))
+        self.reserva_repo.vincular_espera(espera.id, reserva_id)
+        espera.reserva_id = reserva_id
+        return True
+
     def modificar_reserva(self, reserva_id: int, nueva_sala_id: int = None,
                           nueva_fecha: date = None, nueva_hora_inicio: time = None,
                           nueva_hora_fin: time = None) -> bool:
         """Modifica una reserva existente - RF6"""
+        return self._reintentar_conflictos(
+            self._modificar_reserva, reserva_id, nueva_sala_id, nueva_fecha, nueva_hora_inicio, nueva_hora_fin
+        )
+
+    def _modificar_reserva(self, reserva_id: int, nueva_sala_id: Optional[int], nueva_fecha: Optional[date],
+                           nueva_hora_inicio: Optional[time], nueva_hora_fin: Optional[time]) -> bool:
         reserva = self.reserva_repo.obtener_por_id(reserva_id)
         if not reserva:
             raise ValueError("Reserva no encontrada")
 
-        if reserva.estado != 'activa':
+        if reserva.estado != EstadoReserva.ACTIVA:
             raise ValueError("Solo se pueden modificar reservas activas")
 
         # Usar valores existentes si no se proporcionan nuevos
@@ -454,33 +787,190 @@ class ReservaService:
         hora_inicio = nueva_hora_inicio if nueva_hora_inicio else reserva.hora_inicio
         hora_fin = nueva_hora_fin if nueva_hora_fin else reserva.hora_fin
 
-        # Validar nueva disponibilidad (excluyendo la reserva actual)
-        if self.reserva_repo._existe_reserva_conflicto(sala_id, fecha, hora_inicio, hora_fin, reserva_id):
-            raise ValueError("Ya existe una reserva para la nueva sala y horario")
+        sala = self.sala_repo.obtener_por_id(sala_id)
+        if not sala:
+            raise ValueError("Sala no encontrada")
+        if not sala.admite(fecha, hora_inicio, hora_fin):
+            raise ValueError("La sala no abre en ese horario")
 
-        # Actualizar reserva
-        reserva.sala_id = sala_id
-        reserva.fecha_reserva = fecha
-        reserva.hora_inicio = hora_inicio
-        reserva.hora_fin = hora_fin
-        reserva.actualizado_en = datetime.now()
+        anterior = CambioDisponibilidad(
+            reserva.sala_id, reserva.fecha_reserva, 'modificada', reserva.id, reserva.hora_inicio, reserva.hora_fin
+        )
+        sala_anterior_id = reserva.sala_id
 
-        self.reserva_repo.actualizar(reserva)
+        # Disponibilidad (excluyendo la reserva actual) y cuotas en la misma transacción que la escritura
+        try:
+            with self.reserva_repo.transaccion(sala_id):
+                if self.reserva_repo._existe_reserva_conflicto(sala_id, fecha, hora_inicio, hora_fin, reserva_id):
+                    raise ValueError("Ya existe una reserva para la nueva sala y horario")
+
+                # Una ocurrencia de serie sigue siéndolo: no cambia el número de reservas activas
+                uso = self.reserva_repo.uso_cuota(reserva.estudiante_id, PoliticaCuotas.semanas([fecha]))
+                self.politica_cuotas.verificar(
+                    uso, [fecha], hora_inicio, hora_fin, es_serie=reserva.serie_id is not None, liberada=reserva
+                )
+
+                # Actualizar reserva
+                reserva.sala_id = sala_id
+                reserva.fecha_reserva = fecha
+                reserva.hora_inicio = hora_inicio
+                reserva.hora_fin = hora_fin
+                reserva.actualizado_en = datetime.now()
+
+                self.reserva_repo.actualizar(reserva)
+
+                # El horario que deja la reserva pasa a la lista de espera
+                with self.reserva_repo.transaccion(sala_anterior_id):
+                    self.cola_espera.promover(
+                        sala_anterior_id, anterior.fecha, anterior.hora_inicio, anterior.hora_fin,
+                        self._asignar_espera,
+                    )
+        except Exception:
+            self.cola_espera.invalidar(sala_anterior_id, anterior.fecha)
+            raise
 
         # Actualizar estados de salas
         self._actualizar_estado_sala(reserva.sala_id)
-        if nueva_sala_id and nueva_sala_id != reserva.sala_id:
-            self._actualizar_estado_sala(nueva_sala_id)
+        if sala_anterior_id != reserva.sala_id:
+            self._actualizar_estado_sala(sala_anterior_id)
+
+        # Avisar al día que se liberó y al que se ocupó; si es el mismo, una vez con ambas franjas
+        if (anterior.sala_id, anterior.fecha) == (sala_id, fecha):
+            anterior.hora_inicio = min(anterior.hora_inicio, hora_inicio)
+            anterior.hora_fin = max(anterior.hora_fin, hora_fin)
+            self.publicador.publicar(anterior)
+        else:
+            self.publicador.publicar(anterior)
+            self.publicador.publicar(CambioDisponibilidad(sala_id, fecha, 'modificada', reserva_id, hora_inicio, hora_fin))
 
         return True
 
-    def obtener_reservas_por_estudiante(self, estudiante_id: int) -> List[Reserva]:
+    def crear_serie(self, estudiante_id: int, sala_id: int, fecha_inicio: date, fecha_fin: date,
+                    hora_inicio: time, hora_fin: time, dias_semana: List[int] = None,
+                    intervalo_semanas: int = 1, excepciones: List[date] = None,
+                    omitir_conflictos: bool = False) -> dict:
+        """Crea una reserva recurrente con todas sus ocurrencias de una vez
+
+        Todas las fechas se validan contra las reservas existentes con una
+        sola consulta y se insertan en la misma transacción. Con
+        `omitir_conflictos` se crean las fechas libres y las demás quedan
+        como excepciones; si no, cualquier choque rechaza la serie completa.
+
+        Returns: {'serie_id', 'creadas': [fechas], 'omitidas': {fecha: motivo}}
+        """
+        if not self.estudiante_repo.obtener_por_id(estudiante_id):
+            raise ValueError("Estudiante no encontrado")
+
+        sala = self.sala_repo.obtener_por_id(sala_id)
+        if not sala:
+            raise ValueError("Sala no encontrada")
+        if not sala.puede_ser_reservada():
+            raise ValueError(f"La sala no está disponible para reservas. Estado: {sala.estado.value}")
+
+        if fecha_inicio < date.today():
+            raise ValueError("No se pueden hacer reservas en fechas pasadas")
+
+        serie = SerieReserva(
+            id=None,
+            estudiante_id=estudiante_id,
+            sala_id=sala_id,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+            hora_inicio=hora_inicio,
+            hora_fin=hora_fin,
+            dias_semana=sorted(set(dias_semana or [])),
+            intervalo_semanas=intervalo_semanas,
+            excepciones=list(excepciones or []),
+        )
+        errores = serie.validar()
+        if errores:
+            raise ValueError(f"Errores de validación: {', '.join(errores)}")
+
+        cerradas = {
+            fecha: "Sala cerrada en ese horario"
+            for fecha in serie.fechas() if not sala.admite(fecha, hora_inicio, hora_fin)
+        }
+        with self.reserva_repo.transaccion(sala_id):
+            fechas = [fecha for fecha in serie.fechas() if fecha not in cerradas]
+            uso = self.reserva_repo.uso_cuota(estudiante_id, PoliticaCuotas.semanas(fechas))
+            self.politica_cuotas.verificar(uso, fechas, hora_inicio, hora_fin, es_serie=True)
+            creadas, omitidas = self.reserva_repo.crear_serie(serie, omitir_conflictos, cerradas)
+        self._actualizar_estado_sala(sala_id)
+        for fecha in creadas:
+            self.publicador.publicar(CambioDisponibilidad(sala_id, fecha, 'creada', serie.id, hora_inicio, hora_fin))
+        return {'serie_id': serie.id, 'creadas': creadas, 'omitidas': omitidas}
+
+    def cancelar_serie(self, serie_id: int, es_administrador: bool = False) -> int:
+        """Cancela todas las ocurrencias futuras de una serie
+
+        Para estudiantes, la ocurrencia de hoy solo se cancela si falta más
+        de una hora para su inicio (misma política que una reserva suelta).
+
+        Returns: cantidad de ocurrencias canceladas
+        """
+        serie = self.reserva_repo.obtener_serie(serie_id)
+        if not serie:
+            raise ValueError("Serie no encontrada")
+        if serie.estado != EstadoReserva.ACTIVA:
+            raise ValueError("La serie ya está cancelada")
+
+        desde = date.today()
+        if not es_administrador and datetime.combine(desde, serie.hora_inicio) - datetime.now() < timedelta(hours=1):
+            desde += timedelta(days=1)
+
+        # Cada ocurrencia cancelada cede su horario a la lista de espera en la misma transacción
+        fechas: List[date] = []
+        try:
+            with self.reserva_repo.transaccion(serie.sala_id):
+                fechas = self.reserva_repo.cancelar_serie(serie_id, desde)
+                for fecha in fechas:
+                    self.cola_espera.promover(
+                        serie.sala_id, fecha, serie.hora_inicio, serie.hora_fin, self._asignar_espera
+                    )
+        except Exception:
+            for fecha in fechas:
+                self.cola_espera.invalidar(serie.sala_id, fecha)
+            raise
+
+        self._actualizar_estado_sala(serie.sala_id)
+        # Un aviso por día, que cubre también las solicitudes promovidas
+        for fecha in fechas:
+            self.publicador.publicar(CambioDisponibilidad(
+                serie.sala_id, fecha, 'cancelada', serie_id, serie.hora_inicio, serie.hora_fin
+            ))
+        return len(fechas)
+
+    def completar_reservas_vencidas(self, ahora: datetime = None, limite: int = 500) -> int:
+        """Marca como completadas las reservas que ya terminaron (un lote)
+
+        Returns: cantidad de reservas completadas
+        """
+        salas_afectadas = self.reserva_repo.completar_vencidas(ahora or datetime.now(), limite)
+        for sala_id in set(salas_afectadas):
+            self._actualizar_estado_sala(sala_id)
+        return len(salas_afectadas)
+
+    def _reintentar_conflictos(self, operacion, *args):
+        """Repite lectura-decisión-escritura si otra operación cambió la reserva"""
+        for _ in range(self.MAX_REINTENTOS_CONFLICTO - 1):
+            try:
+                return operacion(*args)
+            except ConflictoConcurrencia:
+                continue
+        try:
+            return operacion(*args)
+        except ConflictoConcurrencia:
+            raise ConflictoConcurrencia(
+                "La reserva está siendo modificada por otro usuario. Intente de nuevo"
+            )
+
+    def obtener_reservas_por_estudiante(self, estudiante_id: int, incluir_archivo: bool = False) -> List[Reserva]:
         """Obtiene todas las reservas de un estudiante - RF5"""
-        return self.reserva_repo.obtener_por_estudiante(estudiante_id)
+        return self.reserva_repo.obtener_por_estudiante(estudiante_id, incluir_archivo)
 
-    def obtener_reservas_por_sala(self, sala_id: int) -> List[Reserva]:
+    def obtener_reservas_por_sala(self, sala_id: int, incluir_archivo: bool = False) -> List[Reserva]:
         """Obtiene todas las reservas de una sala - RF4"""
-        return self.reserva_repo.obtener_por_sala(sala_id)
+        return self.reserva_repo.obtener_por_sala(sala_id, incluir_archivo)
 
     def obtener_reserva_por_id(self, reserva_id: int) -> Optional[Reserva]:
         """Obtiene una reserva específica por su ID"""
@@ -488,8 +978,11 @@ class ReservaService:
 
     def _actualizar_estado_sala(self, sala_id: int):
         """Actualiza el estado de la sala basado en reservas activas"""
-        reservas_activas = self.reserva_repo.obtener_por_sala(sala_id)
-        tiene_reservas_activas = any(r.estado == 'activa' for r in reservas_activas)
+        sala = self.sala_repo.obtener_por_id(sala_id)
+        if not sala or sala.estado == EstadoSala.MANTENIMIENTO:
+            return
+
+        tiene_reservas_activas = self.reserva_repo.tiene_activas(sala_id)
 
-        nuevo_estado = 'reservada' if tiene_reservas_activas else 'disponible'
+        nuevo_estado = EstadoSala.RESERVADA if tiene_reservas_activas else EstadoSala.DISPONIBLE
         self.sala_repo.actualizar_estado(sala_id, nuevo_estado)
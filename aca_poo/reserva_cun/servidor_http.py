@@ -0,0 +1,491 @@
+import argparse
+import asyncio
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time
+from http import HTTPStatus
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+from archivo import ArchivadorReservas
+from cola_escritura import ColaEscrituraAgrupada
+from database import DatabaseManager
+from estado_compartido import NOMBRE_SEGMENTO, PublicadorEstadoSalas
+from eventos import BuzonEventos, evento_a_dict
+from fragmentacion import EnrutadorFragmentos, BuzonEventosFragmentado
+from mantenimiento import BarridoReservasVencidas
+from respaldo import RespaldoEnLinea, RespaldoProgramado
+from serializacion import serializar, sala_a_dict, reserva_a_dict, estudiante_a_dict, espera_a_dict
+
+
+class ErrorHTTP(Exception):
+    """Error que se traduce directamente a una respuesta HTTP"""
+
+    def __init__(self, estado: HTTPStatus, mensaje: str):
+        super().__init__(mensaje)
+        self.estado = estado
+        self.mensaje = mensaje
+
+
+def _leer_fecha(valor: Optional[str], campo: str) -> date:
+    try:
+        return date.fromisoformat(valor)
+    except (TypeError, ValueError):
+        raise ErrorHTTP(HTTPStatus.BAD_REQUEST, f"'{campo}' debe tener formato YYYY-MM-DD")
+
+
+def _leer_hora(valor: Optional[str], campo: str) -> time:
+    try:
+        return time.fromisoformat(valor)
+    except (TypeError, ValueError):
+        raise ErrorHTTP(HTTPStatus.BAD_REQUEST, f"'{campo}' debe tener formato HH:MM")
+
+
+def _leer_entero(valor, campo: str) -> int:
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ErrorHTTP(HTTPStatus.BAD_REQUEST, f"'{campo}' debe ser un número entero")
+
+
+class ServidorReservas:
+    """API HTTP/JSON local sobre los servicios de reservas.
+
+    Atiende muchas conexiones con asyncio y delega el trabajo bloqueante de
+    SQLite a un ejecutor de hilos acotado. Las conexiones HTTP/1.1 se
+    mantienen abiertas (keep-alive) para que kioscos y portal reutilicen
+    el socket entre peticiones.
+    """
+
+    MAX_CUERPO = 64 * 1024
+    MAX_CABECERAS = 100
+
+    def __init__(self, reserva_service, sala_service, estudiante_service,
+                 max_hilos: int = 8, max_pendientes: int = 256,
+                 tiempo_inactividad: float = 15.0, buzon_eventos: BuzonEventos = None):
+        self.reserva_service = reserva_service
+        self.sala_service = sala_service
+        self.estudiante_service = estudiante_service
+        self.buzon_eventos = buzon_eventos
+        self.tiempo_inactividad = tiempo_inactividad
+        self.max_pendientes = max_pendientes
+        self._ejecutor = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="reserva-db")
+        self._cupos: Optional[asyncio.Semaphore] = None
+        self._servidor: Optional[asyncio.AbstractServer] = None
+        self._rutas: List[Tuple[str, re.Pattern, Callable]] = [
+            ('GET', re.compile(r'^/salas$'), self._listar_salas),
+            ('GET', re.compile(r'^/salas/buscar$'), self._buscar_huecos),
+            ('GET', re.compile(r'^/salas/(\d+)$'), self._obtener_sala),
+            ('GET', re.compile(r'^/salas/(\d+)/disponibilidad$'), self._consultar_disponibilidad),
+            ('GET', re.compile(r'^/reservas$'), self._listar_reservas),
+            ('POST', re.compile(r'^/reservas$'), self._crear_reserva),
+            ('GET', re.compile(r'^/reservas/(\d+)$'), self._obtener_reserva),
+            ('PATCH', re.compile(r'^/reservas/(\d+)$'), self._modificar_reserva),
+            ('POST', re.compile(r'^/reservas/(\d+)/cancelar$'), self._cancelar_reserva),
+            ('POST', re.compile(r'^/series$'), self._crear_serie),
+            ('POST', re.compile(r'^/series/(\d+)/cancelar$'), self._cancelar_serie),
+            ('GET', re.compile(r'^/lista-espera$'), self._listar_esperas),
+            ('POST', re.compile(r'^/lista-espera$'), self._unirse_lista_espera),
+            ('POST', re.compile(r'^/lista-espera/(\d+)/retirar$'), self._retirar_de_lista_espera),
+            ('GET', re.compile(r'^/estudiantes$'), self._buscar_estudiantes),
+            ('POST', re.compile(r'^/estudiantes$'), self._registrar_estudiante),
+            ('GET', re.compile(r'^/estudiantes/([^/]+)$'), self._obtener_estudiante),
+            ('GET', re.compile(r'^/eventos$'), self._leer_eventos),
+            ('POST', re.compile(r'^/eventos/confirmar$'), self._confirmar_eventos),
+        ]
+
+    # ========== CICLO DE VIDA ==========
+
+    async def iniciar(self, host: str = "127.0.0.1", port: int = 8080) -> asyncio.AbstractServer:
+        """Abre el socket de escucha"""
+        self._cupos = asyncio.Semaphore(self.max_pendientes)
+        self._servidor = await asyncio.start_server(self._atender_conexion, host, port)
+        return self._servidor
+
+    async def servir(self, host: str = "127.0.0.1", port: int = 8080):
+        """Atiende peticiones hasta que se cancele la tarea"""
+        servidor = await self.iniciar(host, port)
+        async with servidor:
+            await servidor.serve_forever()
+
+    async def cerrar(self):
+        """Cierra el socket y espera a que terminen las tareas en curso"""
+        if self._servidor:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+        self._ejecutor.shutdown(wait=True)
+
+    # ========== PROTOCOLO HTTP ==========
+
+    async def _atender_conexion(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    linea = await asyncio.wait_for(reader.readline(), self.tiempo_inactividad)
+                except asyncio.TimeoutError:
+                    break
+                if not linea:
+                    break
+                if linea in (b'\r\n', b'\n'):
+                    continue
+
+                try:
+                    metodo, ruta, version, cabeceras, cuerpo = await self._leer_peticion(linea, reader)
+                except ErrorHTTP as e:
+                    await self._responder(writer, e.estado, {'error': e.mensaje}, mantener=False)
+                    break
+
+                conexion = cabeceras.get('connection', '').lower()
+                if version == 'HTTP/1.0':
+                    mantener = conexion == 'keep-alive'
+                else:
+                    mantener = conexion != 'close'
+
+                estado, datos = await self._despachar(metodo, ruta, cuerpo)
+                await self._responder(writer, estado, datos, mantener)
+                if not mantener:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _leer_peticion(self, linea: bytes, reader: asyncio.StreamReader):
+        try:
+            metodo, ruta, version = linea.decode('latin-1').split()
+        except ValueError:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Línea de petición inválida")
+
+        cabeceras = {}
+        while True:
+            linea = await reader.readline()
+            if linea in (b'\r\n', b'\n', b''):
+                break
+            if len(cabeceras) >= self.MAX_CABECERAS:
+                raise ErrorHTTP(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Demasiadas cabeceras")
+            nombre, _, valor = linea.decode('latin-1').partition(':')
+            cabeceras[nombre.strip().lower()] = valor.strip()
+
+        longitud = _leer_entero(cabeceras.get('content-length', 0), 'Content-Length')
+        if longitud < 0:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "'Content-Length' no puede ser negativo")
+        if longitud > self.MAX_CUERPO:
+            raise ErrorHTTP(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Cuerpo demasiado grande")
+        cuerpo = await reader.readexactly(longitud) if longitud else b''
+        return metodo.upper(), ruta, version.upper(), cabeceras, cuerpo
+
+    async def _despachar(self, metodo: str, ruta: str, cuerpo: bytes) -> Tuple[HTTPStatus, object]:
+        partes = urlsplit(ruta)
+        consulta = {k: v[-1] for k, v in parse_qs(partes.query).items()}
+
+        metodos_ruta = []
+        for metodo_ruta, patron, manejador in self._rutas:
+            coincidencia = patron.match(partes.path)
+            if not coincidencia:
+                continue
+            metodos_ruta.append(metodo_ruta)
+            if metodo_ruta != metodo:
+                continue
+
+            # El trabajo con SQLite bloquea: se envía al ejecutor acotado
+            loop = asyncio.get_running_loop()
+            async with self._cupos:
+                return await loop.run_in_executor(
+                    self._ejecutor, self._ejecutar, manejador, coincidencia.groups(), consulta, cuerpo
+                )
+
+        if metodos_ruta:
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': f"Método no permitido. Use: {', '.join(metodos_ruta)}"}
+        return HTTPStatus.NOT_FOUND, {'error': "Recurso no encontrado"}
+
+    def _ejecutar(self, manejador: Callable, parametros: tuple, consulta: dict, cuerpo: bytes):
+        """Ejecuta un manejador en un hilo del ejecutor y traduce errores"""
+        try:
+            datos = json.loads(cuerpo) if cuerpo else {}
+            if not isinstance(datos, dict):
+                raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "El cuerpo debe ser un objeto JSON")
+            return manejador(*parametros, consulta=consulta, datos=datos)
+        except ErrorHTTP as e:
+            return e.estado, {'error': e.mensaje}
+        except json.JSONDecodeError:
+            return HTTPStatus.BAD_REQUEST, {'error': "JSON inválido"}
+        except ValueError as e:
+            return HTTPStatus.UNPROCESSABLE_ENTITY, {'error': str(e)}
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"Error interno: {e}"}
+
+    async def _responder(self, writer: asyncio.StreamWriter, estado: HTTPStatus, datos, mantener: bool):
+        cuerpo = json.dumps(datos, default=serializar, ensure_ascii=False).encode('utf-8')
+        cabeceras = (
+            f"HTTP/1.1 {estado.value} {estado.phrase}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(cuerpo)}\r\n"
+            f"Connection: {'keep-alive' if mantener else 'close'}\r\n"
+            f"\r\n"
+        )
+        writer.write(cabeceras.encode('latin-1') + cuerpo)
+        await writer.drain()
+
+    # ========== ENDPOINTS ==========
+
+    def _listar_salas(self, consulta: dict, datos: dict):
+        if 'q' in consulta:
+            salas = self.sala_service.buscar_salas(consulta['q'], _leer_entero(consulta.get('limite', 20), 'limite'))
+        elif consulta.get('disponibles') in ('1', 'true', 'si'):
+            salas = self.sala_service.listar_salas_disponibles()
+        else:
+            salas = self.sala_service.listar_salas()
+        return HTTPStatus.OK, [sala_a_dict(sala) for sala in salas]
+
+    def _obtener_sala(self, sala_id: str, consulta: dict, datos: dict):
+        sala = self.sala_service.obtener_sala_por_id(int(sala_id))
+        if not sala:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, "Sala no encontrada")
+        return HTTPStatus.OK, sala_a_dict(sala)
+
+    def _buscar_huecos(self, consulta: dict, datos: dict):
+        huecos = self.reserva_service.buscar_primeros_huecos(
+            _leer_entero(consulta.get('capacidad', 1), 'capacidad'),
+            _leer_entero(consulta.get('duracion'), 'duracion'),
+            desde=_leer_fecha(consulta['desde'], 'desde') if 'desde' in consulta else None,
+            hasta=_leer_fecha(consulta['hasta'], 'hasta') if 'hasta' in consulta else None,
+            hora_desde=_leer_hora(consulta.get('inicio', '08:00'), 'inicio'),
+            hora_hasta=_leer_hora(consulta.get('fin', '20:00'), 'fin'),
+            k=_leer_entero(consulta.get('k', 5), 'k'),
+        )
+        return HTTPStatus.OK, [
+            {'sala': sala_a_dict(hueco['sala']), 'fecha': hueco['fecha'],
+             'hora_inicio': hueco['inicio'], 'hora_fin': hueco['fin']}
+            for hueco in huecos
+        ]
+
+    def _consultar_disponibilidad(self, sala_id: str, consulta: dict, datos: dict):
+        fecha = _leer_fecha(consulta.get('fecha'), 'fecha')
+        if 'inicio' not in consulta and 'fin' not in consulta:
+            horarios = self.reserva_service.obtener_horarios_disponibles(int(sala_id), fecha)
+            return HTTPStatus.OK, {'sala_id': int(sala_id), 'fecha': fecha, 'horarios': horarios}
+
+        hora_inicio = _leer_hora(consulta.get('inicio'), 'inicio')
+        hora_fin = _leer_hora(consulta.get('fin'), 'fin')
+        disponible = self.reserva_service.consultar_disponibilidad(int(sala_id), fecha, hora_inicio, hora_fin)
+        return HTTPStatus.OK, {'sala_id': int(sala_id), 'fecha': fecha, 'disponible': disponible}
+
+    def _listar_reservas(self, consulta: dict, datos: dict):
+        historial = consulta.get('historial') in ('1', 'true', 'si')
+        if 'sala_id' in consulta:
+            reservas = self.reserva_service.obtener_reservas_por_sala(
+                _leer_entero(consulta['sala_id'], 'sala_id'), historial
+            )
+        elif 'estudiante_id' in consulta:
+            reservas = self.reserva_service.obtener_reservas_por_estudiante(
+                _leer_entero(consulta['estudiante_id'], 'estudiante_id'), historial
+            )
+        else:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Indique 'sala_id' o 'estudiante_id'")
+        return HTTPStatus.OK, [reserva_a_dict(reserva) for reserva in reservas]
+
+    def _obtener_reserva(self, reserva_id: str, consulta: dict, datos: dict):
+        reserva = self.reserva_service.obtener_reserva_por_id(int(reserva_id))
+        if not reserva:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, "Reserva no encontrada")
+        return HTTPStatus.OK, reserva_a_dict(reserva)
+
+    def _crear_reserva(self, consulta: dict, datos: dict):
+        reserva_id = self.reserva_service.crear_reserva(
+            _leer_entero(datos.get('estudiante_id'), 'estudiante_id'),
+            _leer_entero(datos.get('sala_id'), 'sala_id'),
+            _leer_fecha(datos.get('fecha'), 'fecha'),
+            _leer_hora(datos.get('hora_inicio'), 'hora_inicio'),
+            _leer_hora(datos.get('hora_fin'), 'hora_fin'),
+        )
+        return HTTPStatus.CREATED, {'id': reserva_id}
+
+    def _modificar_reserva(self, reserva_id: str, consulta: dict, datos: dict):
+        self.reserva_service.modificar_reserva(
+            int(reserva_id),
+            nueva_sala_id=_leer_entero(datos['sala_id'], 'sala_id') if 'sala_id' in datos else None,
+            nueva_fecha=_leer_fecha(datos['fecha'], 'fecha') if 'fecha' in datos else None,
+            nueva_hora_inicio=_leer_hora(datos['hora_inicio'], 'hora_inicio') if 'hora_inicio' in datos else None,
+            nueva_hora_fin=_leer_hora(datos['hora_fin'], 'hora_fin') if 'hora_fin' in datos else None,
+        )
+        return HTTPStatus.OK, {'id': int(reserva_id), 'modificada': True}
+
+    def _cancelar_reserva(self, reserva_id: str, consulta: dict, datos: dict):
+        es_administrador = bool(datos.get('es_administrador', False))
+        self.reserva_service.cancelar_reserva(int(reserva_id), es_administrador=es_administrador)
+        return HTTPStatus.OK, {'id': int(reserva_id), 'cancelada': True}
+
+    def _crear_serie(self, consulta: dict, datos: dict):
+        resultado = self.reserva_service.crear_serie(
+            _leer_entero(datos.get('estudiante_id'), 'estudiante_id'),
+            _leer_entero(datos.get('sala_id'), 'sala_id'),
+            _leer_fecha(datos.get('fecha_inicio'), 'fecha_inicio'),
+            _leer_fecha(datos.get('fecha_fin'), 'fecha_fin'),
+            _leer_hora(datos.get('hora_inicio'), 'hora_inicio'),
+            _leer_hora(datos.get('hora_fin'), 'hora_fin'),
+            dias_semana=[_leer_entero(dia, 'dias_semana') for dia in datos.get('dias_semana', [])],
+            intervalo_semanas=_leer_entero(datos.get('intervalo_semanas', 1), 'intervalo_semanas'),
+            excepciones=[_leer_fecha(fecha, 'excepciones') for fecha in datos.get('excepciones', [])],
+            omitir_conflictos=bool(datos.get('omitir_conflictos', False)),
+        )
+        return HTTPStatus.CREATED, {
+            'id': resultado['serie_id'],
+            'creadas': resultado['creadas'],
+            'omitidas': [{'fecha': fecha, 'motivo': motivo} for fecha, motivo in sorted(resultado['omitidas'].items())],
+        }
+
+    def _cancelar_serie(self, serie_id: str, consulta: dict, datos: dict):
+        es_administrador = bool(datos.get('es_administrador', False))
+        canceladas = self.reserva_service.cancelar_serie(int(serie_id), es_administrador=es_administrador)
+        return HTTPStatus.OK, {'id': int(serie_id), 'canceladas': canceladas}
+
+    def _listar_esperas(self, consulta: dict, datos: dict):
+        if 'estudiante_id' not in consulta:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Indique 'estudiante_id'")
+        esperas = self.reserva_service.obtener_esperas_por_estudiante(
+            _leer_entero(consulta['estudiante_id'], 'estudiante_id')
+        )
+        return HTTPStatus.OK, [espera_a_dict(espera) for espera in esperas]
+
+    def _unirse_lista_espera(self, consulta: dict, datos: dict):
+        espera_id = self.reserva_service.unirse_lista_espera(
+            _leer_entero(datos.get('estudiante_id'), 'estudiante_id'),
+            _leer_entero(datos.get('sala_id'), 'sala_id'),
+            _leer_fecha(datos.get('fecha'), 'fecha'),
+            _leer_hora(datos.get('hora_inicio'), 'hora_inicio'),
+            _leer_hora(datos.get('hora_fin'), 'hora_fin'),
+            prioridad=_leer_entero(datos.get('prioridad', 0), 'prioridad'),
+        )
+        return HTTPStatus.CREATED, {'id': espera_id}
+
+    def _retirar_de_lista_espera(self, espera_id: str, consulta: dict, datos: dict):
+        estudiante_id = datos.get('estudiante_id')
+        self.reserva_service.retirar_de_lista_espera(
+            int(espera_id), _leer_entero(estudiante_id, 'estudiante_id') if estudiante_id is not None else None
+        )
+        return HTTPStatus.OK, {'id': int(espera_id), 'retirada': True}
+
+    def _registrar_estudiante(self, consulta: dict, datos: dict):
+        estudiante_id = self.estudiante_service.registrar_estudiante(
+            str(datos.get('identificacion', '')), str(datos.get('nombre', '')), datos.get('email')
+        )
+        return HTTPStatus.CREATED, {'id': estudiante_id}
+
+    def _buscar_estudiantes(self, consulta: dict, datos: dict):
+        if not consulta.get('q'):
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Indique el texto a buscar en 'q'")
+        estudiantes = self.estudiante_service.buscar_estudiantes(
+            consulta['q'], _leer_entero(consulta.get('limite', 20), 'limite')
+        )
+        return HTTPStatus.OK, [estudiante_a_dict(estudiante) for estudiante in estudiantes]
+
+    def _obtener_estudiante(self, identificacion: str, consulta: dict, datos: dict):
+        estudiante = self.estudiante_service.obtener_estudiante_por_identificacion(identificacion)
+        if not estudiante:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, "Estudiante no encontrado")
+        return HTTPStatus.OK, estudiante_a_dict(estudiante)
+
+    # ========== EVENTOS ==========
+
+    def _buzon(self) -> BuzonEventos:
+        if self.buzon_eventos is None:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, "La bandeja de eventos no está habilitada")
+        return self.buzon_eventos
+
+    def _leer_eventos(self, consulta: dict, datos: dict):
+        if 'consumidor' not in consulta:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Indique 'consumidor'")
+        eventos = self._buzon().leer(consulta['consumidor'], _leer_entero(consulta.get('limite', 100), 'limite'))
+        return HTTPStatus.OK, [evento_a_dict(evento) for evento in eventos]
+
+    def _confirmar_eventos(self, consulta: dict, datos: dict):
+        consumidor = datos.get('consumidor')
+        if not consumidor:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Indique 'consumidor'")
+        posicion = self._buzon().confirmar(consumidor, _leer_entero(datos.get('hasta_id'), 'hasta_id'))
+        return HTTPStatus.OK, {'consumidor': consumidor, 'posicion': posicion}
+
+
+def main(argv=None):
+    """Arranca el servidor HTTP/JSON de reservas"""
+    from main import construir_servicios
+    from services import PoliticaCuotas
+
+    parser = argparse.ArgumentParser(description="Servidor HTTP/JSON de reservas CUN")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", default="reserva_cun.db", help="Ruta de la base de datos SQLite")
+    parser.add_argument("--hilos", type=int, default=8, help="Hilos para operaciones de base de datos")
+    parser.add_argument("--perfil", help="Perfil de almacenamiento (durable, equilibrado, lectura, carga-masiva); "
+                                         "por defecto $RESERVA_CUN_PERFIL o durable")
+    # Las reservas fragmentadas no pasan por la cola de escritura: son modos excluyentes
+    modo_escritura = parser.add_mutually_exclusive_group()
+    modo_escritura.add_argument("--agrupar-escrituras", action="store_true",
+                                help="Confirma las escrituras de reservas en lotes (group commit)")
+    parser.add_argument("--lote", type=int, default=32, help="Máximo de escrituras por lote")
+    parser.add_argument("--ventana-ms", type=float, default=2.0, help="Espera máxima para completar un lote")
+    parser.add_argument("--archivo", metavar="RUTA",
+                        help="Base de reservas archivadas para consultas con ?historial=1")
+    modo_escritura.add_argument("--fragmentos", metavar="DIRECTORIO",
+                                help="Guarda las reservas en un archivo SQLite por sede dentro del directorio")
+    parser.add_argument("--max-reservas-activas", type=int, default=5,
+                        help="Reservas sueltas activas por estudiante (0 = sin límite)")
+    parser.add_argument("--max-horas-semana", type=float, default=12,
+                        help="Horas reservadas por estudiante y semana (0 = sin límite)")
+    parser.add_argument("--respaldos", metavar="DIRECTORIO",
+                        help="Toma respaldos en línea periódicos de la base en este directorio")
+    parser.add_argument("--intervalo-respaldo", type=float, default=3600, help="Segundos entre respaldos")
+    parser.add_argument("--estado-compartido", metavar="NOMBRE", nargs="?", const=NOMBRE_SEGMENTO,
+                        help="Publica el estado de salas en memoria compartida para los kioscos")
+    args = parser.parse_args(argv)
+    if args.respaldos and args.fragmentos:
+        parser.error("--respaldos solo copia el catálogo; no se puede usar con --fragmentos")
+
+    db_manager = DatabaseManager(args.db, perfil=args.perfil)
+    if args.archivo:
+        ArchivadorReservas(db_manager, args.archivo).adjuntar()
+    cola = enrutador = None
+    if args.fragmentos:
+        enrutador = EnrutadorFragmentos(db_manager, args.fragmentos)
+    elif args.agrupar_escrituras:
+        cola = ColaEscrituraAgrupada(db_manager, tamano_lote=args.lote, ventana_ms=args.ventana_ms)
+    cuotas = PoliticaCuotas(args.max_reservas_activas or None, args.max_horas_semana or None)
+    servicios = construir_servicios(db_manager, cola, enrutador, cuotas)
+    buzon = BuzonEventosFragmentado(enrutador) if enrutador else BuzonEventos(db_manager)
+    servidor = ServidorReservas(*servicios, max_hilos=args.hilos, buzon_eventos=buzon)
+    barrido = BarridoReservasVencidas(servicios[0])
+    barrido.iniciar()
+    respaldos = None
+    if args.respaldos:
+        respaldos = RespaldoProgramado(RespaldoEnLinea(args.db), args.respaldos, args.intervalo_respaldo)
+        respaldos.iniciar()
+    estado_salas = None
+    if args.estado_compartido:
+        estado_salas = PublicadorEstadoSalas(servicios[0], servicios[1], args.estado_compartido)
+        estado_salas.iniciar()
+
+    print(f"🌐 Servidor de reservas escuchando en http://{args.host}:{args.port}")
+    try:
+        asyncio.run(servidor.servir(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n👋 Servidor detenido")
+    finally:
+        barrido.detener()
+        if respaldos:
+            respaldos.detener()
+        if estado_salas:
+            estado_salas.cerrar()
+        if cola:
+            cola.cerrar()
+        if enrutador:
+            enrutador.cerrar()
+        db_manager.cerrar()
+
+
+if __name__ == "__main__":
+    main()